@@ -94,6 +94,11 @@ if [ -f "$CAPTURE_FILE" ]; then
     echo "  • Packets:      $PACKET_COUNT"
     echo "  • Location:     $CAPTURE_FILE"
     echo ""
+    if python3 -c "import numpy" 2>/dev/null; then
+        echo -e "${CYAN}GTP-U Flow Summary:${NC}"
+        python3 gtpu_analyzer.py "$CAPTURE_FILE" --top 10 || true
+        echo ""
+    fi
     echo -e "${CYAN}Next Steps:${NC}"
     echo "  1. Copy to your machine:  ${YELLOW}scp $CAPTURE_FILE your-pc:~/${NC}"
     echo "  2. Open in Wireshark"
@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+GTP-U pcap analyzer for the captures written to packet_captures/.
+Memory-maps each pcap and decodes the outer IPv4/UDP, GTP-U and inner IPv4
+headers with NumPy (see pcap_reader.py, shared with traffic_generator.py). Reports per-flow (TEID + inner 5-tuple) packet and byte
+counts, a throughput time series and inter-arrival statistics. Several pcaps
+are analysed in parallel, and results are cached next to each capture.
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import mmap
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import time
+
+from pcap_reader import GTPU_PORT, decode_gtpu, read_pcap
+
+CAPTURE_DIR = 'packet_captures'
+BIN_SECONDS = 1.0  # Throughput time series resolution
+TOP_FLOWS = 20  # Flows shown (and given a time series) per capture
+CACHE_VERSION = 1
+
+PROTOCOLS = {1: 'ICMP', 6: 'TCP', 17: 'UDP', 58: 'ICMPv6', 132: 'SCTP'}
+
+
+def interarrival_stats(ts):
+    """Inter-arrival mean/std/p50/p99/max in milliseconds for one flow's sorted timestamps."""
+    import numpy as np
+    if len(ts) < 2:
+        return None
+    gaps = np.diff(ts) * 1e3
+    p50, p99 = np.percentile(gaps, [50, 99])
+    return {'mean': float(gaps.mean()), 'std': float(gaps.std()), 'p50': float(p50),
+            'p99': float(p99), 'max': float(gaps.max())}
+
+
+def ip_text(value):
+    return socket.inet_ntoa(int(value).to_bytes(4, 'big'))
+
+
+def analyze_pcap(path, bin_seconds=BIN_SECONDS, top=TOP_FLOWS):
+    """Analyses one capture; returns a JSON-serialisable summary."""
+    import numpy as np
+    started = time.time()
+    buf, linktype, ts, data, caplen, origlen = read_pcap(path)
+    n = len(ts)
+    summary = {
+        'file': path, 'packets': n, 'bytes': int(origlen.sum()), 'link_type': linktype,
+        'bin_seconds': bin_seconds, 'flows': [], 'throughput_mbps': [],
+    }
+    if n == 0:
+        summary['analysis_seconds'] = time.time() - started
+        return summary
+
+    fields = decode_gtpu(buf, linktype, data, caplen)
+    kind = fields['kind']
+    start = float(ts.min())
+    duration = float(ts.max()) - start
+    summary.update({
+        'start': start, 'duration': duration,
+        'gtpu_tpdu': int((kind == 0).sum()), 'gtpu_other': int((kind == 1).sum()),
+        'non_gtpu': int((kind == 2).sum()), 'undecoded': int((kind == 3).sum()),
+    })
+
+    bins = ((ts - start) / bin_seconds).astype(np.int64)
+    series = np.bincount(bins, weights=origlen, minlength=int(duration / bin_seconds) + 1)
+    summary['throughput_mbps'] = (series * 8 / 1e6 / bin_seconds).round(4).tolist()
+
+    # Group G-PDUs by TEID + inner 5-tuple
+    sel = np.flatnonzero(kind == 0)
+    if len(sel) == 0:
+        summary['analysis_seconds'] = time.time() - started
+        return summary
+    # Pack the key into two integers plus protocol, and sort once by (key, time) so
+    # each flow becomes a contiguous, time-ordered slice
+    teid = fields['teid'][sel].astype(np.uint64)
+    high = (teid << 32) | fields['src'][sel].astype(np.uint64)
+    low = ((fields['dst'][sel].astype(np.uint64) << 32) | (fields['src_port'][sel].astype(np.uint64) << 16)
+           | fields['dst_port'][sel].astype(np.uint64))
+    proto = fields['proto'][sel]
+    order = np.lexsort((ts[sel], low, high, proto))
+    sel = sel[order]
+    high, low, proto = high[order], low[order], proto[order]
+    boundary = np.flatnonzero((high[1:] != high[:-1]) | (low[1:] != low[:-1]) | (proto[1:] != proto[:-1])) + 1
+    bounds = np.concatenate(([0], boundary, [len(sel)]))
+    flow_of = np.repeat(np.arange(len(bounds) - 1), np.diff(bounds))
+    packets = np.diff(bounds)
+    frame_bytes = np.bincount(flow_of, weights=origlen[sel])
+    inner_bytes = np.bincount(flow_of, weights=fields['inner_len'][sel])
+    sorted_ts = ts[sel]
+    sorted_frames = origlen[sel]
+
+    ranked = np.argsort(-frame_bytes)
+    summary['flow_count'] = len(packets)
+    for f in ranked[:top] if top else ranked:
+        first, last = bounds[f], bounds[f + 1]
+        flow_ts = sorted_ts[first:last]
+        span = float(flow_ts[-1] - flow_ts[0])
+        origin = sel[first]
+        flow_bins = ((flow_ts - start) / bin_seconds).astype(np.int64)
+        flow_series = np.bincount(flow_bins, weights=sorted_frames[first:last], minlength=len(series))
+        summary['flows'].append({
+            'teid': f"0x{int(fields['teid'][origin]):08x}",
+            'outer': f"{ip_text(fields['outer_src'][origin])} -> {ip_text(fields['outer_dst'][origin])}",
+            'proto': PROTOCOLS.get(int(proto[first]), str(int(proto[first]))),
+            'src': f"{ip_text(fields['src'][origin])}:{int(fields['src_port'][origin])}",
+            'dst': f"{ip_text(fields['dst'][origin])}:{int(fields['dst_port'][origin])}",
+            'packets': int(packets[f]),
+            'bytes': int(frame_bytes[f]),
+            'inner_bytes': int(inner_bytes[f]),
+            'first': float(flow_ts[0]) - start,
+            'duration': span,
+            'mbps': float(frame_bytes[f] * 8 / 1e6 / span) if span > 0 else 0.0,
+            'interarrival_ms': interarrival_stats(flow_ts),
+            'throughput_mbps': (flow_series * 8 / 1e6 / bin_seconds).round(4).tolist(),
+        })
+    summary['analysis_seconds'] = time.time() - started
+    return summary
+
+
+def cache_path(pcap_file):
+    """Cache file next to the capture, or in the temp dir if that is not writable."""
+    path = pcap_file + '.gtpu.json'
+    if os.access(os.path.dirname(os.path.abspath(path)), os.W_OK):
+        return path
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), os.path.basename(path))
+
+
+def analyze_cached(job):
+    """Pool worker: returns the cached summary if still valid, otherwise analyses and caches."""
+    path, bin_seconds, top, use_cache = job
+    stat = os.stat(path)
+    stamp = {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+             'bin_seconds': bin_seconds, 'top': top}
+    cache_file = cache_path(path)
+    if use_cache:
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached.get('cache') == stamp:
+                cached['cached'] = True
+                return cached
+        except (OSError, ValueError):
+            pass
+    try:
+        summary = analyze_pcap(path, bin_seconds, top)
+    except (OSError, ValueError) as e:
+        return {'file': path, 'error': str(e)}
+    summary['cache'] = stamp
+    if use_cache:
+        try:
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(summary, f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"Warning: Could not write cache {cache_file}: {e}")
+    summary['cached'] = False
+    return summary
+
+
+def print_summary(summary):
+    print(f"\n=== {summary['file']} ===")
+    if 'error' in summary:
+        print(f"ERROR: {summary['error']}")
+        return
+    source = "cached" if summary.get('cached') else f"analysed in {summary.get('analysis_seconds', 0):.2f}s"
+    print(f"Packets: {summary['packets']} ({summary['bytes']/1024/1024:.2f} MB, {source})")
+    if not summary['packets']:
+        return
+    print(f"Duration: {summary['duration']:.2f}s")
+    print(f"GTP-U: {summary['gtpu_tpdu']} G-PDUs, {summary['gtpu_other']} other messages; "
+          f"{summary['non_gtpu']} non-GTP-U, {summary['undecoded']} undecoded")
+    series = summary['throughput_mbps']
+    if series:
+        print(f"Throughput: mean {summary['bytes'] * 8 / 1e6 / max(summary['duration'], summary['bin_seconds']):.3f} Mbps, "
+              f"peak {max(series):.3f} Mbps ({summary['bin_seconds']:g}s bins)")
+    if not summary['flows']:
+        return
+    shown = len(summary['flows'])
+    print(f"Flows: {summary['flow_count']} (top {shown} by bytes)")
+    print(f"  {'TEID':<10} {'Outer':<31} {'Proto':<5} {'Inner src':<21} {'Inner dst':<21} "
+          f"{'Pkts':>8} {'Bytes':>11} {'Mbps':>8}  IAT mean/p50/p99 ms")
+    for flow in summary['flows']:
+        iat = flow['interarrival_ms']
+        iat_text = f"{iat['mean']:.2f}/{iat['p50']:.2f}/{iat['p99']:.2f}" if iat else "-"
+        print(f"  {flow['teid']:<10} {flow['outer']:<31} {flow['proto']:<5} {flow['src']:<21} {flow['dst']:<21} "
+              f"{flow['packets']:>8} {flow['bytes']:>11} {flow['mbps']:>8.3f}  {iat_text}")
+
+
+# Live capture: AF_PACKET socket with a TPACKET_V3 ring
+ETH_P_IP = 0x0800
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+PACKET_IGNORE_OUTGOING = 23
+SO_ATTACH_FILTER = 26
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+RING_BLOCK_SIZE = 1 << 20  # 1 MB ring blocks
+RING_FRAME_SIZE = 2048  # Only used to size the ring request; V3 packs packets tightly
+RING_BLOCK_TIMEOUT_MS = 10  # Kernel hands over a partly filled block after this long
+RING_MB = 64
+LIVE_SNAPLEN = 128  # Bytes kept per packet: outer IPv4/UDP, GTP-U with extensions, inner headers
+LIVE_INTERVAL = 1.0
+SAMPLE_RATE = 100  # 1-in-N GTP-U packets written with --write
+MAX_WRITE_MB = 100
+UE_SUBNET = '10.45.0.0/16'  # SMF UE pool (open5gs-config/smf.yaml)
+BLOCK_DESC = struct.Struct('=IIIII')  # version, offset_to_priv, block_status, num_pkts, offset_to_first_pkt
+TPACKET3_NEXT = struct.Struct('=I')  # tp_next_offset
+TPACKET3_HDR_BYTES = 26  # Up to and including tp_mac
+
+
+def gtpu_filter(snaplen):
+    """
+    Classic BPF program for a SOCK_DGRAM packet socket (data starts at the IP header):
+    unfragmented IPv4 UDP with either port 2152, truncated to snaplen bytes in the kernel.
+    """
+    import ctypes
+    program = [
+        (0x30, 0, 0, 9),           # ldb [9]               IP protocol
+        (0x15, 0, 8, 17),          # jeq #17               else drop
+        (0x28, 0, 0, 6),           # ldh [6]               flags + fragment offset
+        (0x45, 6, 0, 0x1FFF),      # jset #0x1fff          fragment: drop
+        (0xB1, 0, 0, 0),           # ldxb 4*([0]&0xf)      IP header length
+        (0x48, 0, 0, 0),           # ldh [x+0]             UDP source port
+        (0x15, 2, 0, GTPU_PORT),   # jeq #2152             accept
+        (0x48, 0, 0, 2),           # ldh [x+2]             UDP destination port
+        (0x15, 0, 1, GTPU_PORT),   # jeq #2152             else drop
+        (0x06, 0, 0, snaplen),     # ret #snaplen          accept
+        (0x06, 0, 0, 0),           # ret #0                drop
+    ]
+    code = ctypes.create_string_buffer(b''.join(struct.pack('=HBBI', *op) for op in program))
+    return code, struct.pack('HP', len(program), ctypes.addressof(code))
+
+
+class PacketRing:
+    """AF_PACKET socket with a kernel GTP-U filter and a TPACKET_V3 receive ring."""
+
+    def __init__(self, interface, ring_mb=RING_MB, snaplen=LIVE_SNAPLEN):
+        import numpy as np
+        # Protocol 0 receives nothing until bind(), so no unfiltered packets reach the ring
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, 0)
+        self._filter, program = gtpu_filter(snaplen)
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, program)
+        if interface == 'lo':
+            # Loopback delivers every packet twice (outgoing and incoming)
+            try:
+                self.sock.setsockopt(SOL_PACKET, PACKET_IGNORE_OUTGOING, 1)
+            except OSError:
+                print("Warning: Kernel cannot ignore outgoing packets; loopback counts will be doubled")
+        self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        self.block_count = max(1, ring_mb * 1024 * 1024 // RING_BLOCK_SIZE)
+        frames = RING_BLOCK_SIZE * self.block_count // RING_FRAME_SIZE
+        self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, struct.pack(
+            '=7I', RING_BLOCK_SIZE, self.block_count, RING_FRAME_SIZE, frames, RING_BLOCK_TIMEOUT_MS, 0, 0))
+        self.ring = mmap.mmap(self.sock.fileno(), RING_BLOCK_SIZE * self.block_count,
+                              mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.buf = np.frombuffer(self.ring, dtype=np.uint8)
+        self.sock.bind((interface, ETH_P_IP))
+        self.block = 0
+
+    def blocks(self):
+        """
+        Yields (timestamps, data offsets, captured lengths, wire lengths) for each block
+        the kernel has handed over. The block goes back to the kernel when the caller
+        asks for the next one, so the offsets are only valid until then.
+        """
+        import numpy as np
+        next_offset = TPACKET3_NEXT.unpack_from
+        while True:
+            base = self.block * RING_BLOCK_SIZE
+            _, _, status, count, first = BLOCK_DESC.unpack_from(self.ring, base)
+            if not status & TP_STATUS_USER:
+                return
+            positions = np.empty(count, dtype=np.int64)
+            offset = base + first
+            for i in range(count):
+                positions[i] = offset
+                offset += next_offset(self.ring, offset)[0]
+            headers = self.buf[positions[:, None] + np.arange(TPACKET3_HDR_BYTES)].copy()
+            fields = headers[:, :24].view('=u4')
+            ts = fields[:, 1] + fields[:, 2] * 1e-9
+            data = positions + headers[:, 24:26].view('=u2')[:, 0]
+            yield ts, data, fields[:, 3].astype(np.int64), fields[:, 4].astype(np.int64)
+            struct.pack_into('=I', self.ring, base + 8, TP_STATUS_KERNEL)
+            self.block = (self.block + 1) % self.block_count
+
+    def kernel_stats(self):
+        """(packets, drops) seen by the kernel since the last call."""
+        packets, drops, _ = struct.unpack('=III', self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 12))
+        return packets, drops
+
+    def close(self):
+        self.buf = None
+        self.ring.close()
+        self.sock.close()
+
+
+class SequenceTracker:
+    """Received vs expected packets for one sequence space (16-bit GTP-U or 64-bit probe)."""
+
+    def __init__(self, bits):
+        self.modulus = 1 << bits if bits < 64 else None
+        self.last_raw = None
+        self.last = None
+        self.lowest = None
+        self.highest = None
+        self.received = 0
+
+    def update(self, seq):
+        import numpy as np
+        seq = seq.astype(np.int64)
+        if self.modulus:
+            # Unwrap the 16-bit counter: steps of more than half the range are backwards
+            if self.last_raw is None:
+                self.last_raw = self.last = int(seq[0])
+            half = self.modulus // 2
+            steps = (np.diff(np.concatenate(([self.last_raw], seq))) + half) % self.modulus - half
+            self.last_raw = int(seq[-1])
+            seq = self.last + np.cumsum(steps)
+            self.last = int(seq[-1])
+        low, high = int(seq.min()), int(seq.max())
+        self.lowest = low if self.lowest is None else min(self.lowest, low)
+        self.highest = high if self.highest is None else max(self.highest, high)
+        self.received += len(seq)
+
+    @property
+    def lost(self):
+        return max(0, self.highest - self.lowest + 1 - self.received)
+
+
+class LiveStats:
+    """Per-TEID and per-UE counters, aggregated once per report interval."""
+
+    def __init__(self, ue_subnet=UE_SUBNET):
+        import ipaddress
+        network = ipaddress.ip_network(ue_subnet)
+        self.ue_net, self.ue_mask = int(network.network_address), int(network.netmask)
+        self.pending = []
+        self.teids = {}
+        self.packets = 0
+        self.bytes = 0
+        self.other = 0
+
+    def add(self, fields, length):
+        """Keeps the columns of one decoded ring block that the next report needs."""
+        gpdu = fields['kind'] == 0
+        self.other += int((~gpdu).sum())
+        self.pending.append({key: fields[key][gpdu] for key in (
+            'teid', 'src', 'dst', 'has_gtp_seq', 'gtp_seq', 'has_probe', 'probe_flow', 'probe_seq')})
+        self.pending[-1]['bytes'] = length[gpdu]
+
+    def report(self, elapsed, kernel, top):
+        import numpy as np
+        batch = {key: np.concatenate([p[key] for p in self.pending]) for key in self.pending[0]} if self.pending else None
+        self.pending = []
+        packets = len(batch['teid']) if batch else 0
+        size = int(batch['bytes'].sum()) if batch else 0
+        self.packets += packets
+        self.bytes += size
+        stamp = datetime.datetime.now().strftime('%H:%M:%S')
+        print(f"[{stamp}] {packets} G-PDUs, {size * 8 / 1e6 / elapsed:.3f} Mbps, "
+              f"kernel received {kernel[0]}, dropped {kernel[1]}")
+        if not packets:
+            return
+
+        uplink = (batch['src'] & self.ue_mask) == self.ue_net
+        ue = np.where(uplink, batch['src'], batch['dst'])
+        teids, first, inverse = np.unique(batch['teid'], return_index=True, return_inverse=True)
+        teid_packets = np.bincount(inverse)
+        teid_bytes = np.bincount(inverse, weights=batch['bytes'])
+        for i, teid in enumerate(teids.tolist()):
+            entry = self.teids.setdefault(teid, {'ue': int(ue[first[i]]), 'uplink': bool(uplink[first[i]]),
+                                                 'packets': 0, 'bytes': 0, 'trackers': {}, 'lost': 0})
+            entry['packets'] += int(teid_packets[i])
+            entry['bytes'] += int(teid_bytes[i])
+        self._update_loss(batch)
+
+        rows = []
+        for i, teid in enumerate(teids.tolist()):
+            entry = self.teids[teid]
+            lost = sum(t.lost for t in entry['trackers'].values())
+            rows.append((teid_bytes[i], teid, entry, int(teid_packets[i]), lost - entry['lost']))
+            entry['lost'] = lost
+        rows.sort(key=lambda row: -row[0])
+        for size, teid, entry, count, lost in rows[:top] if top else rows:
+            loss = f"loss {lost} ({lost / (count + lost) * 100:.2f}%)" if entry['trackers'] else "loss -"
+            print(f"  TEID 0x{teid:08x}  UE {ip_text(entry['ue']):<15} {'UL' if entry['uplink'] else 'DL'} "
+                  f"{count:>8} pkts {size * 8 / 1e6 / elapsed:>9.3f} Mbps  {loss}")
+
+        ues, ue_inverse = np.unique(ue, return_inverse=True)
+        ul_bytes = np.bincount(ue_inverse, weights=batch['bytes'] * uplink, minlength=len(ues))
+        dl_bytes = np.bincount(ue_inverse, weights=batch['bytes'] * ~uplink, minlength=len(ues))
+        ranked = np.argsort(-(ul_bytes + dl_bytes))
+        for i in ranked[:top] if top else ranked:
+            print(f"  UE   {ip_text(ues[i]):<15} UL {ul_bytes[i] * 8 / 1e6 / elapsed:9.3f} Mbps  "
+                  f"DL {dl_bytes[i] * 8 / 1e6 / elapsed:9.3f} Mbps")
+
+    def _update_loss(self, batch):
+        """Feeds each TEID's sequence numbers (probe first, GTP-U otherwise) to its trackers."""
+        import numpy as np
+        probe = batch['has_probe']
+        gtp = batch['has_gtp_seq'] & ~probe
+        for mask, bits, seq, space in ((probe, 64, batch['probe_seq'], batch['probe_flow']),
+                                       (gtp, 16, batch['gtp_seq'], None)):
+            if not mask.any():
+                continue
+            key = batch['teid'][mask].astype(np.uint64) << 32
+            if space is not None:
+                key |= space[mask].astype(np.uint64)
+            order = np.argsort(key, kind='stable')
+            key, seq_sorted = key[order], seq[mask][order]
+            bounds = np.concatenate(([0], np.flatnonzero(key[1:] != key[:-1]) + 1, [len(key)]))
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                teid, flow = int(key[start]) >> 32, int(key[start]) & 0xFFFFFFFF
+                trackers = self.teids[teid]['trackers']
+                trackers.setdefault((bits, flow), SequenceTracker(bits)).update(seq_sorted[start:end])
+
+
+class SampleWriter:
+    """Writes 1-in-N GTP-U packets to a pcap (raw IPv4 link type), up to a size limit."""
+
+    def __init__(self, path, sample, snaplen, max_mb):
+        self.file = open(path, 'wb')
+        self.file.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, snaplen, 101))
+        self.sample = max(1, sample)
+        self.limit = max_mb * 1024 * 1024
+        self.size = 24
+        self.seen = 0
+        self.written = 0
+        self.full = False
+
+    def write(self, ring, ts, data, caplen, length):
+        """Copies the sampled packets out of the ring before the block is released."""
+        import numpy as np
+        picks = np.flatnonzero((self.seen + np.arange(len(ts))) % self.sample == 0)
+        self.seen += len(ts)
+        for i in picks.tolist():
+            if self.size + 16 + caplen[i] > self.limit:
+                if not self.full:
+                    print(f"Warning: Sample file reached {self.limit // (1024 * 1024)} MB; no longer writing")
+                self.full = True
+                return
+            sec = int(ts[i])
+            self.file.write(struct.pack('<IIII', sec, int((ts[i] - sec) * 1e6), caplen[i], length[i]))
+            self.file.write(ring[data[i]:data[i] + caplen[i]])
+            self.size += 16 + int(caplen[i])
+            self.written += 1
+
+    def close(self):
+        self.file.close()
+
+
+def run_live(interface, duration=0, interval=LIVE_INTERVAL, top=TOP_FLOWS, snaplen=LIVE_SNAPLEN,
+             ring_mb=RING_MB, write_file=None, sample=SAMPLE_RATE, max_write_mb=MAX_WRITE_MB,
+             ue_subnet=UE_SUBNET):
+    """
+    Captures GTP-U on an interface and prints per-TEID and per-UE throughput and loss
+    every interval. Packets are filtered and truncated in the kernel and decoded a ring
+    block at a time, so nothing is written to disk unless --write is given.
+    """
+    import select
+    ring = PacketRing(interface, ring_mb, snaplen)
+    stats = LiveStats(ue_subnet)
+    writer = SampleWriter(write_file, sample, snaplen, max_write_mb) if write_file else None
+    poller = select.poll()
+    poller.register(ring.sock, select.POLLIN | select.POLLERR)
+    print(f"Live GTP-U capture on {interface}: {ring.block_count} MB ring, snaplen {snaplen}, "
+          f"report every {interval}s" + (f", sampling 1/{sample} to {write_file}" if writer else ""))
+
+    def drain():
+        for ts, data, caplen, length in ring.blocks():
+            fields = decode_gtpu(ring.buf, 101, data, caplen)
+            stats.add(fields, length)
+            if writer and not writer.full:
+                gpdu = fields['kind'] == 0
+                writer.write(ring.ring, ts[gpdu], data[gpdu], caplen[gpdu], length[gpdu])
+
+    start = last = time.time()
+    end = start + duration if duration else None
+    total_drops = 0
+    ring.kernel_stats()
+    try:
+        while end is None or time.time() < end:
+            wait = min(last + interval, end or float('inf')) - time.time()
+            poller.poll(max(0, int(wait * 1000)))
+            drain()
+            now = time.time()
+            if now - last >= interval:
+                kernel = ring.kernel_stats()
+                total_drops += kernel[1]
+                stats.report(now - last, kernel, top)
+                last = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # The kernel hands over the last, partly filled block after RING_BLOCK_TIMEOUT_MS;
+        # collect it and report the partial interval so the totals include every packet
+        try:
+            time.sleep(2 * RING_BLOCK_TIMEOUT_MS / 1000)
+            drain()
+        except KeyboardInterrupt:
+            pass
+        kernel = ring.kernel_stats()
+        total_drops += kernel[1]
+        if stats.pending:
+            stats.report(max(time.time() - last, 1e-3), kernel, top)
+        elapsed = time.time() - start
+        print(f"\n✓ {stats.packets} G-PDUs ({stats.bytes / 1024 / 1024:.2f} MB) from {len(stats.teids)} TEIDs "
+              f"in {elapsed:.1f}s, {stats.other} other packets, kernel drops {total_drops}")
+        if writer:
+            writer.close()
+            print(f"✓ {writer.written} sampled packets written to {write_file}")
+        ring.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Summarise GTP-U captures (or live traffic) per TEID and inner 5-tuple',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # All captures in packet_captures/
+  python3 gtpu_analyzer.py
+
+  # Specific captures, 100 ms throughput bins, full results as JSON
+  python3 gtpu_analyzer.py packet_captures/scenario_A_*.pcap --bin 0.1 --output results.json
+
+  # Live per-TEID/per-UE throughput and loss, keeping a 1-in-1000 sample (needs root)
+  sudo python3 gtpu_analyzer.py --live br-$NETWORK_ID --duration 60 --write sample.pcap --sample 1000
+        """
+    )
+    parser.add_argument('pcaps', nargs='*',
+                        help=f'pcap files (default: {CAPTURE_DIR}/*.pcap)')
+    parser.add_argument('--bin', type=float, default=BIN_SECONDS,
+                        help='Throughput time series bin in seconds (default: %(default)s)')
+    parser.add_argument('--top', type=int, default=TOP_FLOWS,
+                        help='Flows reported per capture, by bytes; 0 for all (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Captures analysed in parallel (default: one per CPU core)')
+    parser.add_argument('--output', type=str,
+                        help='Write all summaries (including time series) to this JSON file')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Ignore and do not write the per-capture result cache')
+    parser.add_argument('--live', type=str, metavar='INTERFACE',
+                        help='Capture GTP-U live on this interface instead of reading pcaps')
+    parser.add_argument('--duration', type=int, default=0,
+                        help='Live capture duration in seconds; 0 runs until Ctrl-C (default: %(default)s)')
+    parser.add_argument('--interval', type=float, default=LIVE_INTERVAL,
+                        help='Live report interval in seconds (default: %(default)s)')
+    parser.add_argument('--snaplen', type=int, default=LIVE_SNAPLEN,
+                        help='Bytes kept per live packet (default: %(default)s)')
+    parser.add_argument('--ring_mb', type=int, default=RING_MB,
+                        help='Live capture ring size in MB (default: %(default)s)')
+    parser.add_argument('--write', type=str,
+                        help='Write sampled live GTP-U packets to this pcap')
+    parser.add_argument('--sample', type=int, default=SAMPLE_RATE,
+                        help='Write 1 in N live packets (default: %(default)s)')
+    parser.add_argument('--max_write_mb', type=int, default=MAX_WRITE_MB,
+                        help='Stop writing samples at this file size (default: %(default)s)')
+    parser.add_argument('--ue_subnet', type=str, default=UE_SUBNET,
+                        help='UE address pool, used to tell uplink from downlink (default: %(default)s)')
+    args = parser.parse_args()
+
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("ERROR: numpy library not installed.")
+        print("Install with: pip install numpy")
+        sys.exit(1)
+
+    if args.live:
+        if args.pcaps:
+            parser.error("--live does not take pcap files")
+        try:
+            run_live(args.live, args.duration, args.interval, args.top, args.snaplen, args.ring_mb,
+                     args.write, args.sample, args.max_write_mb, args.ue_subnet)
+        except PermissionError:
+            print("ERROR: Live capture needs root (or CAP_NET_RAW)")
+            sys.exit(1)
+        except OSError as e:
+            print(f"ERROR: Could not open live capture on {args.live}: {e}")
+            sys.exit(1)
+        return
+
+    pcaps = args.pcaps or sorted(glob.glob(os.path.join(CAPTURE_DIR, '*.pcap')))
+    if not pcaps:
+        parser.error(f"no pcap files given and none found in {CAPTURE_DIR}/")
+
+    started = time.time()
+    jobs = [(path, args.bin, args.top, not args.no_cache) for path in pcaps]
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(jobs)))
+    if workers == 1:
+        summaries = [analyze_cached(job) for job in jobs]
+    else:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            summaries = pool.map(analyze_cached, jobs)
+
+    for summary in summaries:
+        print_summary(summary)
+    total_packets = sum(s.get('packets', 0) for s in summaries)
+    print(f"\n✓ {len(summaries)} capture(s), {total_packets} packets in {time.time() - started:.2f}s "
+          f"({workers} worker{'s' if workers > 1 else ''})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summaries, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
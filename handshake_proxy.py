@@ -1,17 +1,34 @@
 import socket
 import threading
 import select
+import selectors
+import argparse
+import errno
+import fcntl
 import os
+import time
+import multiprocessing
+import bisect
+import hashlib
+from collections import deque, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # --- Configuration ---
 # The IP and port where the proxy listens for the gNB
 GNB_LISTEN_HOST = '0.0.0.0'
 GNB_LISTEN_PORT = 38412
 
-# The real Open5GS AMF address (inside Docker, we use the container name)
+# The real Open5GS AMF address (inside Docker, we use the container name).
+# More backends can be given with --amf; gNBs are spread over them by address.
 AMF_HOST = 'open5gs-core'
 AMF_PORT = 38412
 
+# Active AMF health checks and consistent-hash ring granularity
+HEALTH_CHECK_INTERVAL = 2.0
+HEALTH_CHECK_TIMEOUT = 1.0
+HEALTH_CHECK_FAILURES = 2  # Consecutive failed checks before a backend is marked down
+HASH_RING_REPLICAS = 64
+
 # The port where the proxy listens for our custom handshake
 HANDSHAKE_LISTEN_HOST = '0.0.0.0'
 HANDSHAKE_LISTEN_PORT = 9999
@@ -20,101 +37,1154 @@ HANDSHAKE_LISTEN_PORT = 9999
 SECRET_CHALLENGE = "HELLO123"
 SECRET_RESPONSE = "ACK"
 
-# A flag to track if the handshake was successful
-handshake_completed = False
+# Relay tuning: bytes moved per read, and whether to use the Linux splice() fast path
+RELAY_CHUNK_SIZE = 65536
+USE_SPLICE = hasattr(os, 'splice')
+
+# Selectors-engine flow control: per-direction queue bounds, and what to do when
+# a slow peer fills one ('pause' stops reading the sender, 'drop' discards,
+# 'close' tears the association down)
+HIGH_WATERMARK = 256 * 1024
+LOW_WATERMARK = 64 * 1024
+OVERFLOW_POLICY = 'pause'
+
+# Warm AMF connection pool: idle connections kept open, and how long they may idle
+AMF_POOL_MIN = 2
+AMF_POOL_MAX = 32
+AMF_POOL_IDLE_TIMEOUT = 60.0
+AMF_RESOLVE_TTL = 30.0
+
+# Handshake sessions: 'global' opens the gate for every gNB (the scenario scripts
+# handshake from the host), 'peer' authorises only the handshaking address
+HANDSHAKE_SCOPE = 'global'
+SESSION_TTL = 0  # Seconds an authorisation lasts, 0 = until the proxy restarts
+MAX_SESSIONS = 4096
+HANDSHAKE_TIMEOUT = 5.0
+SESSION_SYNC_TIMEOUT = 1.0  # Max wait for --workers to confirm a new session before the ACK
+
+# Set for --workers: every worker binds the gNB port and the kernel spreads accepts
+REUSE_PORT = False
+
+# Prometheus metrics endpoint (0 disables it); --workers serve on the following ports
+METRICS_HOST = '0.0.0.0'
+METRICS_PORT = 9102
+
+# Log verbosity: per-connection events are 'info', so 'warning' keeps the hot path quiet
+LOG_LEVELS = {'error': 0, 'warning': 1, 'info': 2, 'debug': 3}
+LOG_LEVEL = LOG_LEVELS['info']
+
+def log(level, message):
+    """Prints message if level is within the configured verbosity."""
+    if LOG_LEVELS[level] <= LOG_LEVEL:
+        print(message)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition model."""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class ProxyMetrics:
+    """
+    In-memory counters, gauges and histograms for the proxy.
+    Per-chunk byte counts are not locked: each Relay is written by exactly one
+    thread and is summed when scraped. Connection-level events go through
+    inc()/observe(), which are cheap enough at that rate.
+    """
+
+    DESCRIPTIONS = {
+        'proxy_associations_total': ('counter', 'gNB associations relayed to the AMF'),
+        'proxy_associations_active': ('gauge', 'gNB associations currently open'),
+        'proxy_gnb_rejected_total': ('counter', 'gNB connections refused by the handshake gate'),
+        'proxy_amf_connect_errors_total': ('counter', 'Failed AMF connection attempts'),
+        'proxy_amf_pool_hits_total': ('counter', 'gNBs paired with a warm pooled AMF connection'),
+        'proxy_amf_backend_up': ('gauge', 'Whether the AMF backend passes health checks'),
+        'proxy_amf_backend_associations_total': ('counter', 'gNB associations assigned to each AMF backend'),
+        'proxy_amf_connect_seconds': ('histogram', 'Time from gNB accept to an AMF socket being ready'),
+        'proxy_handshakes_total': ('counter', 'Handshake attempts by result'),
+        'proxy_relay_bytes_total': ('counter', 'Bytes relayed by direction'),
+        'proxy_relay_chunks_total': ('counter', 'Reads relayed by direction'),
+        'proxy_relay_queue_bytes': ('gauge', 'Bytes queued for slow peers by direction'),
+        'proxy_relay_paused_total': ('counter', 'Times reading was paused because the peer was slow'),
+        'proxy_relay_dropped_bytes_total': ('counter', 'Bytes discarded by the drop overflow policy'),
+        'proxy_relay_overflow_closed_total': ('counter', 'Associations closed by the close overflow policy'),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {}  # (name, labels) -> value
+        self.histograms = {
+            'proxy_amf_connect_seconds': Histogram([0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                                                    0.05, 0.1, 0.25, 0.5, 1.0, 2.5]),
+        }
+        self.relays = set()
+        self.closed = {}  # (metric, direction) -> total from relays that have finished
+
+    def inc(self, name, value=1, labels=()):
+        with self._lock:
+            self.values[(name, labels)] = self.values.get((name, labels), 0) + value
+
+    def set(self, name, value, labels=()):
+        with self._lock:
+            self.values[(name, labels)] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    def track_relay(self, relay):
+        with self._lock:
+            self.relays.add(relay)
+
+    def release_relay(self, relay):
+        with self._lock:
+            self.relays.discard(relay)
+            for metric, value in (('bytes', relay.relayed), ('chunks', relay.chunks)):
+                key = (metric, relay.direction)
+                self.closed[key] = self.closed.get(key, 0) + value
+
+    def render(self):
+        """Returns every metric in Prometheus text exposition format."""
+        with self._lock:
+            values = dict(self.values)
+            totals = dict(self.closed)
+            queued = {}
+            for relay in list(self.relays):
+                for metric, value in (('bytes', relay.relayed), ('chunks', relay.chunks)):
+                    key = (metric, relay.direction)
+                    totals[key] = totals.get(key, 0) + value
+                queued[relay.direction] = queued.get(relay.direction, 0) + len(relay.pending)
+            for direction in ('uplink', 'downlink'):
+                labels = (('direction', direction),)
+                values[('proxy_relay_bytes_total', labels)] = totals.get(('bytes', direction), 0)
+                values[('proxy_relay_chunks_total', labels)] = totals.get(('chunks', direction), 0)
+                values[('proxy_relay_queue_bytes', labels)] = queued.get(direction, 0)
+            values.setdefault(('proxy_associations_active', ()), 0)
+            histograms = {name: (list(h.buckets), list(h.counts), h.sum, h.count)
+                          for name, h in self.histograms.items()}
+
+        lines = []
+        for name, (kind, text) in self.DESCRIPTIONS.items():
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'histogram':
+                buckets, counts, total, count = histograms[name]
+                cumulative = 0
+                for bound, n in zip(buckets + ['+Inf'], counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum {total}")
+                lines.append(f"{name}_count {count}")
+                continue
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = ProxyMetrics()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves metrics.render() on GET /metrics."""
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not proxy events
+
+
+def start_metrics_server(port):
+    """Serves Prometheus metrics on METRICS_HOST:port from a daemon thread."""
+    try:
+        server = ThreadingHTTPServer((METRICS_HOST, port), MetricsHandler)
+    except OSError as e:
+        log('error', f"[METRICS] Could not listen on {METRICS_HOST}:{port}: {e}")
+        return
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log('info', f"[*] Metrics available at http://{METRICS_HOST}:{port}/metrics")
+
+
+F_SETPIPE_SZ = 1031  # fcntl.F_SETPIPE_SZ, only exported by Python 3.10+
+
+def _open_splice_pipe(chunk_size):
+    """Creates the kernel pipe used to splice socket data without copying it into Python."""
+    pipe_r, pipe_w = os.pipe()
+    try:
+        fcntl.fcntl(pipe_w, F_SETPIPE_SZ, chunk_size)
+    except OSError:
+        pass  # Keep the default pipe size (64 KB) if the limit is lower
+    return pipe_r, pipe_w
 
-def forward_traffic(source_socket, dest_socket):
-    """Forwards data between two sockets until one is closed."""
+def forward_traffic(source_socket, dest_socket, chunk_size=None, direction='uplink'):
+    """
+    Forwards data between two sockets until one is closed.
+    Uses os.splice() through a pipe on Linux so payload bytes never enter
+    Python, otherwise recv_into() a single preallocated buffer.
+    Returns the number of bytes relayed.
+    """
+    chunk_size = chunk_size or RELAY_CHUNK_SIZE
+    relay = Relay(source_socket, dest_socket, direction)
+    metrics.track_relay(relay)
+    pipe_fds = None
     try:
+        if USE_SPLICE:
+            pipe_fds = _open_splice_pipe(chunk_size)
+        else:
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
         while True:
             # Wait until source socket is ready to be read
             r, _, _ = select.select([source_socket], [], [], 5)
-            if r:
-                data = source_socket.recv(4096)
-                if not data:
-                    break
-                dest_socket.sendall(data)
-            else:
+            if not r:
                 # Timeout
                 continue
+            if pipe_fds:
+                pipe_r, pipe_w = pipe_fds
+                n = os.splice(source_socket.fileno(), pipe_w, chunk_size, flags=os.SPLICE_F_MOVE)
+                if not n:
+                    break
+                remaining = n
+                while remaining:
+                    remaining -= os.splice(pipe_r, dest_socket.fileno(), remaining, flags=os.SPLICE_F_MOVE)
+            else:
+                n = source_socket.recv_into(buffer)
+                if not n:
+                    break
+                dest_socket.sendall(view[:n])
+            relay.relayed += n
+            relay.chunks += 1
     except Exception as e:
-        print(f"[FORWARDER] Error forwarding traffic: {e}")
+        log('warning', f"[FORWARDER] Error forwarding traffic: {e}")
     finally:
-        print("[FORWARDER] Closing sockets.")
-        source_socket.close()
-        dest_socket.close()
+        log('info', f"[FORWARDER] Relayed {relay.relayed} bytes. Closing sockets.")
+        metrics.release_relay(relay)
+        if direction == 'uplink':
+            # One gauge decrement per association: the uplink forwarder owns it
+            metrics.inc('proxy_associations_active', -1)
+        if pipe_fds:
+            os.close(pipe_fds[0])
+            os.close(pipe_fds[1])
+        for sock in (source_socket, dest_socket):
+            try:
+                # Wakes the opposite forwarder if it is blocked on this socket
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+    return relay.relayed
+
+class AmfConnectionPool:
+    """
+    Keeps pre-established, health-checked TCP connections to the AMF so a
+    gNB is paired with an already-open socket instead of paying DNS and
+    connect cost on its setup path.
+    A maintenance thread refills the pool up to the recent demand (between
+    min_size and max_size), evicts connections idle for longer than
+    idle_timeout and drops any the AMF has closed.
+    """
+
+    def __init__(self, host, port, min_size=AMF_POOL_MIN, max_size=AMF_POOL_MAX,
+                 idle_timeout=AMF_POOL_IDLE_TIMEOUT, resolve_ttl=AMF_RESOLVE_TTL):
+        self.host = host
+        self.port = port
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.idle_timeout = idle_timeout
+        self.resolve_ttl = resolve_ttl
+        self._idle = deque()  # (socket, time it became idle)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._address = None
+        self._resolved_at = 0.0
+        self._demand = 0  # acquires since the last maintenance pass
+        self.healthy = True
+        self.name = f"{host}:{port}"
+
+    def start(self):
+        """Starts pre-connecting; a pool with min_size 0 only caches the address."""
+        if self.min_size <= 0:
+            return
+        self._wakeup.set()
+        threading.Thread(target=self._maintain, daemon=True).start()
+
+    def address(self):
+        """Returns the AMF address, resolving it at most once per resolve_ttl."""
+        now = time.monotonic()
+        if self._address is None or now - self._resolved_at > self.resolve_ttl:
+            info = socket.getaddrinfo(self.host, self.port, socket.AF_INET, socket.SOCK_STREAM)
+            self._address = info[0][4]
+            self._resolved_at = now
+        return self._address
+
+    def invalidate(self):
+        """Forgets the cached address so the next connect resolves the AMF again."""
+        self._address = None
+
+    def connect(self):
+        """Opens a new AMF connection, re-resolving and retrying once on failure."""
+        for attempt in range(2):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.address())
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return sock
+            except OSError:
+                sock.close()
+                self.invalidate()
+                if attempt:
+                    raise
+
+    def acquire(self, block=True):
+        """
+        Returns a connected AMF socket from the pool. When the pool is empty
+        it connects on the caller's thread, or returns None if block=False.
+        """
+        with self._lock:
+            self._demand += 1
+            while self._idle:
+                sock, _ = self._idle.pop()
+                if self._is_alive(sock):
+                    self._wakeup.set()
+                    metrics.inc('proxy_amf_pool_hits_total')
+                    return sock
+                sock.close()
+        self._wakeup.set()
+        return self.connect() if block else None
+
+    @staticmethod
+    def _is_alive(sock):
+        """Cheap liveness probe: an idle AMF socket must not be readable-at-EOF."""
+        try:
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) != b''
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+
+    def _maintain(self):
+        backoff = 1.0
+        while True:
+            self._wakeup.wait(timeout=1.0)
+            self._wakeup.clear()
+            now = time.monotonic()
+            with self._lock:
+                target = min(self.max_size, max(self.min_size, self._demand))
+                self._demand = 0
+                kept = deque()
+                for sock, since in self._idle:
+                    expired = now - since > self.idle_timeout and len(kept) >= self.min_size
+                    if expired or not self._is_alive(sock):
+                        sock.close()
+                    else:
+                        kept.append((sock, since))
+                self._idle = kept
+                missing = target - len(self._idle)
+            for _ in range(missing):
+                try:
+                    sock = self.connect()
+                except OSError as e:
+                    metrics.inc('proxy_amf_connect_errors_total')
+                    log('warning', f"[AMF-POOL] Could not pre-connect to AMF: {e}. Retrying in {backoff:.0f}s")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    break
+                backoff = 1.0
+                with self._lock:
+                    self._idle.appendleft((sock, time.monotonic()))
+
+
+class PeerSessionTable:
+    """
+    Authorised-peer table keyed by source address.
+    Lookups are O(1); entries expire after their TTL and the least recently
+    used entry is evicted once max_size is reached. The key '*' authorises
+    every peer (global handshake scope).
+    """
+
+    WILDCARD = '*'
+
+    def __init__(self, ttl=SESSION_TTL, max_size=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._sessions = OrderedDict()  # key -> expiry (monotonic), or None
+        self._lock = threading.Lock()
+
+    def authorize(self, key, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expiry = time.monotonic() + ttl if ttl > 0 else None
+        with self._lock:
+            self._sessions[key] = expiry
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+        return expiry
+
+    def revoke(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def is_authorized(self, key):
+        return self._check(key) or self._check(self.WILDCARD)
+
+    def _check(self, key):
+        with self._lock:
+            if key not in self._sessions:
+                return False
+            expiry = self._sessions[key]
+            if expiry is not None and expiry < time.monotonic():
+                del self._sessions[key]
+                return False
+            self._sessions.move_to_end(key)
+            return True
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class WorkerSessions:
+    """
+    Parent side of the --workers session tables.
+    publish() forwards an authorisation to every worker without blocking; the
+    handshake listener selects on the pipes and passes each confirmation to
+    confirm(), which reports the publications every worker has applied.
+    Peers the workers already hold with more than half their TTL left are
+    not sent again.
+    """
+
+    def __init__(self, max_size=MAX_SESSIONS):
+        self.pipes = []  # Connections to the worker processes
+        self.max_size = max_size
+        self._live = OrderedDict()  # peer -> expiry (monotonic) applied by every worker, or None
+        self._pending = {}  # publication id -> (peer, expiry, pipes yet to confirm)
+        self._next_id = 0
+
+    def publish(self, peer, ttl):
+        """
+        Sends peer's authorisation to the workers if they need it. Returns a
+        publication id to wait for, or None when the workers already accept peer.
+        """
+        if not self.pipes:
+            return None
+        now = time.monotonic()
+        live = peer in self._live and (self._live[peer] is None or self._live[peer] > now)
+        if live and (ttl <= 0 or self._live[peer] is None or self._live[peer] - now > ttl / 2):
+            self._live.move_to_end(peer)
+            return None
+        self._next_id += 1
+        sent = set()
+        for conn in self.pipes:
+            try:
+                conn.send((self._next_id, peer, ttl))
+                sent.add(conn)
+            except OSError as e:
+                log('error', f"[HANDSHAKE] Could not update worker session table: {e}")
+        expiry = now + ttl if ttl > 0 else None
+        if live:
+            # Refresh only: the workers keep accepting peer until the old expiry
+            self._remember(peer, expiry)
+            return None
+        self._pending[self._next_id] = (peer, expiry, sent)
+        return self._next_id
+
+    def confirm(self, conn):
+        """Reads one confirmation from a worker pipe; returns the publication ids now complete."""
+        try:
+            publication = conn.recv()
+        except (EOFError, OSError):
+            log('error', "[HANDSHAKE] Lost the session pipe to a worker")
+            self.pipes.remove(conn)
+            return [pub for pub in list(self._pending) if self._done(pub, conn)]
+        return [publication] if publication in self._pending and self._done(publication, conn) else []
+
+    def abandon(self, publication):
+        """Stops waiting for a publication; returns its peer."""
+        peer, _, _ = self._pending.pop(publication)
+        return peer
+
+    def _done(self, publication, conn):
+        peer, expiry, waiting = self._pending[publication]
+        waiting.discard(conn)
+        if waiting:
+            return False
+        del self._pending[publication]
+        self._remember(peer, expiry)
+        return True
+
+    def _remember(self, peer, expiry):
+        self._live[peer] = expiry
+        self._live.move_to_end(peer)
+        while len(self._live) > self.max_size:
+            self._live.popitem(last=False)
+
+
+# Peers that have completed the custom handshake
+peer_sessions = PeerSessionTable()
+
+# Session table sync with the --workers processes, each of which mirrors peer_sessions
+worker_sessions = WorkerSessions()
+
+def follow_sessions(conn):
+    """Worker side of WorkerSessions: applies authorisations made by the parent."""
+    while True:
+        try:
+            publication, peer, ttl = conn.recv()
+        except EOFError:
+            log('info', "[WORKER] Parent proxy exited. Stopping worker.")
+            os._exit(0)
+        peer_sessions.authorize(peer, ttl)
+        conn.send(publication)
+
+class AmfBalancer:
+    """
+    Spreads gNB associations over several AMF backends.
+    Each gNB address is placed on a consistent-hash ring so re-associations
+    land on the same AMF while it is healthy; when it is down the next
+    backend on the ring takes over. A checker thread probes every backend
+    with a TCP connect and marks it down after HEALTH_CHECK_FAILURES misses.
+    """
+
+    def __init__(self, backends):
+        self.backends = backends  # AmfConnectionPool per AMF
+        self._failures = {backend: 0 for backend in backends}
+        ring = []
+        for backend in backends:
+            for replica in range(HASH_RING_REPLICAS):
+                ring.append((self._hash(f"{backend.name}#{replica}"), backend))
+        ring.sort(key=lambda item: item[0])
+        self._ring_hashes = [h for h, _ in ring]
+        self._ring_backends = [b for _, b in ring]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def start(self):
+        for backend in self.backends:
+            metrics.set('proxy_amf_backend_up', 1, (('backend', backend.name),))
+            backend.start()
+        threading.Thread(target=self._check_health, daemon=True).start()
+
+    def candidates(self, peer):
+        """Returns backends in failover order for this gNB address, healthy ones first."""
+        order = []
+        start = bisect.bisect(self._ring_hashes, self._hash(peer))
+        for i in range(len(self._ring_backends)):
+            backend = self._ring_backends[(start + i) % len(self._ring_backends)]
+            if backend not in order:
+                order.append(backend)
+                if len(order) == len(self.backends):
+                    break
+        # Down backends are kept as a last resort in case every check is failing
+        return [b for b in order if b.healthy] + [b for b in order if not b.healthy]
+
+    def mark_failed(self, backend):
+        """Records a failed connection attempt; the next health check decides recovery."""
+        self._set_health(backend, False)
+
+    def _set_health(self, backend, healthy):
+        if backend.healthy != healthy:
+            state = "UP" if healthy else "DOWN"
+            log('warning', f"[AMF-LB] Backend {backend.name} is {state}")
+        backend.healthy = healthy
+        metrics.set('proxy_amf_backend_up', int(healthy), (('backend', backend.name),))
+
+    def _check_health(self):
+        while True:
+            for backend in self.backends:
+                try:
+                    probe = socket.create_connection(backend.address(), timeout=HEALTH_CHECK_TIMEOUT)
+                    probe.close()
+                    self._failures[backend] = 0
+                    self._set_health(backend, True)
+                except OSError:
+                    backend.invalidate()
+                    self._failures[backend] += 1
+                    if self._failures[backend] >= HEALTH_CHECK_FAILURES:
+                        self._set_health(backend, False)
+            time.sleep(HEALTH_CHECK_INTERVAL)
+
+
+# AMF backends (each with its warm connection pool), created in __main__
+amf_balancer = None
+
+def connect_to_amf(peer):
+    """Returns (backend, connected AMF socket) for a gNB, failing over between backends."""
+    last_error = None
+    for backend in amf_balancer.candidates(peer):
+        try:
+            return backend, backend.acquire()
+        except OSError as e:
+            log('warning', f"[GNB-HANDLER] AMF {backend.name} unreachable: {e}")
+            metrics.inc('proxy_amf_connect_errors_total')
+            amf_balancer.mark_failed(backend)
+            last_error = e
+    raise last_error or OSError("no AMF backends configured")
 
 def handle_gnb_connection(gnb_socket):
     """Handles the connection from the UERANSIM gNB."""
-    global handshake_completed
-    print(f"[GNB-HANDLER] Received connection from gNB at {gnb_socket.getpeername()}")
+    accepted_at = time.monotonic()
+    peer = gnb_socket.getpeername()
+    log('info', f"[GNB-HANDLER] Received connection from gNB at {peer}")
 
-    if not handshake_completed:
-        print("[GNB-HANDLER] Custom handshake not completed. Closing gNB connection.")
+    if not peer_sessions.is_authorized(peer[0]):
+        log('info', "[GNB-HANDLER] Custom handshake not completed. Closing gNB connection.")
+        metrics.inc('proxy_gnb_rejected_total')
         gnb_socket.close()
         return
 
-    print("[GNB-HANDLER] Handshake OK. Connecting to real AMF...")
+    log('info', "[GNB-HANDLER] Handshake OK. Connecting to real AMF...")
     try:
-        amf_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        amf_socket.connect((AMF_HOST, AMF_PORT))
-        print("[GNB-HANDLER] Connected to AMF. Starting traffic forwarding.")
+        backend, amf_socket = connect_to_amf(peer[0])
+        metrics.observe('proxy_amf_connect_seconds', time.monotonic() - accepted_at)
+        metrics.inc('proxy_associations_total')
+        metrics.inc('proxy_associations_active')
+        metrics.inc('proxy_amf_backend_associations_total', labels=(('backend', backend.name),))
+        log('info', f"[GNB-HANDLER] Connected to AMF {backend.name}. Starting traffic forwarding.")
 
         # Start forwarding traffic in both directions
-        threading.Thread(target=forward_traffic, args=(gnb_socket, amf_socket)).start()
-        threading.Thread(target=forward_traffic, args=(amf_socket, gnb_socket)).start()
+        threading.Thread(target=forward_traffic, args=(gnb_socket, amf_socket, None, 'uplink')).start()
+        threading.Thread(target=forward_traffic, args=(amf_socket, gnb_socket, None, 'downlink')).start()
 
     except Exception as e:
-        print(f"[GNB-HANDLER] Could not connect to AMF: {e}")
+        log('warning', f"[GNB-HANDLER] Could not connect to AMF: {e}")
         gnb_socket.close()
 
-def gnb_listener():
-    """Listens for the gNB connection and passes it to a handler."""
+def bind_gnb_socket():
+    """Creates the listening socket for gNB connections."""
     # Note: SCTP is connection-oriented, and for this proxy, we can
     # treat the initial connection like TCP. Python's default socket
     # with IPPROTO_SCTP can be complex, so we use TCP for simplicity
     # to proxy the byte stream, which works for this use case.
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if REUSE_PORT:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     server_socket.bind((GNB_LISTEN_HOST, GNB_LISTEN_PORT))
-    server_socket.listen(1)
-    print(f"[*] Proxy listening for gNB on {GNB_LISTEN_HOST}:{GNB_LISTEN_PORT}")
+    server_socket.listen(socket.SOMAXCONN)
+    return server_socket
+
+def gnb_listener():
+    """Listens for the gNB connection and passes it to a handler."""
+    server_socket = bind_gnb_socket()
+    log('info', f"[*] Proxy listening for gNB on {GNB_LISTEN_HOST}:{GNB_LISTEN_PORT}")
 
     while True:
         gnb_sock, _ = server_socket.accept()
         threading.Thread(target=handle_gnb_connection, args=(gnb_sock,)).start()
 
 def handshake_listener():
-    """Listens for and validates the custom handshake."""
-    global handshake_completed
+    """
+    Listens for and validates the custom handshake.
+    Clients are served concurrently on one selector, so a slow client only
+    holds its own slot until HANDSHAKE_TIMEOUT, and the listener keeps
+    running to admit reconnecting gNBs.
+    A client sends SECRET_CHALLENGE, optionally followed by the address to
+    authorise (e.g. "HELLO123 172.18.0.5"); otherwise its own address is used.
+    """
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_socket.bind((HANDSHAKE_LISTEN_HOST, HANDSHAKE_LISTEN_PORT))
-    server_socket.listen(1)
-    print(f"[*] Proxy listening for custom handshake on {HANDSHAKE_LISTEN_HOST}:{HANDSHAKE_LISTEN_PORT}")
+    server_socket.listen(socket.SOMAXCONN)
+    server_socket.setblocking(False)
+    log('info', f"[*] Proxy listening for custom handshake on {HANDSHAKE_LISTEN_HOST}:{HANDSHAKE_LISTEN_PORT}")
+
+    selector = selectors.DefaultSelector()
+    selector.register(server_socket, selectors.EVENT_READ)
+    for conn in worker_sessions.pipes:
+        selector.register(conn, selectors.EVENT_READ)
+    clients = {}  # socket -> (address, deadline)
+    awaiting = {}  # publication id -> (socket, peer, first handshake, deadline): ACKs held for the workers
+
+    while True:
+        timeout = 1.0
+        if awaiting:
+            timeout = min(timeout, max(min(entry[3] for entry in awaiting.values()) - time.monotonic(), 0))
+        for key, _ in selector.select(timeout=timeout):
+            if key.fileobj is server_socket:
+                try:
+                    client_socket, addr = server_socket.accept()
+                except (BlockingIOError, InterruptedError):
+                    continue
+                log('info', f"[HANDSHAKE] Received handshake attempt from {addr}")
+                client_socket.setblocking(False)
+                clients[client_socket] = (addr, time.monotonic() + HANDSHAKE_TIMEOUT)
+                selector.register(client_socket, selectors.EVENT_READ)
+                continue
+
+            if key.fileobj in worker_sessions.pipes:
+                conn = key.fileobj
+                for publication in worker_sessions.confirm(conn):
+                    send_ack(*awaiting.pop(publication)[:3])
+                if conn not in worker_sessions.pipes:
+                    selector.unregister(conn)
+                continue
+
+            client_socket = key.fileobj
+            addr, _ = clients.pop(client_socket)
+            selector.unregister(client_socket)
+            try:
+                accepted = process_handshake(client_socket, addr)
+                if accepted:
+                    # Hold the ACK until every worker accepts the peer, so the gNB
+                    # can connect to any of them once it has it
+                    publication = worker_sessions.publish(accepted[0], peer_sessions.ttl)
+                    if publication is not None:
+                        awaiting[publication] = (client_socket, *accepted, time.monotonic() + SESSION_SYNC_TIMEOUT)
+                        continue
+                    send_ack(client_socket, *accepted)
+                    continue
+            except Exception as e:
+                metrics.inc('proxy_handshakes_total', labels=(('result', 'error'),))
+                log('warning', f"[HANDSHAKE] Error: {e}")
+            client_socket.close()
+
+        # Drop clients that connected but never sent the challenge
+        now = time.monotonic()
+        for client_socket, (addr, deadline) in list(clients.items()):
+            if deadline < now:
+                metrics.inc('proxy_handshakes_total', labels=(('result', 'timeout'),))
+                log('info', f"[HANDSHAKE] Timed out waiting for {addr}. Closing connection.")
+                del clients[client_socket]
+                selector.unregister(client_socket)
+                client_socket.close()
+        # Release ACKs whose workers did not all confirm in time
+        for publication, (client_socket, peer, first, deadline) in list(awaiting.items()):
+            if deadline < now:
+                log('error', f"[HANDSHAKE] A worker did not confirm the session for {peer} within {SESSION_SYNC_TIMEOUT:.1f}s")
+                worker_sessions.abandon(publication)
+                del awaiting[publication]
+                send_ack(client_socket, peer, first)
+
+def process_handshake(client_socket, addr):
+    """
+    Validates one handshake message and records the authorised peer.
+    Returns (peer, whether it was not authorised before) to acknowledge, or None.
+    """
+    words = client_socket.recv(1024).decode().split()
+    data = words[0] if words else ''
+    if data != SECRET_CHALLENGE:
+        metrics.inc('proxy_handshakes_total', labels=(('result', 'rejected'),))
+        log('info', f"[HANDSHAKE] Incorrect secret: '{' '.join(words)}'. Closing connection.")
+        return None
+
+    if HANDSHAKE_SCOPE == 'global':
+        peer = PeerSessionTable.WILDCARD
+    else:
+        peer = words[1] if len(words) > 1 else addr[0]
+    metrics.inc('proxy_handshakes_total', labels=(('result', 'accepted'),))
+    # Record the peer before the ACK so an immediate reconnect is accepted
+    first = not peer_sessions.is_authorized(peer)
+    peer_sessions.authorize(peer)
+    return peer, first
+
+def send_ack(client_socket, peer, first):
+    """Sends the handshake ACK and closes the client connection."""
+    try:
+        log('info', "[HANDSHAKE] Correct secret received. Sending ACK.")
+        client_socket.send(SECRET_RESPONSE.encode())
+    except OSError as e:
+        log('warning', f"[HANDSHAKE] Error: {e}")
+        return
+    finally:
+        client_socket.close()
+    if peer == PeerSessionTable.WILDCARD:
+        if first:
+            log('warning', "\n *** GATE OPENED: Proxy will now forward gNB traffic! ***\n")
+    else:
+        log('info', f"[HANDSHAKE] Peer {peer} authorised ({len(peer_sessions)} active sessions).")
+
+class Relay:
+    """One direction of an association: bytes read from `src` are queued for `dst`."""
 
-    while not handshake_completed:
-        client_socket, addr = server_socket.accept()
-        print(f"[HANDSHAKE] Received handshake attempt from {addr}")
+    def __init__(self, src, dst, direction):
+        self.src = src
+        self.dst = dst
+        self.direction = direction
+        self.pending = bytearray()
+        self.paused = False  # Reading from src stopped until pending drains
+        self.eof = False  # src sent EOF; it is passed on to dst once pending drains
+        self.shut = False  # dst write side shut down: this direction is done
+        self.relayed = 0
+        self.chunks = 0
+
+
+class Association:
+    """A gNB<->AMF socket pair driven by the SelectorEngine."""
+
+    def __init__(self, gnb_socket, amf_socket, peer):
+        self.peer = peer
+        self.gnb_socket = gnb_socket
+        self.amf_socket = amf_socket
+        self.uplink = Relay(gnb_socket, amf_socket, 'uplink')
+        self.downlink = Relay(amf_socket, gnb_socket, 'downlink')
+        self.closed = False
+
+    def relays_for(self, sock):
+        """Returns (relay reading from sock, relay writing to sock)."""
+        if sock is self.gnb_socket:
+            return self.uplink, self.downlink
+        return self.downlink, self.uplink
+
+
+class SelectorEngine:
+    """
+    Single-threaded forwarding engine.
+    Accepts gNB connections, connects to the AMF without blocking and
+    multiplexes every gNB<->AMF pair on one selector, so the number of
+    associations no longer drives the number of OS threads.
+    Writes never block: bytes a peer cannot take are queued per direction,
+    bounded by high_watermark and handled according to overflow_policy, so
+    one slow AMF cannot grow proxy memory or stall other associations.
+    An EOF from one side is passed on with shutdown(SHUT_WR) after the bytes
+    queued for the other side are flushed; the association closes once both
+    directions have ended.
+    """
+
+    def __init__(self, chunk_size=None, high_watermark=None, low_watermark=None, overflow_policy=None):
+        self.selector = selectors.DefaultSelector()
+        self.chunk_size = chunk_size or RELAY_CHUNK_SIZE
+        self.high_watermark = high_watermark or HIGH_WATERMARK
+        self.low_watermark = min(low_watermark or LOW_WATERMARK, self.high_watermark)
+        self.overflow_policy = overflow_policy or OVERFLOW_POLICY
+        # Every read lands in this one buffer; only bytes the peer cannot
+        # take immediately are copied into the relay's pending queue.
+        self.buffer = bytearray(self.chunk_size)
+        self.view = memoryview(self.buffer)
+        self.associations = set()
+
+    def serve(self, server_socket):
+        server_socket.setblocking(False)
+        self.selector.register(server_socket, selectors.EVENT_READ, ('listen', None))
+        while True:
+            for key, mask in self.selector.select():
+                kind, obj = key.data
+                if kind == 'listen':
+                    self._accept(key.fileobj)
+                elif kind == 'connect':
+                    self._finish_connect(key.fileobj, obj)
+                else:
+                    self._service(key.fileobj, obj, mask)
+
+    def _accept(self, server_socket):
         try:
-            data = client_socket.recv(1024).decode().strip()
-            if data == SECRET_CHALLENGE:
-                print("[HANDSHAKE] Correct secret received. Sending ACK.")
-                client_socket.send(SECRET_RESPONSE.encode())
-                handshake_completed = True
-                print("\n *** GATE OPENED: Proxy will now forward gNB traffic! ***\n")
+            gnb_sock, addr = server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        accepted_at = time.monotonic()
+        log('info', f"[GNB-HANDLER] Received connection from gNB at {addr}")
+
+        if not peer_sessions.is_authorized(addr[0]):
+            log('info', "[GNB-HANDLER] Custom handshake not completed. Closing gNB connection.")
+            metrics.inc('proxy_gnb_rejected_total')
+            gnb_sock.close()
+            return
+
+        log('info', "[GNB-HANDLER] Handshake OK. Connecting to real AMF...")
+        self._connect_next(gnb_sock, addr, accepted_at, amf_balancer.candidates(addr[0]))
+
+    def _connect_next(self, gnb_sock, addr, accepted_at, candidates):
+        """Pairs the gNB with the first reachable backend, without blocking the loop."""
+        while candidates:
+            backend = candidates.pop(0)
+            amf_sock = backend.acquire(block=False)
+            if amf_sock is not None:
+                self._start_association(gnb_sock, amf_sock, addr, accepted_at, backend)
+                return
+
+            # Pool empty (or disabled): connect without blocking the event loop
+            amf_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            amf_sock.setblocking(False)
+            try:
+                err = amf_sock.connect_ex(backend.address())
+            except OSError as e:
+                err = e.errno or errno.EHOSTUNREACH
+            if err in (0, errno.EINPROGRESS):
+                pending = (gnb_sock, addr, accepted_at, backend, candidates)
+                self.selector.register(amf_sock, selectors.EVENT_WRITE, ('connect', pending))
+                return
+            self._connect_failed(backend, amf_sock, err)
+
+        log('warning', "[GNB-HANDLER] No AMF backend reachable. Closing gNB connection.")
+        gnb_sock.close()
+
+    def _connect_failed(self, backend, amf_sock, err):
+        log('warning', f"[GNB-HANDLER] Could not connect to AMF {backend.name}: {os.strerror(err)}")
+        metrics.inc('proxy_amf_connect_errors_total')
+        backend.invalidate()
+        amf_balancer.mark_failed(backend)
+        amf_sock.close()
+
+    def _finish_connect(self, amf_sock, pending):
+        gnb_sock, addr, accepted_at, backend, candidates = pending
+        self.selector.unregister(amf_sock)
+        err = amf_sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            self._connect_failed(backend, amf_sock, err)
+            self._connect_next(gnb_sock, addr, accepted_at, candidates)
+            return
+        self._start_association(gnb_sock, amf_sock, addr, accepted_at, backend)
+
+    def _start_association(self, gnb_sock, amf_sock, addr, accepted_at, backend):
+        metrics.observe('proxy_amf_connect_seconds', time.monotonic() - accepted_at)
+        metrics.inc('proxy_associations_total')
+        metrics.inc('proxy_associations_active')
+        metrics.inc('proxy_amf_backend_associations_total', labels=(('backend', backend.name),))
+        log('info', f"[GNB-HANDLER] Connected to AMF {backend.name}. Starting traffic forwarding.")
+        gnb_sock.setblocking(False)
+        amf_sock.setblocking(False)
+        assoc = Association(gnb_sock, amf_sock, addr)
+        self.associations.add(assoc)
+        metrics.track_relay(assoc.uplink)
+        metrics.track_relay(assoc.downlink)
+        self.selector.register(gnb_sock, selectors.EVENT_READ, ('relay', assoc))
+        self.selector.register(amf_sock, selectors.EVENT_READ, ('relay', assoc))
+
+    def _service(self, sock, assoc, mask):
+        outgoing, incoming = assoc.relays_for(sock)
+        try:
+            if mask & selectors.EVENT_WRITE:
+                self._flush(incoming)
+                if incoming.paused and len(incoming.pending) <= self.low_watermark:
+                    incoming.paused = False
+                if incoming.eof:
+                    self._end_relay(assoc, incoming)
+            if mask & selectors.EVENT_READ and not outgoing.paused and not outgoing.eof:
+                n = sock.recv_into(self.buffer)
+                if n:
+                    self._relay(assoc, outgoing, self.view[:n])
+                else:
+                    outgoing.eof = True
+                    self._end_relay(assoc, outgoing)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError as e:
+            log('warning', f"[FORWARDER] Error forwarding traffic: {e}")
+            self._close(assoc)
+            return
+        if not assoc.closed:
+            self._update_interest(assoc)
+
+    def _relay(self, assoc, relay, data):
+        relay.chunks += 1
+        size = len(data)
+        if not relay.pending:
+            try:
+                sent = relay.dst.send(data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            data = data[sent:]
+        if data and len(relay.pending) + len(data) > self.high_watermark:
+            if self.overflow_policy == 'close':
+                log('warning', f"[FORWARDER] {relay.direction} queue for {assoc.peer} overflowed. Closing association.")
+                metrics.inc('proxy_relay_overflow_closed_total')
+                self._close(assoc)
+                return
+            if self.overflow_policy == 'drop':
+                metrics.inc('proxy_relay_dropped_bytes_total', len(data), (('direction', relay.direction),))
+                size -= len(data)
+                data = b''
+        relay.relayed += size
+        if not data:
+            return
+        relay.pending += data
+        if self.overflow_policy == 'pause' and len(relay.pending) >= self.high_watermark and not relay.paused:
+            relay.paused = True
+            metrics.inc('proxy_relay_paused_total', labels=(('direction', relay.direction),))
+
+    def _end_relay(self, assoc, relay):
+        """Passes on the EOF of relay.src once its queue is flushed; closes the association when both directions ended."""
+        if relay.pending or relay.shut:
+            return
+        relay.shut = True
+        relay.dst.shutdown(socket.SHUT_WR)
+        if assoc.uplink.shut and assoc.downlink.shut:
+            self._close(assoc)
+
+    def _flush(self, relay):
+        while relay.pending:
+            try:
+                sent = relay.dst.send(relay.pending)
+            except (BlockingIOError, InterruptedError):
+                return
+            del relay.pending[:sent]
+
+    def _update_interest(self, assoc):
+        for sock in (assoc.gnb_socket, assoc.amf_socket):
+            outgoing, incoming = assoc.relays_for(sock)
+            events = 0
+            if not outgoing.paused and not outgoing.eof:
+                events |= selectors.EVENT_READ
+            if incoming.pending:
+                events |= selectors.EVENT_WRITE
+            try:
+                current = self.selector.get_key(sock).events
+            except KeyError:
+                current = 0
+            if events == current:
+                continue
+            if not events:
+                self.selector.unregister(sock)
+            elif not current:
+                self.selector.register(sock, events, ('relay', assoc))
             else:
-                print(f"[HANDSHAKE] Incorrect secret: '{data}'. Closing connection.")
-        except Exception as e:
-            print(f"[HANDSHAKE] Error: {e}")
-        finally:
-            client_socket.close()
-    
-    # Once handshake is done, we can stop this listener
-    server_socket.close()
-    print("[HANDSHAKE] Handshake listener stopped.")
+                self.selector.modify(sock, events, ('relay', assoc))
+
+    def _close(self, assoc):
+        if assoc.closed:
+            return
+        assoc.closed = True
+        self.associations.discard(assoc)
+        metrics.inc('proxy_associations_active', -1)
+        metrics.release_relay(assoc.uplink)
+        metrics.release_relay(assoc.downlink)
+        log('info', f"[FORWARDER] Relayed {assoc.uplink.relayed} bytes uplink, "
+                    f"{assoc.downlink.relayed} bytes downlink. Closing sockets.")
+        for sock in (assoc.gnb_socket, assoc.amf_socket):
+            try:
+                self.selector.unregister(sock)
+            except KeyError:
+                pass  # Both directions were paused or idle
+            sock.close()
+
+
+def selector_gnb_listener():
+    """Listens for gNB connections and relays them on a single SelectorEngine loop."""
+    server_socket = bind_gnb_socket()
+    log('info', f"[*] Proxy listening for gNB on {GNB_LISTEN_HOST}:{GNB_LISTEN_PORT} (selectors engine)")
+    SelectorEngine(RELAY_CHUNK_SIZE, HIGH_WATERMARK, LOW_WATERMARK, OVERFLOW_POLICY).serve(server_socket)
+
+
+def start_forwarding(args):
+    """Starts the AMF backends and the gNB listener of the selected engine in this process."""
+    global amf_balancer
+    backends = [AmfConnectionPool(host, port, args.amf_pool_min, args.amf_pool_max, args.amf_pool_idle)
+                for host, port in args.amf]
+    amf_balancer = AmfBalancer(backends)
+    amf_balancer.start()
+    if args.engine == 'selectors':
+        threading.Thread(target=selector_gnb_listener).start()
+    else:
+        threading.Thread(target=gnb_listener).start()
+
+def worker_main(index, args, session_conn):
+    """Entry point of a --workers process: relays gNB traffic, mirrors handshake state."""
+    log('info', f"[WORKER {index}] Started (pid {os.getpid()})")
+    # Drop inherited send ends so the pipe reports EOF once the parent exits
+    for conn in worker_sessions.pipes:
+        conn.close()
+    threading.Thread(target=follow_sessions, args=(session_conn,), daemon=True).start()
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port + 1 + index)
+    start_forwarding(args)
+
+def start_workers(args):
+    """Forks --workers processes that share the gNB port through SO_REUSEPORT."""
+    global REUSE_PORT
+    REUSE_PORT = True
+    context = multiprocessing.get_context('fork')
+    for index in range(args.workers):
+        parent_conn, worker_conn = context.Pipe()
+        worker_sessions.pipes.append(parent_conn)
+        context.Process(target=worker_main, args=(index, args, worker_conn), daemon=True).start()
+        worker_conn.close()
+
+
+def parse_amf_address(value):
+    """Parses an --amf value of the form host[:port]."""
+    host, _, port = value.rpartition(':')
+    if not host:
+        return value, AMF_PORT
+    try:
+        return host, int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid AMF address '{value}', expected host:port")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Custom handshake proxy between UERANSIM gNBs and the Open5GS AMF')
+    parser.add_argument('--amf', type=parse_amf_address, action='append',
+                        help=f'AMF backend host[:port]; repeat to load-balance (default: {AMF_HOST}:{AMF_PORT})')
+    parser.add_argument('--gnb_port', type=int, default=GNB_LISTEN_PORT,
+                        help=f'Port the gNBs connect to (default: {GNB_LISTEN_PORT})')
+    parser.add_argument('--handshake_port', type=int, default=HANDSHAKE_LISTEN_PORT,
+                        help=f'Port for the custom handshake (default: {HANDSHAKE_LISTEN_PORT})')
+    parser.add_argument('--engine', choices=['threads', 'selectors'], default='threads',
+                        help='Forwarding engine: two threads per gNB (default) or one selectors event loop')
+    parser.add_argument('--chunk_size', type=int, default=RELAY_CHUNK_SIZE,
+                        help=f'Bytes relayed per read (default: {RELAY_CHUNK_SIZE})')
+    parser.add_argument('--no_splice', action='store_true',
+                        help='Disable the os.splice() zero-copy path and use recv_into() buffers')
+    parser.add_argument('--high_watermark', type=int, default=HIGH_WATERMARK,
+                        help=f'selectors engine: max bytes queued per direction (default: {HIGH_WATERMARK})')
+    parser.add_argument('--low_watermark', type=int, default=LOW_WATERMARK,
+                        help=f'selectors engine: resume reading once the queue drains to this (default: {LOW_WATERMARK})')
+    parser.add_argument('--overflow_policy', choices=['pause', 'drop', 'close'], default=OVERFLOW_POLICY,
+                        help="selectors engine: on a full queue pause the sender (default), drop bytes, or close")
+    parser.add_argument('--amf_pool_min', type=int, default=AMF_POOL_MIN,
+                        help=f'Warm AMF connections kept open; 0 disables the pool (default: {AMF_POOL_MIN})')
+    parser.add_argument('--amf_pool_max', type=int, default=AMF_POOL_MAX,
+                        help=f'Upper bound on warm AMF connections during bursts (default: {AMF_POOL_MAX})')
+    parser.add_argument('--amf_pool_idle', type=float, default=AMF_POOL_IDLE_TIMEOUT,
+                        help=f'Seconds before surplus idle AMF connections are closed (default: {AMF_POOL_IDLE_TIMEOUT:.0f})')
+    parser.add_argument('--handshake_scope', choices=['global', 'peer'], default=HANDSHAKE_SCOPE,
+                        help='global: one handshake opens the gate for all gNBs (default); '
+                             'peer: only the handshaking (or named) address is authorised')
+    parser.add_argument('--session_ttl', type=float, default=SESSION_TTL,
+                        help='Seconds a handshake stays valid, 0 = forever (default: 0)')
+    parser.add_argument('--max_sessions', type=int, default=MAX_SESSIONS,
+                        help=f'Authorised peers kept before LRU eviction (default: {MAX_SESSIONS})')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Relay processes sharing the gNB port via SO_REUSEPORT (default: 1)')
+    parser.add_argument('--metrics_port', type=int, default=METRICS_PORT,
+                        help=f'Prometheus metrics port, 0 disables; worker N uses port+1+N (default: {METRICS_PORT})')
+    parser.add_argument('--log_level', choices=list(LOG_LEVELS), default='info',
+                        help="Log verbosity; 'warning' silences per-connection messages (default: info)")
+    args = parser.parse_args()
+    if not args.amf:
+        args.amf = [(AMF_HOST, AMF_PORT)]
+    return args
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    GNB_LISTEN_PORT = args.gnb_port
+    HANDSHAKE_LISTEN_PORT = args.handshake_port
+    RELAY_CHUNK_SIZE = args.chunk_size
+    USE_SPLICE = USE_SPLICE and not args.no_splice
+    HIGH_WATERMARK = args.high_watermark
+    LOW_WATERMARK = args.low_watermark
+    OVERFLOW_POLICY = args.overflow_policy
+    HANDSHAKE_SCOPE = args.handshake_scope
+    LOG_LEVEL = LOG_LEVELS[args.log_level]
+    peer_sessions = PeerSessionTable(args.session_ttl, args.max_sessions)
     print("--- Custom Handshake Proxy Starting ---")
-    # Run both listeners in separate threads
+    # Run both listeners in separate threads; with --workers the gNB
+    # listeners run in the worker processes and this one only handshakes
+    if args.workers > 1:
+        start_workers(args)
+    else:
+        start_forwarding(args)
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
     threading.Thread(target=handshake_listener).start()
-    threading.Thread(target=gnb_listener).start()
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+Shared pcap reading and GTP-U decoding for gtpu_analyzer.py and the pcap
+replay profile of traffic_generator.py. Records are indexed once and all
+headers are decoded with vectorised NumPy gathers over the mapped capture.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+
+GTPU_PORT = 2152
+MAX_GTP_EXTENSIONS = 8  # Extension headers followed per packet (5G uses one PDU session container)
+
+# Magic number -> (byte order, timestamp fraction unit)
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+# Link type -> (link header length, EtherType offset or None for raw IP)
+LINK_TYPES = {
+    1: (14, 12),     # Ethernet
+    101: (0, None),  # Raw IP
+    113: (16, 14),   # Linux cooked (tcpdump -i any)
+    228: (0, None),  # Raw IPv4
+    276: (20, 0),    # Linux cooked v2 (tcpdump -i any, libpcap >= 1.10)
+}
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+GTP_TPDU = 0xFF
+
+
+def open_pcap(path, access=mmap.ACCESS_READ):
+    """
+    Memory-maps a pcap and indexes its records. Returns (mmap, byte order,
+    timestamp unit, link type, record offsets as an int64 array). Only the
+    record walk is a Python loop; it reads one length field per record.
+    """
+    import numpy as np
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < 24:
+            raise ValueError("file too short for a pcap header")
+        mm = mmap.mmap(f.fileno(), 0, access=access)
+    magic = mm[:4]
+    if magic not in PCAP_MAGIC:
+        mm.close()
+        if magic == b'\x0a\x0d\x0d\x0a':
+            raise ValueError("pcapng is not supported; convert with: editcap -F pcap in.pcapng out.pcap")
+        raise ValueError("not a pcap file")
+    endian, unit = PCAP_MAGIC[magic]
+    linktype = struct.unpack_from(endian + 'I', mm, 20)[0] & 0x0FFFFFFF
+    if linktype not in LINK_TYPES:
+        mm.close()
+        raise ValueError(f"unsupported link type {linktype}")
+
+    length_at = struct.Struct(endian + 'I').unpack_from
+    records = array('q')
+    size = len(mm)
+    pos = 24
+    while pos + 16 <= size:
+        caplen = length_at(mm, pos + 8)[0]
+        if pos + 16 + caplen > size:
+            break  # Truncated final record (capture was killed mid-write)
+        records.append(pos)
+        pos += 16 + caplen
+    return mm, endian, unit, linktype, np.frombuffer(records, dtype=np.int64) if records else np.zeros(0, dtype=np.int64)
+
+
+def read_records(buf, endian, unit, records):
+    """
+    Reads the record headers at the given offsets of buf (a uint8 array of the
+    capture). Returns (timestamps, packet data offsets, captured lengths, original lengths).
+    """
+    import numpy as np
+    dtype = np.dtype(endian + 'u4')
+    headers = buf[records[:, None] + np.arange(16)].copy().view(dtype).reshape(-1, 4) if len(records) else np.zeros((0, 4), dtype)
+    ts = headers[:, 0].astype(np.float64) + headers[:, 1].astype(np.float64) * unit
+    return ts, records + 16, headers[:, 2].astype(np.int64), headers[:, 3].astype(np.int64)
+
+
+def read_pcap(path):
+    """
+    Memory-maps and indexes a whole pcap. Returns (buffer as uint8 array,
+    link type, timestamps, packet data offsets, captured lengths, original lengths).
+    """
+    import numpy as np
+    mm, endian, unit, linktype, records = open_pcap(path)
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    return (buf, linktype) + read_records(buf, endian, unit, records)
+
+
+def gather(buf, pos, width, valid):
+    """Big-endian unsigned integers of width bytes at each position; 0 where not valid."""
+    import numpy as np
+    pos = np.where(valid, pos, 0)
+    value = np.zeros(len(pos), dtype=np.uint64 if width > 4 else np.uint32)
+    for k in range(width):
+        value = (value << 8) | buf[np.minimum(pos + k, len(buf) - 1)]
+    return np.where(valid, value, 0)
+
+
+def decode_headers(buf, linktype, data, caplen):
+    """
+    Locates the outer IPv4/UDP, GTP-U and inner IPv4 headers of all packets at
+    once. Returns a dict of per-packet arrays: header offsets into buf (*_ip,
+    *_l4, 'gtp'), the fields that classify the packet, and a 'kind' array:
+    0 = G-PDU with inner IPv4, 1 = other GTP-U message, 2 = not GTP-U,
+    3 = truncated or unsupported (e.g. outer or inner IPv6). 'ipv4' marks a
+    decoded outer IPv4 header.
+    """
+    import numpy as np
+    end = data + caplen
+    n = len(data)
+    ok = np.ones(n, dtype=bool)
+
+    def fits(pos, width):
+        return pos + width <= end
+
+    header_len, type_at = LINK_TYPES[linktype]
+    ip = data + header_len
+    if type_at is not None:
+        ok &= fits(data + type_at, 2)
+        ethertype = gather(buf, data + type_at, 2, ok)
+        vlan = ethertype == ETHERTYPE_VLAN
+        ethertype = np.where(vlan, gather(buf, data + type_at + 4, 2, ok & vlan), ethertype)
+        ip = ip + vlan * 4
+        ok &= ethertype == ETHERTYPE_IPV4
+    ok &= fits(ip, 20)
+    first = gather(buf, ip, 1, ok)
+    ok &= (first >> 4) == 4
+    ihl = (first & 0x0F).astype(np.int64) * 4
+    outer_len = gather(buf, ip + 2, 2, ok)
+    outer_proto = gather(buf, ip + 9, 1, ok)
+
+    udp = ip + ihl
+    is_udp = ok & (outer_proto == 17) & fits(udp, 8)
+    sport = gather(buf, udp, 2, is_udp)
+    dport = gather(buf, udp + 2, 2, is_udp)
+    gtp_port = is_udp & ((sport == GTPU_PORT) | (dport == GTPU_PORT))
+
+    gtp = udp + 8
+    is_gtp = gtp_port & fits(gtp, 8)
+    flags = gather(buf, gtp, 1, is_gtp)
+    msg_type = gather(buf, gtp + 1, 1, is_gtp)
+    is_gtp &= (flags >> 5) == 1  # GTPv1
+    optional = (flags & 0x07) != 0
+    hlen = np.where(optional, 12, 8).astype(np.int64)
+    # Follow the extension header chain: each carries its length in 4-octet units
+    # and ends with the next extension type
+    next_ext = gather(buf, gtp + 11, 1, is_gtp & optional & ((flags & 0x04) != 0) & fits(gtp, 12))
+    for _ in range(MAX_GTP_EXTENSIONS):
+        pending = next_ext != 0
+        if not pending.any():
+            break
+        ext = gtp + hlen
+        ext_ok = pending & fits(ext, 1)
+        ext_len = gather(buf, ext, 1, ext_ok).astype(np.int64) * 4
+        ext_ok &= (ext_len > 0) & fits(ext, ext_len)
+        hlen = np.where(ext_ok, hlen + ext_len, hlen)
+        next_ext = gather(buf, ext + ext_len - 1, 1, ext_ok)
+        is_gtp &= ~(pending & ~ext_ok)
+
+    inner = gtp + hlen
+    tpdu = is_gtp & (msg_type == GTP_TPDU) & fits(inner, 20)
+    inner_first = gather(buf, inner, 1, tpdu)
+    tpdu &= (inner_first >> 4) == 4
+    inner_ihl = (inner_first & 0x0F).astype(np.int64) * 4
+    proto = gather(buf, inner + 9, 1, tpdu)
+    inner_len = gather(buf, inner + 2, 2, tpdu)
+
+    kind = np.full(n, 3, dtype=np.uint8)
+    kind[ok & ~gtp_port] = 2
+    kind[is_gtp & (msg_type != GTP_TPDU)] = 1
+    kind[tpdu] = 0
+    return {
+        'kind': kind, 'ipv4': ok, 'outer_ip': ip, 'outer_len': outer_len, 'outer_proto': outer_proto,
+        'outer_l4': udp, 'gtp': gtp, 'gtp_flags': flags, 'is_gtp': is_gtp,
+        'inner_ip': inner, 'inner_l4': inner + inner_ihl, 'inner_len': inner_len, 'proto': proto,
+    }
+
+
+def decode_gtpu(buf, linktype, data, caplen):
+    """
+    decode_headers() plus the fields that identify and sequence G-PDU flows:
+    outer addresses, TEID, inner 5-tuple, GTP-U sequence numbers and
+    traffic_generator.py probe headers.
+    """
+    from traffic_generator import PROBE_HEADER, PROBE_MAGIC
+    fields = decode_headers(buf, linktype, data, caplen)
+    end = data + caplen
+    ok, tpdu, proto = fields['ipv4'], fields['kind'] == 0, fields['proto']
+    ip, gtp, inner, inner_l4 = fields['outer_ip'], fields['gtp'], fields['inner_ip'], fields['inner_l4']
+
+    has_ports = tpdu & ((proto == 6) | (proto == 17)) & (inner_l4 + 4 <= end)
+    # Sequence numbers for loss: the GTP-U sequence (S flag) and, for traffic_generator.py
+    # flows, the probe header at the start of the inner UDP payload
+    has_gtp_seq = fields['is_gtp'] & ((fields['gtp_flags'] & 0x02) != 0) & (gtp + 12 <= end)
+    payload = inner_l4 + 8
+    has_probe = tpdu & (proto == 17) & (payload + PROBE_HEADER.size <= end)
+    has_probe &= gather(buf, payload, 4, has_probe) == int.from_bytes(PROBE_MAGIC, 'big')
+    fields.update({
+        'outer_src': gather(buf, ip + 12, 4, ok), 'outer_dst': gather(buf, ip + 16, 4, ok),
+        'teid': gather(buf, gtp + 4, 4, tpdu),
+        'src': gather(buf, inner + 12, 4, tpdu), 'dst': gather(buf, inner + 16, 4, tpdu),
+        'src_port': gather(buf, inner_l4, 2, has_ports), 'dst_port': gather(buf, inner_l4 + 2, 2, has_ports),
+        'has_gtp_seq': has_gtp_seq, 'gtp_seq': gather(buf, gtp + 8, 2, has_gtp_seq),
+        'has_probe': has_probe, 'probe_flow': gather(buf, payload + 4, 4, has_probe),
+        'probe_seq': gather(buf, payload + 8, 8, has_probe),
+    })
+    return fields
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Load-test harness for handshake_proxy.py.
+Starts a local stand-in AMF (echo or sink server) and the proxy, then drives
+synthetic gNB clients through the port-9999 handshake and the 38412 relay.
+Reports handshake latency, association accept rate, relay throughput and the
+proxy's CPU/RSS, and writes the results as JSON for comparison across changes.
+"""
+
+import socket
+import selectors
+import threading
+import subprocess
+import multiprocessing
+import argparse
+import json
+import os
+import shlex
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+PROXY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'handshake_proxy.py')
+SECRET_CHALLENGE = b"HELLO123"
+SECRET_RESPONSE = b"ACK"
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+def run_stand_in_amf(port, mode):
+    """Single-threaded AMF stand-in: echoes ('echo') or discards ('sink') every byte."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(socket.SOMAXCONN)
+    server.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    buffer = bytearray(65536)
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is server:
+                try:
+                    conn, _ = server.accept()
+                except BlockingIOError:
+                    continue
+                selector.register(conn, selectors.EVENT_READ)
+                continue
+            conn = key.fileobj
+            try:
+                n = conn.recv_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                n = 0
+            if not n:
+                selector.unregister(conn)
+                conn.close()
+            elif mode == 'echo':
+                conn.setblocking(True)
+                conn.sendall(memoryview(buffer)[:n])
+                conn.setblocking(False)
+
+
+def is_listening(port):
+    """True if a TCP socket is listening on port, read from /proc/net/tcp."""
+    try:
+        with open('/proc/net/tcp') as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if fields[3] == '0A' and fields[1].endswith(f':{port:04X}'):  # 0A = TCP_LISTEN
+                    return True
+    except (OSError, IndexError):
+        pass
+    return False
+
+
+def wait_for_port(port, timeout=10.0):
+    """
+    Waits until something listens on port. It does not connect, so the
+    proxy's handshake and association counters only see benchmark traffic.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_listening(port):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def process_tree(pid):
+    """Returns pid and the pids of all its descendants (proxy --workers)."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(children.get(current, []))
+    return pids
+
+
+def process_usage(pid):
+    """Returns {pid: {'cpu_s', 'rss_kb', 'peak_rss_kb'}} for pid and its descendants."""
+    usage = {}
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu = (int(fields[11]) + int(fields[12])) / CLK_TCK  # utime + stime
+            status = {}
+            with open(f'/proc/{child}/status') as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    status[key] = value.strip()
+        except (OSError, IndexError, ValueError):
+            continue
+        usage[child] = {
+            'cpu_s': cpu,
+            'rss_kb': int(status.get('VmRSS', '0 kB').split()[0]),
+            'peak_rss_kb': int(status.get('VmHWM', '0 kB').split()[0]),
+        }
+    return usage
+
+
+def cpu_seconds(usage):
+    return sum(u['cpu_s'] for u in usage.values())
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def latency_summary(samples):
+    """Summarises latency samples (seconds) in milliseconds."""
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+        'mean_ms': sum(samples) / len(samples) * 1000,
+    }
+
+
+def do_handshake(port):
+    """Performs one custom handshake; returns its latency or None on failure."""
+    start = time.perf_counter()
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+            sock.sendall(SECRET_CHALLENGE + b"\n")
+            if sock.recv(16) != SECRET_RESPONSE:
+                return None
+    except OSError:
+        return None
+    return time.perf_counter() - start
+
+
+def open_association(port, probe):
+    """Connects as a gNB and waits for the echoed probe; returns (socket, latency)."""
+    start = time.perf_counter()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+        sock.sendall(probe)
+        received = b''
+        while len(received) < len(probe):
+            chunk = sock.recv(len(probe) - len(received))
+            if not chunk:
+                sock.close()
+                return None, None
+            received += chunk
+    except OSError:
+        return None, None
+    return sock, time.perf_counter() - start
+
+
+def stream_bytes(sock, duration, chunk, echo, counter, index):
+    """Sends chunk repeatedly for duration seconds, draining echoes when the AMF echoes."""
+    payload = memoryview(bytes(chunk))
+    sink = bytearray(65536)
+    sock.setblocking(True)
+    sock.settimeout(5)
+    deadline = time.monotonic() + duration
+    sent = 0
+    try:
+        while time.monotonic() < deadline:
+            sock.sendall(payload)
+            sent += chunk
+            if echo:
+                pending = chunk
+                while pending:
+                    n = sock.recv_into(sink, min(pending, len(sink)))
+                    if not n:
+                        raise ConnectionError("proxy closed the association")
+                    pending -= n
+    except OSError:
+        pass
+    counter[index] = sent
+
+
+def run_benchmark(args):
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'clients': args.clients, 'concurrency': args.concurrency,
+            'relay_streams': args.relay_streams, 'relay_duration_s': args.relay_duration,
+            'chunk_size': args.chunk_size, 'amf_mode': args.amf_mode,
+            'proxy_args': args.proxy_args,
+        },
+    }
+
+    amf = multiprocessing.get_context('fork').Process(
+        target=run_stand_in_amf, args=(args.amf_port, args.amf_mode), daemon=True)
+    amf.start()
+    if not wait_for_port(args.amf_port):
+        print(f"ERROR: Stand-in AMF did not start on port {args.amf_port}")
+        return None
+
+    command = [sys.executable, PROXY_SCRIPT,
+               '--amf', f'127.0.0.1:{args.amf_port}',
+               '--gnb_port', str(args.gnb_port),
+               '--handshake_port', str(args.handshake_port),
+               '--metrics_port', '0',
+               '--log_level', 'warning'] + shlex.split(args.proxy_args)
+    print(f"Starting proxy: {' '.join(command)}")
+    proxy = subprocess.Popen(command, stdout=subprocess.DEVNULL if not args.show_proxy_output else None)
+    try:
+        if not (wait_for_port(args.handshake_port) and wait_for_port(args.gnb_port)):
+            print("ERROR: Proxy did not start listening")
+            return None
+        time.sleep(0.5)  # Let the AMF pool warm up before measuring
+        baseline_usage = process_usage(proxy.pid)
+
+        # Phase 1: handshakes
+        print(f"\n[1/3] {args.clients} handshakes on port {args.handshake_port} (concurrency {args.concurrency})...")
+        cpu_before = cpu_seconds(process_usage(proxy.pid))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            handshake_latencies = list(pool.map(lambda _: do_handshake(args.handshake_port), range(args.clients)))
+        elapsed = time.perf_counter() - start
+        ok = [l for l in handshake_latencies if l is not None]
+        results['handshake'] = dict(latency_summary(ok),
+                                    failures=len(handshake_latencies) - len(ok),
+                                    rate_per_s=len(ok) / elapsed if elapsed > 0 else 0,
+                                    proxy_cpu_s=cpu_seconds(process_usage(proxy.pid)) - cpu_before)
+        print(f"  {results['handshake']['rate_per_s']:.0f} handshakes/s, "
+              f"p50 {results['handshake'].get('p50_ms', 0):.2f} ms, p99 {results['handshake'].get('p99_ms', 0):.2f} ms")
+
+        # Phase 2: gNB associations through the relay
+        print(f"\n[2/3] {args.clients} gNB associations on port {args.gnb_port}...")
+        probe = b'NGSetupRequest'
+        if args.amf_mode == 'sink':
+            print("  (sink AMF: association latency measures connect only)")
+            probe = b''
+        cpu_before = cpu_seconds(process_usage(proxy.pid))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            opened = list(pool.map(lambda _: open_association(args.gnb_port, probe), range(args.clients)))
+        elapsed = time.perf_counter() - start
+        sockets = [sock for sock, _ in opened if sock is not None]
+        setup = [latency for _, latency in opened if latency is not None]
+        results['associations'] = dict(latency_summary(setup),
+                                       failures=args.clients - len(sockets),
+                                       accept_rate_per_s=len(sockets) / elapsed if elapsed > 0 else 0,
+                                       proxy_cpu_s=cpu_seconds(process_usage(proxy.pid)) - cpu_before)
+        print(f"  {results['associations']['accept_rate_per_s']:.0f} associations/s, "
+              f"p50 {results['associations'].get('p50_ms', 0):.2f} ms, p99 {results['associations'].get('p99_ms', 0):.2f} ms")
+
+        # Phase 3: relay throughput on a subset of the open associations
+        streams = sockets[:args.relay_streams]
+        print(f"\n[3/3] Relaying for {args.relay_duration}s on {len(streams)} associations ({args.amf_mode} AMF)...")
+        counter = [0] * len(streams)
+        cpu_before = cpu_seconds(process_usage(proxy.pid))
+        start = time.perf_counter()
+        threads = [threading.Thread(target=stream_bytes,
+                                    args=(sock, args.relay_duration, args.chunk_size,
+                                          args.amf_mode == 'echo', counter, i))
+                   for i, sock in enumerate(streams)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        relay_cpu = cpu_seconds(process_usage(proxy.pid)) - cpu_before
+        total = sum(counter)
+        # An echoing AMF sends every byte back through the proxy as well
+        relayed = total * (2 if args.amf_mode == 'echo' else 1)
+        results['relay'] = {
+            'streams': len(streams),
+            'duration_s': elapsed,
+            'client_bytes': total,
+            'relayed_bytes': relayed,
+            'mbps': relayed * 8 / 1e6 / elapsed if elapsed > 0 else 0,
+            'proxy_cpu_s': relay_cpu,
+            'proxy_cpu_s_per_gb': relay_cpu / (relayed / 1e9) if relayed else None,
+        }
+        print(f"  {results['relay']['mbps']:.0f} Mbps relayed, "
+              f"{relay_cpu:.2f} proxy CPU-s ({results['relay']['proxy_cpu_s_per_gb'] or 0:.2f} CPU-s/GB)")
+
+        for sock in sockets:
+            sock.close()
+
+        usage = process_usage(proxy.pid)
+        results['proxy_processes'] = [
+            dict(pid=pid, cpu_s=u['cpu_s'] - baseline_usage.get(pid, {}).get('cpu_s', 0),
+                 rss_kb=u['rss_kb'], peak_rss_kb=u['peak_rss_kb'])
+            for pid, u in sorted(usage.items())
+        ]
+        results['proxy_total'] = {
+            'cpu_s': sum(p['cpu_s'] for p in results['proxy_processes']),
+            'peak_rss_kb': sum(p['peak_rss_kb'] for p in results['proxy_processes']),
+        }
+    finally:
+        proxy.terminate()
+        try:
+            proxy.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proxy.kill()
+        amf.terminate()
+    return results
+
+
+def compare(results, baseline):
+    """Prints how the headline numbers moved relative to a previous results file."""
+    rows = [
+        ('Handshakes/s', ('handshake', 'rate_per_s'), True),
+        ('Handshake p99 (ms)', ('handshake', 'p99_ms'), False),
+        ('Associations/s', ('associations', 'accept_rate_per_s'), True),
+        ('Association p99 (ms)', ('associations', 'p99_ms'), False),
+        ('Relay Mbps', ('relay', 'mbps'), True),
+        ('Proxy CPU-s/GB', ('relay', 'proxy_cpu_s_per_gb'), False),
+        ('Proxy peak RSS (KB)', ('proxy_total', 'peak_rss_kb'), False),
+    ]
+    print("\nComparison with baseline:")
+    for label, (section, key), higher_is_better in rows:
+        new = results.get(section, {}).get(key)
+        old = baseline.get(section, {}).get(key)
+        if new is None or old is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        better = (change >= 0) == higher_is_better
+        print(f"  {label:<22} {old:>12.2f} -> {new:>12.2f}  ({change:+.1f}%{'' if better or not change else ' WORSE'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark handshake_proxy.py against a local stand-in AMF',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Default threaded engine, 200 gNBs, 8 relay streams
+  python3 proxy_benchmark.py --output baseline.json
+
+  # Same load against the selectors engine, compared with the baseline
+  python3 proxy_benchmark.py --proxy_args "--engine selectors" --baseline baseline.json
+        """
+    )
+    parser.add_argument('--clients', type=int, default=200,
+                        help='Synthetic gNB clients (handshakes and associations) (default: 200)')
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help='Clients connecting at the same time (default: 50)')
+    parser.add_argument('--relay_streams', type=int, default=8,
+                        help='Associations streaming data in the relay phase (default: 8)')
+    parser.add_argument('--relay_duration', type=float, default=5.0,
+                        help='Seconds of relay streaming (default: 5)')
+    parser.add_argument('--chunk_size', type=int, default=65536,
+                        help='Bytes per client send in the relay phase (default: 65536)')
+    parser.add_argument('--amf_mode', choices=['echo', 'sink'], default='echo',
+                        help='Stand-in AMF echoes or discards data (default: echo)')
+    parser.add_argument('--gnb_port', type=int, default=48412, help='Proxy gNB port (default: 48412)')
+    parser.add_argument('--handshake_port', type=int, default=49999, help='Proxy handshake port (default: 49999)')
+    parser.add_argument('--amf_port', type=int, default=48413, help='Stand-in AMF port (default: 48413)')
+    parser.add_argument('--proxy_args', default='',
+                        help='Extra handshake_proxy.py flags, e.g. "--engine selectors --workers 4"')
+    parser.add_argument('--show_proxy_output', action='store_true', help='Do not silence the proxy output')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Previous JSON results to compare against')
+    args = parser.parse_args()
+
+    print("=== Handshake Proxy Benchmark ===")
+    results = run_benchmark(args)
+    if results is None:
+        sys.exit(1)
+
+    print("\nProxy processes:")
+    for proc in results['proxy_processes']:
+        print(f"  pid {proc['pid']}: {proc['cpu_s']:.2f} CPU-s, RSS {proc['rss_kb'] / 1024:.1f} MB "
+              f"(peak {proc['peak_rss_kb'] / 1024:.1f} MB)")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
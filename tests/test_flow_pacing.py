@@ -0,0 +1,70 @@
+"""Pacing of concurrent --flows, checked on a fake clock so results do not depend on host load."""
+import os
+import sys
+import threading
+import types
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import traffic_generator as tg  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() advances the clock by the requested time plus overshoot_ns."""
+
+    def __init__(self, overshoot_ns=0):
+        self.now_ns = 0
+        self.overshoot_ns = overshoot_ns
+        self.reads = 0
+        self.sleeps = 0
+
+    def monotonic_ns(self):
+        self.reads += 1
+        return self.now_ns
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self.now_ns += int(seconds * 1e9) + self.overshoot_ns
+
+
+def spin_budgets(monkeypatch, count):
+    """Runs flow_worker over count stub flows; returns the spin_ns each flow's Pacer gets."""
+    monkeypatch.setattr(sys, 'stdout', sys.stdout)
+    monkeypatch.setattr(tg, 'PACER_SPIN_NS', tg.PACER_SPIN_NS)
+    budgets, lock = [], threading.Lock()
+
+    def run_flow(flow, start_at, use_cache, load):
+        with lock:
+            budgets.append(tg.Pacer(0.02).spin_ns)
+
+    monkeypatch.setattr(tg, 'run_flow', run_flow)
+    tg.flow_worker([{'name': f'flow{i}'} for i in range(count)], 0, False, None)
+    return budgets
+
+
+def test_multi_flow_workers_do_not_spin(monkeypatch):
+    default = tg.PACER_SPIN_NS
+    assert default > 0
+    assert spin_budgets(monkeypatch, 1) == [default]
+    # A spinning thread holds the GIL and delays every other flow's deadline
+    assert spin_budgets(monkeypatch, 100) == [0] * 100
+
+
+@pytest.mark.parametrize('policy', ['catchup', 'skip'])
+def test_sleep_only_pacer_keeps_the_grid(monkeypatch, policy):
+    clock = FakeClock(overshoot_ns=300_000)
+    monkeypatch.setattr(tg, 'time', types.SimpleNamespace(monotonic_ns=clock.monotonic_ns, sleep=clock.sleep))
+    pacer = tg.Pacer(0.02, policy=policy, spin_ns=0)
+    for _ in pacer.ticks(2.0):
+        pass
+    # Sleep overshoot delays each send but never the deadlines after it
+    assert pacer.ticks_sent == 100
+    assert pacer.skipped == 0
+    assert pacer.lateness_max == 300_000
+    assert pacer.start_ns + 100 * pacer.interval_ns == pacer.next_ns
+    # One sleep per deadline after the first, and no busy-wait reads of the clock
+    assert clock.sleeps == 99
+    assert clock.reads == 2 + 3 * 99  # Start and first tick, then now/spin check/now per later tick
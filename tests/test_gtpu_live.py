@@ -0,0 +1,45 @@
+"""Live GTP-U capture on loopback: the final summary counts every injected G-PDU."""
+import os
+import re
+import socket
+import struct
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_PACKET') or os.geteuid() != 0,
+                                reason='live capture needs AF_PACKET and root')
+
+
+def gpdu(seq):
+    payload = b'x' * 100
+    inner = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 28 + len(payload), 0, 0, 64, 17, 0,
+                        socket.inet_aton('10.45.0.2'), socket.inet_aton('8.8.8.8'))
+    inner += struct.pack('!HHHH', 40000, 5000, 8 + len(payload), 0) + payload
+    return struct.pack('!BBHIHBB', 0x32, 0xFF, 4 + len(inner), 1, seq, 0, 0) + inner
+
+
+def capture(packets, *args):
+    """Runs a 2 s capture on lo while sending packets G-PDUs; returns its output."""
+    proc = subprocess.Popen([sys.executable, os.path.join(REPO, 'gtpu_analyzer.py'), '--live', 'lo',
+                             '--duration', '2', *args], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = [proc.stdout.readline()]
+    assert output[0].startswith('Live GTP-U capture'), output[0]
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for seq in range(packets):
+            sock.sendto(gpdu(seq), ('127.0.0.1', 2152))
+    output.append(proc.communicate(timeout=30)[0])
+    assert proc.returncode == 0, output
+    return ''.join(output)
+
+
+@pytest.mark.parametrize('interval', ['5', '0.5'])
+def test_final_summary_counts_every_packet(interval):
+    output = capture(500, '--interval', interval)
+    if 'ignore outgoing' in output:
+        pytest.skip('kernel lacks PACKET_IGNORE_OUTGOING; loopback packets are seen twice')
+    total = re.search(r'✓ (\d+) G-PDUs', output)
+    assert total and int(total.group(1)) == 500, output
@@ -0,0 +1,152 @@
+"""
+The pcap replay profile and gtpu_analyzer.py decode captures through
+pcap_reader; both views are checked against a plain per-packet struct parser.
+"""
+import glob
+import os
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import pcap_reader  # noqa: E402
+import traffic_generator as tg  # noqa: E402
+
+CAPTURES = [path for path in sorted(glob.glob(os.path.join(REPO, 'packet_captures', '*.pcap')))
+            if os.path.getsize(path) > 24]
+
+
+def reference(packet, linktype):
+    """Decodes one packet the slow way: (kind, flow key, outer payload, inner payload) with payloads as (offset, size)."""
+    header_len, type_at = pcap_reader.LINK_TYPES[linktype]
+    ip = header_len
+    if type_at is not None:
+        if len(packet) < type_at + 2:
+            return 3, None, None, None
+        ethertype, = struct.unpack_from('!H', packet, type_at)
+        if ethertype == 0x8100:
+            ethertype, = struct.unpack_from('!H', packet, type_at + 4)
+            ip += 4
+        if ethertype != 0x0800:
+            return 3, None, None, None
+    if len(packet) < ip + 20 or packet[ip] >> 4 != 4:
+        return 3, None, None, None
+    l4 = ip + (packet[ip] & 0x0F) * 4
+    total, = struct.unpack_from('!H', packet, ip + 2)
+    proto = packet[ip + 9]
+    payload = l4 + 8 if proto == 17 else l4
+    outer = (payload, min(max(ip + total - payload, 0), tg.MAX_PACKET_SIZE))
+    if proto != 17 or len(packet) < l4 + 8 or pcap_reader.GTPU_PORT not in struct.unpack_from('!HH', packet, l4):
+        return 2, None, outer, None
+    gtp = l4 + 8
+    if len(packet) < gtp + 8 or packet[gtp] >> 5 != 1:
+        return 3, None, outer, None
+    flags, msg_type, _, teid = struct.unpack_from('!BBHI', packet, gtp)
+    hlen = 12 if flags & 0x07 else 8
+    next_ext = packet[gtp + 11] if flags & 0x04 and len(packet) >= gtp + 12 else 0
+    for _ in range(pcap_reader.MAX_GTP_EXTENSIONS):
+        if not next_ext:
+            break
+        if len(packet) < gtp + hlen + 1 or packet[gtp + hlen] == 0:
+            return 3, None, outer, None
+        ext_len = packet[gtp + hlen] * 4
+        if len(packet) < gtp + hlen + ext_len:
+            return 3, None, outer, None
+        hlen += ext_len
+        next_ext = packet[gtp + hlen - 1]
+    if msg_type != pcap_reader.GTP_TPDU:
+        return 1, None, outer, None
+    inner = gtp + hlen
+    if len(packet) < inner + 20 or packet[inner] >> 4 != 4:
+        return 3, None, outer, None
+    inner_l4 = inner + (packet[inner] & 0x0F) * 4
+    inner_total, = struct.unpack_from('!H', packet, inner + 2)
+    inner_proto = packet[inner + 9]
+    src, dst = struct.unpack_from('!II', packet, inner + 12)
+    ports = (0, 0)
+    if inner_proto in (6, 17) and len(packet) >= inner_l4 + 4:
+        ports = struct.unpack_from('!HH', packet, inner_l4)
+    inner_payload = inner_l4 + 8 if inner_proto == 17 else inner_l4
+    decap = (inner_payload, min(max(inner + inner_total - inner_payload, 0), tg.MAX_PACKET_SIZE))
+    return 0, (teid, inner_proto, src, dst) + ports, outer, decap
+
+
+def check_capture(path):
+    mm, endian, unit, linktype, records = pcap_reader.open_pcap(path)
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    ts, data, caplen, _ = pcap_reader.read_records(buf, endian, unit, records)
+    fields = pcap_reader.decode_gtpu(buf, linktype, data, caplen)
+    replay = [tg.decode_pcap_records(buf, endian, unit, linktype, records, decap) for decap in (False, True)]
+    for i in range(len(records)):
+        packet = bytes(buf[data[i]:data[i] + caplen[i]])
+        kind, key, outer, inner = reference(packet, linktype)
+        assert fields['kind'][i] == kind, i
+        if kind == 0:
+            assert (fields['teid'][i], fields['proto'][i], fields['src'][i], fields['dst'][i],
+                    fields['src_port'][i], fields['dst_port'][i]) == key, i
+        for decap, (times, offsets, captured, sizes) in zip((False, True), replay):
+            assert times[i] == ts[i]
+            expected = inner if decap and kind == 0 else outer
+            if expected is None or (decap and kind in (1, 3)):
+                assert sizes[i] == 0, (i, decap)
+                continue
+            assert (offsets[i] - data[i], sizes[i]) == expected, (i, decap)
+            assert captured[i] == min(max(caplen[i] - expected[0], 0), expected[1]), (i, decap)
+    return fields['kind']
+
+
+@pytest.mark.parametrize('path', CAPTURES, ids=os.path.basename)
+def test_bundled_captures_agree(path):
+    kinds = check_capture(path)
+    assert (kinds == 0).sum() > 0
+
+
+def ipv4(proto, body):
+    return struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(body), 0, 0, 64, proto, 0,
+                       bytes([172, 18, 0, 7]), bytes([172, 18, 0, 2])) + body
+
+
+def udp(sport, dport, body):
+    return struct.pack('!HHHH', sport, dport, 8 + len(body), 0) + body
+
+
+def gtpu(msg_type, teid, body, extension=False, sequence=None):
+    if extension:
+        options = struct.pack('!HBB', sequence or 0, 0, 0x85) + bytes([1, 0x00, 0x01, 0])
+        flags = 0x34 | (0x02 if sequence is not None else 0)
+    elif sequence is not None:
+        options, flags = struct.pack('!HBB', sequence, 0, 0), 0x32
+    else:
+        options, flags = b'', 0x30
+    return struct.pack('!BBHI', flags, msg_type, len(options) + len(body), teid) + options + body
+
+
+def test_synthetic_capture_agrees(tmp_path):
+    inner_udp = ipv4(17, udp(40000, 5000, tg.PROBE_MAGIC + bytes(120)))
+    inner_tcp = ipv4(6, struct.pack('!HH', 443, 51000) + bytes(36))
+    packets = [
+        ipv4(17, udp(2152, 2152, gtpu(0xFF, 1, inner_udp, extension=True, sequence=7))),
+        ipv4(17, udp(2152, 2152, gtpu(0xFF, 2, inner_tcp, sequence=9))),
+        ipv4(17, udp(2152, 2152, gtpu(0xFF, 3, inner_udp))),
+        ipv4(17, udp(2152, 2152, gtpu(0x01, 0, b''))),  # Echo request
+        ipv4(17, udp(2152, 2152, b'\x30\xff')),  # Truncated GTP-U header
+        ipv4(17, udp(40000, 5000, bytes(64))),  # Plain UDP
+        ipv4(6, bytes(40)),  # Plain TCP
+    ]
+    ethernet = bytes(12) + b'\x08\x00'
+    frames = [ethernet + p for p in packets]
+    frames.append(bytes(12) + b'\x81\x00\x00\x05\x08\x00' + packets[0])  # VLAN tag
+    frames.append(bytes(12) + b'\x86\xdd' + bytes(60))  # IPv6
+    frames.append((ethernet + packets[2])[:60])  # Snapped G-PDU
+    frames.append((ethernet + packets[5])[:24])  # Snapped outer IPv4 header
+    path = tmp_path / 'synthetic.pcap'
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack('<IIII', 1000 + i, 0, len(frame), len(frame)) + frame)
+    kinds = check_capture(str(path))
+    assert sorted(set(kinds.tolist())) == [0, 1, 2, 3]
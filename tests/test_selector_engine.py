@@ -0,0 +1,59 @@
+"""SelectorEngine half-close: a gNB EOF reaches the AMF after its queued bytes, and the reply still flows back."""
+import os
+import socket
+import sys
+import threading
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import handshake_proxy as hp  # noqa: E402
+
+PAYLOAD = 4 * 1024 * 1024  # Well past the socket buffers, so most of it is queued in the proxy
+
+
+def listener():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen()
+    return sock
+
+
+def amf(server, result, ready):
+    """Reads until EOF, but only once the gNB has finished sending, then replies with the byte count."""
+    conn, _ = server.accept()
+    ready.wait(10)
+    received = 0
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        received += len(chunk)
+    result.append(received)
+    conn.sendall(str(received).encode())
+    conn.close()
+
+
+def test_eof_waits_for_queued_bytes():
+    amf_server, gnb_server = listener(), listener()
+    pool = hp.AmfConnectionPool(*amf_server.getsockname(), min_size=0)
+    hp.amf_balancer = hp.AmfBalancer([pool])
+    hp.peer_sessions.authorize('127.0.0.1')
+    engine = hp.SelectorEngine(overflow_policy='pause', high_watermark=8 * 1024 * 1024)
+    threading.Thread(target=engine.serve, args=(gnb_server,), daemon=True).start()
+    result, ready = [], threading.Event()
+    threading.Thread(target=amf, args=(amf_server, result, ready), daemon=True).start()
+
+    gnb = socket.create_connection(gnb_server.getsockname(), timeout=10)
+    gnb.sendall(bytes(PAYLOAD))
+    gnb.shutdown(socket.SHUT_WR)
+    ready.set()
+    reply = b''
+    while True:
+        chunk = gnb.recv(64)
+        if not chunk:
+            break
+        reply += chunk
+    gnb.close()
+    assert result == [PAYLOAD]
+    assert reply == str(PAYLOAD).encode()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for traffic_generator.py.
+Runs each traffic profile against a local loopback sink and records achieved
+packet rate and bitrate against the profile's target, inter-departure jitter
+between pacer ticks (from the probe headers), CPU time per packet and peak RSS
+of the generator, and writes the results as JSON for comparison across changes.
+"""
+
+import socket
+import selectors
+import subprocess
+import multiprocessing
+import argparse
+import json
+import os
+import shlex
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime
+
+import traffic_generator as tg
+
+TRAFFIC_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traffic_generator.py')
+SINK_MAX_SAMPLES = 5000000  # Probe send times kept for inter-departure stats
+TRACE_PPS = 20000  # Packet rate of the synthetic dataset trace
+TRACE_SIZES = (64, 1400)  # Packet size range of the synthetic trace
+
+# Case -> (profile, extra traffic_generator.py flags, target packets/s, target Mbps).
+# Targets follow the profile defaults; None means "as fast as possible".
+CASES = {
+    'voip': ('voip', [], 50, 50 * 160 * 8 / 1e6),
+    'voip_20k': ('voip', ['--pps', '20000'], 20000, 20000 * 160 * 8 / 1e6),
+    'video': ('video', [], None, tg.VIDEO_FPS * tg.VIDEO_MEAN_FRAME * 8 / 1e6),
+    'video_200m': ('video', ['--bitrate', '200M'], None, 200.0),
+    'iot': ('iot', [], 0.2, 0.2 * 64 * 8 / 1e6),
+    'iot_5k': ('iot', ['--pps', '5000'], 5000, 5000 * 64 * 8 / 1e6),
+    'bulk': ('bulk', [], None, None),
+    'bulk_sendfile': ('bulk', ['--streams', '2', '--sendfile'], None, None),
+    'dataset': ('dataset', [], TRACE_PPS, None),  # Mbps filled in from the generated trace
+}
+
+
+def udp_drops(port):
+    """Datagrams the kernel dropped on our UDP socket (receive buffer full), from /proc/net/udp."""
+    try:
+        with open('/proc/net/udp') as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if fields[1].endswith(f':{port:04X}'):
+                    return int(fields[-1])
+    except (OSError, IndexError, ValueError):
+        pass
+    return 0
+
+
+def departure_summary(send_times):
+    """
+    Inter-departure gap statistics in microseconds from probe send times.
+    Datagrams of one pacer tick share a send time, so gaps are taken between
+    ticks; a burst's back-to-back datagrams would otherwise read as zero gaps.
+    """
+    import numpy as np
+    times = np.frombuffer(send_times, dtype=np.float64)
+    ticks = times[np.concatenate(([True], np.diff(times) != 0))] if len(times) else times
+    if len(ticks) < 2:
+        return {'samples': len(times), 'ticks': len(ticks)}
+    gaps = np.diff(ticks) * 1e6
+    p50, p99 = np.percentile(gaps, [50, 99])
+    return {
+        'samples': len(times),
+        'ticks': len(ticks),
+        'mean_us': float(gaps.mean()),
+        'jitter_us': float(gaps.std()),
+        'p50_us': float(p50),
+        'p99_us': float(p99),
+        'max_us': float(gaps.max()),
+    }
+
+
+def run_sink(port, ready, stop, results):
+    """
+    Loopback sink: counts UDP datagrams and TCP bytes on port and keeps the
+    send time of every probe-stamped datagram. Sends a summary through results
+    once stop is set.
+    """
+    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, tg.RECEIVE_BUFFER)
+    udp.bind(('127.0.0.1', port))
+    udp.setblocking(False)
+    tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    tcp.bind(('127.0.0.1', port))
+    tcp.listen(16)
+    tcp.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(udp, selectors.EVENT_READ)
+    selector.register(tcp, selectors.EVENT_READ)
+
+    buffer = bytearray(65536)
+    unpack = tg.PROBE_HEADER.unpack_from
+    header_size = tg.PROBE_HEADER.size
+    send_times = array('d')
+    counts = {'packets': 0, 'bytes': 0, 'tcp_bytes': 0}
+    drops_before = udp_drops(port)
+
+    def drain_udp():
+        for _ in range(tg.RECEIVE_BATCH):
+            try:
+                n = udp.recv_into(buffer)
+            except BlockingIOError:
+                return False
+            counts['packets'] += 1
+            counts['bytes'] += n
+            if n >= header_size and buffer[:4] == tg.PROBE_MAGIC and len(send_times) < SINK_MAX_SAMPLES:
+                send_times.append(unpack(buffer)[3])
+        return True
+
+    ready.set()
+    while not stop.is_set():
+        for key, _ in selector.select(0.1):
+            sock = key.fileobj
+            if sock is udp:
+                drain_udp()
+            elif sock is tcp:
+                try:
+                    conn, _ = tcp.accept()
+                except BlockingIOError:
+                    continue
+                conn.setblocking(False)
+                selector.register(conn, selectors.EVENT_READ)
+            else:
+                try:
+                    n = sock.recv_into(buffer)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    n = 0
+                if not n:
+                    selector.unregister(sock)
+                    sock.close()
+                counts['tcp_bytes'] += n
+    while drain_udp():
+        pass
+    counts['drops'] = udp_drops(port) - drops_before
+    counts['departures'] = departure_summary(send_times)
+    results.send(counts)
+
+
+def run_generator(command, show_output):
+    """Runs traffic_generator.py to completion; returns (exit code, CPU seconds, peak RSS KB, wall seconds)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, stdout=None if show_output else subprocess.DEVNULL)
+    # wait4() instead of wait(): its rusage covers the generator and any worker processes it reaped
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage.ru_utime + usage.ru_stime, usage.ru_maxrss, time.perf_counter() - start
+
+
+def make_trace(duration, pps=TRACE_PPS):
+    """Writes (or reuses) a synthetic Time,Length trace at pps; returns (path, target Mbps)."""
+    import numpy as np
+    path = os.path.join(tempfile.gettempdir(), f'traffic_benchmark_trace_{pps}pps_{duration}s.csv')
+    rng = np.random.default_rng(1)
+    count = int(pps * duration)
+    sizes = rng.integers(TRACE_SIZES[0], TRACE_SIZES[1] + 1, count)
+    if not os.path.exists(path):
+        times = np.arange(count) / pps
+        with open(path + '.tmp', 'w') as f:
+            f.write('Time,Length\n')
+            np.savetxt(f, np.column_stack((times, sizes)), fmt=['%.6f', '%d'], delimiter=',')
+        os.replace(path + '.tmp', path)
+    return path, float(sizes.mean()) * pps * 8 / 1e6
+
+
+def run_case(name, args, trace=None):
+    profile, extra, target_pps, target_mbps = CASES[name]
+    command = [sys.executable, TRAFFIC_SCRIPT, '--profile', profile, '--target', '127.0.0.1',
+               '--port', str(args.port)] + extra + shlex.split(args.generator_args)
+    if profile == 'dataset':
+        command += ['--dataset_file', trace[0]]
+        target_mbps = trace[1]
+    if profile != 'bulk':
+        command += ['--send_backend', args.send_backend]
+
+    context = multiprocessing.get_context('fork')
+    ready, stop = context.Event(), context.Event()
+    receive_end, send_end = context.Pipe(duplex=False)
+    sink = context.Process(target=run_sink, args=(args.port, ready, stop, send_end), daemon=True)
+    sink.start()
+    if not ready.wait(5):
+        print(f"ERROR: Sink did not start on port {args.port}")
+        return None
+    try:
+        # A zero-length run measures interpreter start-up and imports, which is
+        # subtracted so CPU per packet reflects the send loop
+        _, startup_cpu, _, _ = run_generator(command + ['--duration', '0'], False)
+        code, cpu, peak_rss, wall = run_generator(command + ['--duration', str(args.duration)], args.show_output)
+        time.sleep(0.2)  # Let the last datagrams land
+    finally:
+        stop.set()
+    sink_result = receive_end.recv() if receive_end.poll(10) else None
+    sink.join(timeout=5)
+    if sink_result is None:
+        print("ERROR: Sink did not report")
+        return None
+
+    packets = sink_result['packets']
+    payload = sink_result['bytes'] + sink_result['tcp_bytes']
+    # The zero-length run sends nothing for UDP profiles, so everything counted came from the timed run
+    pps = packets / args.duration
+    mbps = payload * 8 / 1e6 / args.duration
+    send_cpu = max(0.0, cpu - startup_cpu)
+    result = {
+        'profile': profile,
+        'flags': extra,
+        'exit_code': code,
+        'duration_s': args.duration,
+        'wall_s': wall,
+        'packets': packets,
+        'bytes': payload,
+        'drops': sink_result['drops'],
+        'pps': pps if profile != 'bulk' else None,
+        'mbps': mbps,
+        'target_pps': target_pps,
+        'target_mbps': target_mbps,
+        'pps_ratio': pps / target_pps if target_pps else None,
+        'mbps_ratio': mbps / target_mbps if target_mbps else None,
+        'cpu_s': cpu,
+        'startup_cpu_s': startup_cpu,
+        'cpu_us_per_packet': send_cpu / packets * 1e6 if packets else None,
+        'cpu_s_per_gb': send_cpu / (payload / 1e9) if payload else None,
+        'peak_rss_kb': peak_rss,
+        'departures': sink_result['departures'],
+    }
+    return result
+
+
+def print_case(name, result):
+    target = []
+    if result['target_pps']:
+        target.append(f"{result['pps_ratio'] * 100:.1f}% of {result['target_pps']:g} pps")
+    if result['target_mbps']:
+        target.append(f"{result['mbps_ratio'] * 100:.1f}% of {result['target_mbps']:.3f} Mbps")
+    rate = f"{result['mbps']:.3f} Mbps" if result['profile'] == 'bulk' else f"{result['pps']:.1f} pps, {result['mbps']:.3f} Mbps"
+    print(f"  {rate}" + (f" ({', '.join(target)})" if target else ""))
+    departures = result['departures']
+    if 'jitter_us' in departures:
+        print(f"  Inter-departure ({departures['ticks']} ticks): mean {departures['mean_us']:.1f} us, "
+              f"jitter {departures['jitter_us']:.1f} us, p99 {departures['p99_us']:.1f} us")
+    per_packet = f"{result['cpu_us_per_packet']:.2f} CPU-us/packet" if result['cpu_us_per_packet'] else "no packets"
+    if result['profile'] == 'bulk' and result['cpu_s_per_gb']:
+        per_packet = f"{result['cpu_s_per_gb']:.2f} CPU-s/GB"
+    print(f"  {result['cpu_s']:.2f} CPU-s ({result['startup_cpu_s']:.2f} start-up), {per_packet}, "
+          f"peak RSS {result['peak_rss_kb'] / 1024:.1f} MB, sink drops {result['drops']}")
+    if result['exit_code']:
+        print(f"  Warning: traffic_generator.py exited with code {result['exit_code']}")
+
+
+def compare(results, baseline):
+    """Prints how each case's headline numbers moved relative to a previous results file."""
+    rows = [
+        ('pps', True),
+        ('mbps', True),
+        ('cpu_us_per_packet', False),
+        ('cpu_s_per_gb', False),
+        ('peak_rss_kb', False),
+    ]
+    print("\nComparison with baseline:")
+    for name, result in results['cases'].items():
+        old_result = baseline.get('cases', {}).get(name)
+        if not old_result:
+            continue
+        print(f"  {name}:")
+        for key, higher_is_better in rows + [(('departures', 'jitter_us'), False)]:
+            if isinstance(key, tuple):
+                new, old = result[key[0]].get(key[1]), old_result.get(key[0], {}).get(key[1])
+                key = key[1]
+            else:
+                new, old = result.get(key), old_result.get(key)
+            if new is None or old is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            better = (change >= 0) == higher_is_better
+            print(f"    {key:<20} {old:>12.2f} -> {new:>12.2f}  ({change:+.1f}%{'' if better or not change else ' WORSE'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark traffic_generator.py profiles against a loopback sink',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Every case, 10 s each
+  python3 traffic_benchmark.py --output baseline.json
+
+  # The batched send paths only, with sendmmsg() instead of GSO, compared with the baseline
+  python3 traffic_benchmark.py --cases voip_20k,video_200m,dataset --send_backend sendmmsg --baseline baseline.json
+        """
+    )
+    parser.add_argument('--cases', default=','.join(CASES),
+                        help=f'Comma-separated cases (default: all of {", ".join(CASES)})')
+    parser.add_argument('--duration', type=int, default=10,
+                        help='Seconds per case (default: 10)')
+    parser.add_argument('--port', type=int, default=45000,
+                        help='Loopback sink port, UDP and TCP (default: 45000)')
+    parser.add_argument('--send_backend', choices=tg.SEND_BACKENDS, default=tg.SEND_BACKEND,
+                        help='traffic_generator.py --send_backend for the UDP profiles (default: %(default)s)')
+    parser.add_argument('--trace_pps', type=int, default=TRACE_PPS,
+                        help=f'Packet rate of the synthetic dataset trace (default: {TRACE_PPS})')
+    parser.add_argument('--generator_args', default='',
+                        help='Extra traffic_generator.py flags for every case, e.g. "--pacing_policy skip"')
+    parser.add_argument('--show_output', action='store_true', help='Do not silence the generator output')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Previous JSON results to compare against')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.cases.split(',') if name.strip()]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("ERROR: numpy library not installed.")
+        print("Install with: pip install numpy")
+        sys.exit(1)
+
+    print("=== Traffic Generator Benchmark ===")
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'duration_s': args.duration, 'send_backend': args.send_backend,
+            'trace_pps': args.trace_pps, 'generator_args': args.generator_args,
+        },
+        'cases': {},
+    }
+    trace = None
+    if 'dataset' in names:
+        trace = make_trace(args.duration, args.trace_pps)
+        CASES['dataset'] = ('dataset', [], args.trace_pps, None)
+        # Compile the schedule cache up front so the timed run measures replay, not CSV parsing
+        subprocess.run([sys.executable, TRAFFIC_SCRIPT, '--dataset_file', trace[0], '--compile_only'],
+                       stdout=subprocess.DEVNULL, check=False)
+
+    for index, name in enumerate(names, 1):
+        print(f"\n[{index}/{len(names)}] {name}: {args.duration}s...")
+        result = run_case(name, args, trace)
+        if result is None:
+            sys.exit(1)
+        results['cases'][name] = result
+        print_case(name, result)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
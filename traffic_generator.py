@@ -13,6 +13,16 @@ from datetime import datetime
 import random
 import os
 import sys
+import mmap
+import array
+import hashlib
+import ctypes
+import errno
+import json
+import math
+import selectors
+import threading
+import multiprocessing
 
 INTERFACE = 'uesimtun0'
 
@@ -30,220 +40,1351 @@ def get_ip_address(ifname):
         return None
 
 
-def generate_voip_traffic(target_ip, port, duration):
+def open_socket(sock_type, interface=None):
+    """Creates an IPv4 socket, bound to an interface's address (and device, if permitted) when one is given."""
+    sock = socket.socket(socket.AF_INET, sock_type)
+    if interface:
+        source_ip = get_ip_address(interface)
+        if source_ip:
+            sock.bind((source_ip, 0))
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+        except (OSError, AttributeError):
+            pass  # Needs CAP_NET_RAW; the source address alone still picks the UE's route
+    return sock
+
+
+PACER_SPIN_NS = 200000  # Busy-wait the last 200us before a deadline instead of sleeping
+PACER_LATE_NS = 200000  # Sends this far past their deadline are counted as late
+PACER_MAX_LAG = 1.0  # Seconds of backlog 'catchup' will burst through before skipping
+PACING_POLICIES = ('catchup', 'skip')
+PACING_POLICY = 'catchup'
+PACER_MAX_TICK_RATE = 1000  # Above this many packets/s, each tick sends a burst instead of one packet
+
+
+class Pacer:
+    """
+    Paces sends against absolute deadlines on time.monotonic_ns(). Deadline n
+    is start + n * interval, so send time and sleep overshoot never add up to
+    drift. It sleeps until just before each deadline and spins the rest of the
+    way for sub-millisecond accuracy.
+
+    When it falls behind, 'catchup' sends the late ticks back to back (bounded
+    by PACER_MAX_LAG) and 'skip' drops them to stay on the grid. It also
+    records how late each send was and how far each gap strayed from the interval.
+
+    Flow workers running several flows in threads set PACER_SPIN_NS to 0: a
+    spinning thread holds the GIL and delays every other flow's deadline.
+    """
+
+    def __init__(self, interval, policy=None, spin_ns=None):
+        self.interval_ns = max(1, int(interval * 1e9))
+        self.policy = policy or PACING_POLICY
+        self.spin_ns = PACER_SPIN_NS if spin_ns is None else spin_ns
+        self.start_ns = None
+        self.next_ns = None
+        self.last_ns = None
+        self.ticks_sent = 0
+        self.skipped = 0
+        self.late = 0
+        self.lateness_sum = 0
+        self.lateness_max = 0
+        self.gap_count = 0
+        self.gap_sum = 0
+        self.gap_dev_sum = 0
+        self.gap_dev_max = 0
+
+    def ticks(self, duration):
+        """Yields once per deadline until the schedule reaches duration seconds."""
+        self.start_ns = self.next_ns = time.monotonic_ns()
+        end_ns = self.start_ns + int(duration * 1e9)
+        while self.next_ns < end_ns:
+            self.wait()
+            yield self.ticks_sent
+
+    def set_interval(self, interval):
+        """Changes the interval from the next deadline on (used by ramped loads)."""
+        interval_ns = max(1, int(interval * 1e9))
+        self.next_ns += interval_ns - self.interval_ns
+        self.interval_ns = interval_ns
+
+    def wait(self):
+        """Blocks until the next deadline, then schedules the one after it."""
+        deadline = self.next_ns
+        now = time.monotonic_ns()
+        if now < deadline:
+            if deadline - now > self.spin_ns:
+                time.sleep((deadline - now - self.spin_ns) / 1e9)
+            while time.monotonic_ns() < deadline:
+                pass
+            now = time.monotonic_ns()
+        else:
+            lag = now - deadline
+            if lag >= self.interval_ns and (self.policy == 'skip' or lag > PACER_MAX_LAG * 1e9):
+                missed = lag // self.interval_ns
+                self.skipped += missed
+                deadline += missed * self.interval_ns
+        self._record(now, deadline)
+        self.next_ns = deadline + self.interval_ns
+
+    def _record(self, now, deadline):
+        lateness = now - deadline
+        if lateness > PACER_LATE_NS:
+            self.late += 1
+        self.lateness_sum += lateness
+        self.lateness_max = max(self.lateness_max, lateness)
+        if self.last_ns is not None:
+            gap = now - self.last_ns
+            deviation = abs(gap - self.interval_ns)
+            self.gap_count += 1
+            self.gap_sum += gap
+            self.gap_dev_sum += deviation
+            self.gap_dev_max = max(self.gap_dev_max, deviation)
+        self.last_ns = now
+        self.ticks_sent += 1
+
+    def report(self):
+        """Intended vs achieved pacing, times in milliseconds."""
+        gaps = max(1, self.gap_count)
+        return {
+            'intended_interval_ms': self.interval_ns / 1e6,
+            'achieved_interval_ms': self.gap_sum / gaps / 1e6,
+            'jitter_mean_ms': self.gap_dev_sum / gaps / 1e6,
+            'jitter_max_ms': self.gap_dev_max / 1e6,
+            'lateness_mean_ms': self.lateness_sum / max(1, self.ticks_sent) / 1e6,
+            'lateness_max_ms': self.lateness_max / 1e6,
+            'late': self.late,
+            'skipped': self.skipped,
+        }
+
+    def print_summary(self):
+        r = self.report()
+        print(f"  Pacing: {r['achieved_interval_ms']:.3f} ms achieved vs {r['intended_interval_ms']:.3f} ms intended")
+        print(f"  Inter-departure jitter: mean {r['jitter_mean_ms']:.3f} ms, max {r['jitter_max_ms']:.3f} ms")
+        print(f"  Deadline lateness: mean {r['lateness_mean_ms']:.3f} ms, max {r['lateness_max_ms']:.3f} ms "
+              f"({r['late']} late, {r['skipped']} skipped, policy {self.policy})")
+
+
+SEND_BACKENDS = ('auto', 'gso', 'sendmmsg', 'loop')
+SEND_BACKEND = 'auto'
+SEND_BATCH = 256  # Datagrams per sendmmsg() call
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)  # Linux >= 4.18
+GSO_MAX_SEGMENTS = 64  # Kernel limit on segments per UDP GSO send
+GSO_MAX_BYTES = 65000  # Keeps a GSO super-datagram under the 64 KB IP limit
+PROBE_MAGIC = b'TGP1'
+PROBE_HEADER = struct.Struct('!4sIQd')  # magic, flow id, sequence number, send time (wall clock)
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(_IoVec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+class BurstSender:
+    """
+    Sends bursts of zero-filled UDP datagrams with as few syscalls as possible.
+
+    'gso' hands runs of equal-sized datagrams to the kernel as one UDP_SEGMENT
+    super-datagram. 'sendmmsg' submits up to SEND_BATCH datagrams per call via
+    libc. 'loop' is one sendto() per datagram. 'auto' uses GSO for bursts that
+    group well and sendmmsg otherwise. Unavailable backends fall back in that
+    order, including when the kernel rejects GSO on the first send.
+
+    With a flow_id, every datagram large enough carries a probe header
+    (see PROBE_HEADER) for the measurement receiver. All datagrams of one
+    send() call (one pacer tick) carry the same send time.
+    """
+
+    def __init__(self, sock, address, backend=None, flow_id=None):
+        self.sock = sock
+        self.address = address
+        self.payload = memoryview(bytearray(GSO_MAX_BYTES))
+        self.flow_id = flow_id
+        self.seq = 0
+        self.requested = backend or SEND_BACKEND
+        self.gso = self.requested in ('auto', 'gso') and self._gso_supported()
+        self.mmsg = self.requested != 'loop' and self._setup_sendmmsg()
+        if (self.requested == 'gso' and not self.gso) or (self.requested == 'sendmmsg' and not self.mmsg):
+            print(f"Warning: send backend '{self.requested}' unavailable, using '{self.backend}'")
+
+    @property
+    def backend(self):
+        """Backends in use, e.g. 'gso+sendmmsg' for auto on a recent Linux kernel."""
+        return '+'.join(name for name, on in (('gso', self.gso), ('sendmmsg', self.mmsg)) if on) or 'loop'
+
+    def _gso_supported(self):
+        try:
+            self.sock.getsockopt(socket.SOL_UDP, UDP_SEGMENT)
+            return True
+        except (OSError, AttributeError):
+            return False
+
+    def _setup_sendmmsg(self):
+        """Prepares reusable mmsghdr/iovec arrays; False if sendmmsg() is unavailable."""
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            self._sendmmsg = libc.sendmmsg
+            addr = socket.inet_aton(self.address[0])
+        except (OSError, AttributeError):
+            return False
+        self._sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+        self._sendmmsg.restype = ctypes.c_int
+        self._name = ctypes.create_string_buffer(
+            struct.pack('=H', socket.AF_INET) + struct.pack('!H', self.address[1]) + addr + b'\x00' * 8, 16)
+        # Each message is [probe header slot, zero payload]; the header slot is empty when not stamping
+        self._headers = bytearray(PROBE_HEADER.size * SEND_BATCH)
+        headers_base = ctypes.addressof(ctypes.c_char.from_buffer(self._headers))
+        payload_base = ctypes.addressof(ctypes.c_char.from_buffer(self.payload.obj))
+        self._iovs = (_IoVec * (2 * SEND_BATCH))()
+        self._msgs = (_MMsgHdr * SEND_BATCH)()
+        # Filled a field at a time through 64-bit views: per-element ctypes
+        # stores cost ~0.7 ms a sender, which stalls other flows' threads
+        iov_words = memoryview(self._iovs).cast('B').cast('Q')
+        iov_words[0::4] = array.array('Q', range(headers_base, headers_base + PROBE_HEADER.size * SEND_BATCH,
+                                                 PROBE_HEADER.size))
+        iov_words[2::4] = array.array('Q', [payload_base]) * SEND_BATCH
+        msg_words = memoryview(self._msgs).cast('B').cast('Q')
+        stride = ctypes.sizeof(_MMsgHdr) // 8
+        msg_words[_MsgHdr.msg_name.offset // 8::stride] = array.array('Q', [ctypes.addressof(self._name)]) * SEND_BATCH
+        msg_ints = memoryview(self._msgs).cast('B').cast('I')
+        msg_ints[_MsgHdr.msg_namelen.offset // 4::2 * stride] = array.array('I', [16]) * SEND_BATCH
+        iovs_base = ctypes.addressof(self._iovs)
+        msg_words[_MsgHdr.msg_iov.offset // 8::stride] = array.array(
+            'Q', range(iovs_base, iovs_base + 2 * ctypes.sizeof(_IoVec) * SEND_BATCH, 2 * ctypes.sizeof(_IoVec)))
+        msg_words[_MsgHdr.msg_iovlen.offset // 8::stride] = array.array('Q', [2]) * SEND_BATCH
+        return True
+
+    def send(self, sizes):
+        """Sends one datagram per entry of sizes (a list of ints <= MAX_PACKET_SIZE)."""
+        now = time.time()
+        if self.gso and len(sizes) > 1:
+            groups = self._gso_groups(sizes)
+            if not self.mmsg or self.requested == 'gso' or 2 * len(groups) <= len(sizes):
+                return self._send_gso(groups, now)
+        if self.mmsg:
+            return self._send_mmsg(sizes, now)
+        stamp = self.flow_id is not None
+        for size in sizes:
+            if stamp and size >= PROBE_HEADER.size:
+                PROBE_HEADER.pack_into(self.payload, 0, PROBE_MAGIC, self.flow_id, self.seq, now)
+                self.seq += 1
+            self.sock.sendto(self.payload[:size], self.address)
+
+    def send_segments(self, total, segment):
+        """
+        Sends total bytes as segment-sized datagrams plus a shorter tail, like a
+        video frame. With a flow_id a tail shorter than PROBE_HEADER.size is
+        padded so it is stamped too. Returns the bytes sent.
+        """
+        count, tail = divmod(total, segment)
+        if tail and self.flow_id is not None:
+            tail = max(tail, PROBE_HEADER.size)
+        self.send([segment] * count + ([tail] if tail else []))
+        return segment * count + tail
+
+    def _gso_groups(self, sizes):
+        """Splits sizes into (segment, count, total) runs of equal segments, each optionally ending in one shorter datagram."""
+        groups = []
+        i, n = 0, len(sizes)
+        while i < n:
+            segment = sizes[i]
+            count, total = 1, segment
+            i += 1
+            limit = min(GSO_MAX_SEGMENTS, GSO_MAX_BYTES // segment)
+            while i < n and count < limit and sizes[i] == segment:
+                count += 1
+                total += segment
+                i += 1
+            if i < n and count < limit and sizes[i] < segment:
+                count += 1
+                total += sizes[i]
+                i += 1
+            groups.append((segment, count, total))
+        return groups
+
+    def _stamp_segments(self, segment, total, now):
+        """Writes a probe header at the start of every segment of a GSO super-datagram."""
+        for offset in range(0, total - PROBE_HEADER.size + 1, segment):
+            PROBE_HEADER.pack_into(self.payload, offset, PROBE_MAGIC, self.flow_id, self.seq, now)
+            self.seq += 1
+
+    def _send_gso(self, groups, now):
+        for index, (segment, count, total) in enumerate(groups):
+            seq = self.seq
+            if self.flow_id is not None and segment >= PROBE_HEADER.size:
+                self._stamp_segments(segment, total, now)
+            try:
+                if count == 1:
+                    self.sock.sendto(self.payload[:total], self.address)
+                else:
+                    self.sock.sendmsg([self.payload[:total]],
+                                      [(socket.SOL_UDP, UDP_SEGMENT, struct.pack('=H', segment))],
+                                      0, self.address)
+            except OSError as e:
+                if e.errno not in (errno.EIO, errno.EINVAL, errno.ENOPROTOOPT, errno.EOPNOTSUPP):
+                    raise
+                # Device path cannot segment (e.g. no checksum offload): stop using GSO
+                print(f"Warning: UDP GSO rejected ({e.strerror}), falling back to "
+                      f"{'sendmmsg' if self.mmsg else 'loop'}")
+                self.gso = False
+                self.seq = seq
+                rest = []
+                for segment, count, total in groups[index:]:
+                    tail = total - segment * (count - 1)
+                    rest.extend([segment] * (count - 1) + [tail])
+                return self.send(rest)
+
+    def _send_mmsg(self, sizes, now):
+        fd = self.sock.fileno()
+        header_size = PROBE_HEADER.size if self.flow_id is not None else 0
+        for start in range(0, len(sizes), SEND_BATCH):
+            batch = sizes[start:start + SEND_BATCH]
+            for i, size in enumerate(batch):
+                if header_size and size >= header_size:
+                    PROBE_HEADER.pack_into(self._headers, i * header_size, PROBE_MAGIC, self.flow_id, self.seq, now)
+                    self.seq += 1
+                    self._iovs[2 * i].iov_len = header_size
+                    self._iovs[2 * i + 1].iov_len = size - header_size
+                else:
+                    self._iovs[2 * i].iov_len = 0
+                    self._iovs[2 * i + 1].iov_len = size
+            self._submit(fd, self._msgs, len(batch))
+
+    def _submit(self, fd, msgs, count):
+        """Calls sendmmsg() until all count prepared messages are sent."""
+        done = 0
+        while done < count:
+            sent = self._sendmmsg(fd, ctypes.byref(msgs[done]), count - done, 0)
+            if sent < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                raise OSError(err, os.strerror(err))
+            done += sent
+
+    def send_buffers(self, buffer, offsets, lengths, sizes):
+        """
+        Sends one datagram per entry of the NumPy arrays: lengths[i] bytes of
+        buffer (e.g. a memory-mapped capture) from offsets[i], padded to sizes[i]
+        from the payload buffer. With sendmmsg the kernel reads straight from
+        buffer, and each batch's iovecs are filled in one vectorised step; GSO
+        does not apply since the datagrams carry different data.
+        """
+        if not self.mmsg:
+            view = memoryview(buffer)
+            for offset, length, size in zip(offsets.tolist(), lengths.tolist(), sizes.tolist()):
+                self.sock.sendmsg([view[offset:offset + length], self.payload[:size - length]], [], 0, self.address)
+            return
+        import numpy as np
+        if not hasattr(self, '_buffer_msgs'):
+            # Each message is [captured bytes, padding]; the padding always starts at the payload buffer
+            self._buffer_iovs = (_IoVec * (2 * SEND_BATCH))()
+            self._buffer_msgs = (_MMsgHdr * SEND_BATCH)()
+            self._buffer_table = np.frombuffer(self._buffer_iovs, dtype=np.uint64).reshape(-1, 2)  # (base, len) rows
+            self._buffer_table[1::2, 0] = ctypes.addressof(ctypes.c_char.from_buffer(self.payload.obj))
+            for i, msg in enumerate(self._buffer_msgs):
+                msg.msg_hdr.msg_name = ctypes.addressof(self._name)
+                msg.msg_hdr.msg_namelen = 16
+                msg.msg_hdr.msg_iov = ctypes.pointer(self._buffer_iovs[2 * i])
+                msg.msg_hdr.msg_iovlen = 2
+        fd = self.sock.fileno()
+        base = ctypes.addressof(ctypes.c_char.from_buffer(buffer))
+        table = self._buffer_table
+        for start in range(0, len(sizes), SEND_BATCH):
+            count = min(SEND_BATCH, len(sizes) - start)
+            rows = slice(0, 2 * count, 2)
+            table[rows, 0] = base + offsets[start:start + count]
+            table[rows, 1] = lengths[start:start + count]
+            table[1:2 * count:2, 1] = sizes[start:start + count] - lengths[start:start + count]
+            self._submit(fd, self._buffer_msgs, count)
+
+
+RAMP_MODES = ('step', 'linear')
+FEEDBACK_MAGIC = b'TGF1'
+FEEDBACK_HEADER = struct.Struct('!4sIII')  # magic, flow id, packets received, packets lost (last interval)
+FEEDBACK_POLL_INTERVAL = 0.1  # Seconds between checks for receiver feedback
+
+
+def parse_bitrate(text):
+    """Parses a bitrate such as '800k', '50M' or '1.5G' into bits per second."""
+    text = str(text).strip()
+    scale = {'k': 1e3, 'm': 1e6, 'g': 1e9}.get(text[-1:].lower())
+    value = float(text[:-1] if scale else text) * (scale or 1)
+    if value <= 0:
+        raise ValueError(f"bitrate must be positive: {text}")
+    return value
+
+
+class Load:
+    """
+    Offered load for a profile. It is either absolute (pps or bitrate) or a
+    multiple (rate) of the profile's default, and can be ramped: 'step'
+    multiplies it by ramp_factor every ramp_interval seconds, 'linear' adds
+    (ramp_factor - 1) x the base rate per interval. A ramp stops when receiver
+    feedback (see run_receiver) reports loss of at least loss_threshold percent.
+    """
+
+    def __init__(self, pps=None, bitrate=None, rate=1.0, ramp=None, ramp_interval=10.0,
+                 ramp_factor=2.0, loss_threshold=1.0):
+        self.pps = pps
+        self.bitrate = bitrate
+        self.rate = rate
+        self.ramp = ramp
+        self.ramp_interval = ramp_interval
+        self.ramp_factor = ramp_factor
+        self.loss_threshold = loss_threshold
+        self.start_time = None
+        self.next_poll = 0.0
+        self.stopped = False
+        self.stop_multiplier = None
+        self.stop_loss = None
+
+    def describe(self):
+        if self.pps:
+            base = f"{self.pps:g} pkt/s"
+        elif self.bitrate:
+            base = f"{self.bitrate / 1e6:g} Mbps"
+        else:
+            base = f"{self.rate:g}x default"
+        if self.ramp:
+            base += f", {self.ramp} ramp x{self.ramp_factor:g} every {self.ramp_interval:g}s"
+        return base
+
+    def packet_rate(self, default_pps, packet_size):
+        """Base packets/s for a profile sending packet_size-byte packets."""
+        if self.pps:
+            return self.pps
+        if self.bitrate:
+            return self.bitrate / 8 / packet_size
+        return default_pps * self.rate
+
+    def byte_rate(self, default_bytes, packet_size):
+        """Base bytes/s for a profile whose packets average packet_size bytes."""
+        if self.bitrate:
+            return self.bitrate / 8
+        if self.pps:
+            return self.pps * packet_size
+        return default_bytes * self.rate
+
+    def start(self):
+        self.start_time = time.monotonic()
+
+    def multiplier(self):
+        """Current ramp multiplier on the base rate."""
+        if not self.ramp or self.start_time is None:
+            return 1.0
+        if self.stopped:
+            return self.stop_multiplier
+        steps = (time.monotonic() - self.start_time) / self.ramp_interval
+        if self.ramp == 'step':
+            return self.ramp_factor ** int(steps)
+        return 1.0 + (self.ramp_factor - 1.0) * steps
+
+    def poll_feedback(self, sock, flow_id):
+        """Reads pending receiver feedback; stops the ramp once loss crosses the threshold."""
+        now = time.monotonic()
+        if not self.ramp or self.stopped or now < self.next_poll:
+            return
+        self.next_poll = now + FEEDBACK_POLL_INTERVAL
+        while True:
+            try:
+                data = sock.recv(64, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue  # ICMP error from an earlier send; keep draining
+            if len(data) != FEEDBACK_HEADER.size or data[:4] != FEEDBACK_MAGIC:
+                continue
+            _, fid, received, lost = FEEDBACK_HEADER.unpack(data)
+            if fid != flow_id or received + lost == 0:
+                continue
+            loss = 100.0 * lost / (received + lost)
+            if loss >= self.loss_threshold:
+                self.stop_multiplier = self.multiplier()
+                self.stop_loss = loss
+                self.stopped = True
+                return
+
+    def print_summary(self, unit, base):
+        if not self.ramp:
+            return
+        final = base * (self.stop_multiplier if self.stopped else self.multiplier())
+        if self.stopped:
+            print(f"  Ramp stopped: {self.stop_loss:.2f}% loss reported at {final:.1f} {unit}")
+            if self.ramp == 'step' and self.stop_multiplier > 1:
+                print(f"  Last step before loss: {final / self.ramp_factor:.1f} {unit}")
+        else:
+            print(f"  Ramp reached {final:.1f} {unit} without loss feedback above {self.loss_threshold:g}%")
+
+
+def packet_ticks(pps):
+    """Splits a packet rate into (tick interval, packets per tick) so the pacer never ticks faster than PACER_MAX_TICK_RATE."""
+    tick_rate = min(pps, PACER_MAX_TICK_RATE)
+    return 1.0 / tick_rate, pps / tick_rate
+
+
+def generate_voip_traffic(target_ip, port, duration, interface=None, load=None):
     """
     Simulates VoIP traffic (like a phone call).
     Small packets sent at regular intervals (20ms typical for G.711 codec).
+    The packet rate follows load; above PACER_MAX_TICK_RATE packets go out in bursts.
     """
+    load = load or Load()
+    packet_size = 160  # G.711 codec typical packet size
+    base_pps = load.packet_rate(50, packet_size)  # 20ms between packets
+    
     print(f"\n=== VoIP Traffic Profile ===")
     print(f"Target: {target_ip}:{port}")
     print(f"Duration: {duration}s")
-    print(f"Pattern: 160 bytes every 20ms (50 packets/sec)")
+    print(f"Pattern: {packet_size} bytes at {base_pps:g} packets/sec ({load.describe()})")
     
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock = open_socket(socket.SOCK_DGRAM, interface)
+    sender = BurstSender(sock, (target_ip, port), flow_id=random.getrandbits(32))
+    print(f"Flow ID: {sender.flow_id:08x}")
     
-    packet_size = 160  # G.711 codec typical packet size
-    interval = 0.020  # 20ms between packets
+    multiplier = load.multiplier()
+    interval, per_tick = packet_ticks(base_pps * multiplier)
+    pacer = Pacer(interval)
+    credit = 0.0
     
-    start_time = time.time()
+    start_time = time.monotonic()
+    next_report = start_time + 1.0
     packet_count = 0
+    load.start()
     
     try:
-        while time.time() - start_time < duration:
-            # Create a simple payload with timestamp
-            timestamp = time.time()
-            payload = struct.pack('!d', timestamp) + b'\x00' * (packet_size - 8)
-            
-            sock.sendto(payload, (target_ip, port))
-            packet_count += 1
+        for _ in pacer.ticks(duration):
+            credit += per_tick
+            burst = int(credit)
+            credit -= burst
+            if burst:
+                sender.send([packet_size] * burst)
+                packet_count += burst
             
-            if packet_count % 50 == 0:  # Print every second
-                elapsed = time.time() - start_time
-                print(f"[{elapsed:.1f}s] Sent {packet_count} VoIP packets")
+            load.poll_feedback(sock, sender.flow_id)
+            if load.stopped:
+                break
+            if load.multiplier() != multiplier:
+                multiplier = load.multiplier()
+                interval, per_tick = packet_ticks(base_pps * multiplier)
+                pacer.set_interval(interval)
             
-            time.sleep(interval)
+            now = time.monotonic()
+            if now >= next_report:  # Print every second
+                print(f"[{now - start_time:.1f}s] Sent {packet_count} VoIP packets ({base_pps * multiplier:.0f} pkt/s)")
+                next_report += 1.0
     
     except KeyboardInterrupt:
         print("\nVoIP traffic stopped by user")
     finally:
         sock.close()
-        elapsed = time.time() - start_time
+        elapsed = time.monotonic() - start_time
         print(f"\nVoIP Summary:")
         print(f"  Duration: {elapsed:.1f}s")
         print(f"  Packets sent: {packet_count}")
         print(f"  Average rate: {packet_count/elapsed:.1f} pkt/s")
+        pacer.print_summary()
+        load.print_summary('pkt/s', base_pps)
+
+
+VIDEO_FPS = 30
+VIDEO_MTU = 1400  # Max payload per video packet
+VIDEO_KEYFRAME_PROBABILITY = 0.1
+VIDEO_MEAN_FRAME = 3400  # Mean of the keyframe/regular frame size mix below, in bytes
 
 
-def generate_video_traffic(target_ip, port, duration):
+def video_frame_sizes(count, scale, rng):
+    """
+    Draws count frame sizes as a NumPy array: 10% keyframes of 8-15 KB and
+    1-4 KB regular frames, scaled by scale.
+    """
+    import numpy as np
+    keyframes = rng.random(count) < VIDEO_KEYFRAME_PROBABILITY
+    sizes = np.where(keyframes, rng.integers(8000, 15001, count), rng.integers(1000, 4001, count))
+    return np.maximum(1, (sizes * scale).astype('int64'))
+
+
+def generate_video_traffic(target_ip, port, duration, interface=None, load=None):
     """
     Simulates video streaming traffic.
     Bursty UDP packets with variable sizes (mimics video frames).
+    The bitrate follows load by scaling frame sizes at a fixed 30 fps; frame
+    sizes are drawn one second at a time with NumPy.
     """
+    import numpy as np
+    load = load or Load()
+    base_rate = load.byte_rate(VIDEO_FPS * VIDEO_MEAN_FRAME, VIDEO_MTU)
+    base_scale = base_rate / (VIDEO_FPS * VIDEO_MEAN_FRAME)
+    
     print(f"\n=== Video Streaming Profile ===")
     print(f"Target: {target_ip}:{port}")
     print(f"Duration: {duration}s")
-    print(f"Pattern: Variable bursts (~30 fps)")
+    print(f"Pattern: Variable bursts (~{VIDEO_FPS} fps, ~{base_rate * 8 / 1e6:.2f} Mbps, {load.describe()})")
     
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock = open_socket(socket.SOCK_DGRAM, interface)
     
-    frame_interval = 1.0 / 30.0  # 30 fps
+    frame_interval = 1.0 / VIDEO_FPS
+    pacer = Pacer(frame_interval)
+    sender = BurstSender(sock, (target_ip, port), flow_id=random.getrandbits(32))
+    print(f"Send backend: {sender.backend}")
+    print(f"Flow ID: {sender.flow_id:08x}")
+    rng = np.random.default_rng()
     
-    start_time = time.time()
+    start_time = time.monotonic()
+    next_report = start_time + 5.0
     packet_count = 0
     total_bytes = 0
+    frames = []
+    load.start()
     
     try:
-        while time.time() - start_time < duration:
+        for _ in pacer.ticks(duration):
             # Video frame sizes vary - some are keyframes (larger), others are smaller
-            if random.random() < 0.1:  # 10% chance of keyframe
-                frame_size = random.randint(8000, 15000)  # Keyframe
-            else:
-                frame_size = random.randint(1000, 4000)  # Regular frame
+            if not frames:
+                frames = video_frame_sizes(VIDEO_FPS, base_scale * load.multiplier(), rng).tolist()
+            frame_size = frames.pop()
             
-            # Split frame into MTU-sized packets (1400 bytes max)
-            mtu = 1400
-            chunks = (frame_size + mtu - 1) // mtu
+            # Split frame into MTU-sized packets
+            total_bytes += sender.send_segments(frame_size, VIDEO_MTU)
+            packet_count += (frame_size + VIDEO_MTU - 1) // VIDEO_MTU
             
-            for i in range(chunks):
-                chunk_size = min(mtu, frame_size - i * mtu)
-                payload = b'\x00' * chunk_size
-                sock.sendto(payload, (target_ip, port))
-                packet_count += 1
-                total_bytes += chunk_size
+            load.poll_feedback(sock, sender.flow_id)
+            if load.stopped:
+                break
             
-            if int(time.time() - start_time) % 5 == 0 and packet_count % 150 == 0:
-                elapsed = time.time() - start_time
+            now = time.monotonic()
+            if now >= next_report:
+                elapsed = now - start_time
                 mbps = (total_bytes * 8 / 1000000) / elapsed
                 print(f"[{elapsed:.1f}s] Sent {packet_count} packets, {total_bytes/1024:.0f} KB ({mbps:.2f} Mbps)")
-            
-            time.sleep(frame_interval)
+                next_report += 5.0
     
     except KeyboardInterrupt:
         print("\nVideo traffic stopped by user")
     finally:
         sock.close()
-        elapsed = time.time() - start_time
+        elapsed = time.monotonic() - start_time
         mbps = (total_bytes * 8 / 1000000) / elapsed
         print(f"\nVideo Summary:")
         print(f"  Duration: {elapsed:.1f}s")
         print(f"  Packets sent: {packet_count}")
         print(f"  Data sent: {total_bytes/1024/1024:.2f} MB")
         print(f"  Average bitrate: {mbps:.2f} Mbps")
+        print(f"  Frames sent: {pacer.ticks_sent}")
+        pacer.print_summary()
+        load.print_summary('Mbps', base_rate * 8 / 1e6)
+
+
+BULK_CHUNK = 256 * 1024  # Bytes per send() call on the copy path
+BULK_SENDFILE_SIZE = 16 * 1024 * 1024  # Size of the zero-filled memfd used by --sendfile
+
+
+class BulkStream:
+    """
+    One TCP connection of the bulk profile. The send loop does nothing but
+    send and add to a byte counter; reporting reads the counter from another thread.
+    """
+
+    def __init__(self, index, sock, source_fd=None, source_size=0):
+        self.index = index
+        self.sock = sock
+        self.source_fd = source_fd
+        self.source_size = source_size
+        self.sent = 0
+        self.error = None
+
+    def run(self, stop):
+        try:
+            if self.source_fd is None:
+                payload = memoryview(bytearray(BULK_CHUNK))
+                while not stop.is_set():
+                    self.sent += self.sock.send(payload)
+            else:
+                # Zero-copy: the kernel moves pages from the file straight to the socket
+                out_fd = self.sock.fileno()
+                offset = 0
+                while not stop.is_set():
+                    n = os.sendfile(out_fd, self.source_fd, offset, self.source_size - offset)
+                    self.sent += n
+                    offset += n
+                    if offset >= self.source_size:
+                        offset = 0
+        except OSError as e:
+            if not stop.is_set():
+                self.error = e
 
 
-def generate_bulk_traffic(target_ip, port, duration):
+def open_bulk_source(path=None):
+    """Returns (fd, size) to sendfile() from: the given file, or a zero-filled memfd."""
+    if path:
+        fd = os.open(path, os.O_RDONLY)
+        size = os.fstat(fd).st_size
+        if size == 0:
+            os.close(fd)
+            raise ValueError(f"{path} is empty")
+        return fd, size
+    if hasattr(os, 'memfd_create'):
+        fd = os.memfd_create('bulk_payload')
+    else:
+        import tempfile
+        fd = os.dup(tempfile.TemporaryFile().fileno())
+    os.ftruncate(fd, BULK_SENDFILE_SIZE)
+    return fd, BULK_SENDFILE_SIZE
+
+
+def generate_bulk_traffic(target_ip, port, duration, interface=None, streams=1, sendfile=False,
+                          source_file=None, interval=1.0):
     """
     Simulates bulk data transfer (like FTP or file download).
-    Continuous TCP stream at maximum throughput.
+    Continuous TCP streams at maximum throughput, optionally several in
+    parallel and zero-copy via os.sendfile() from a file or memfd. Like iperf,
+    per-stream throughput is reported every interval from outside the send loops.
     """
+    sendfile = sendfile or bool(source_file)
     print(f"\n=== Bulk Transfer Profile ===")
     print(f"Target: {target_ip}:{port}")
     print(f"Duration: {duration}s")
-    print(f"Pattern: Continuous TCP stream")
+    source = f", sendfile from {source_file or 'memfd'}" if sendfile else ""
+    print(f"Pattern: {streams} continuous TCP stream{'s' if streams > 1 else ''}{source}")
     
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(10)
+    source_fd, source_size = None, 0
+    bulk_streams = []
+    stop = threading.Event()
+    threads = []
     
     try:
+        if sendfile:
+            source_fd, source_size = open_bulk_source(source_file)
+        
         print("Connecting to server...")
-        sock.connect((target_ip, port))
+        for index in range(streams):
+            sock = open_socket(socket.SOCK_STREAM, interface)
+            bulk_streams.append(BulkStream(index + 1, sock, source_fd, source_size))
+            sock.settimeout(10)
+            sock.connect((target_ip, port))
+            sock.settimeout(None)  # Blocking sends; os.sendfile() needs a blocking socket
         print("Connected! Starting bulk transfer...")
         
-        chunk_size = 65536  # 64KB chunks
-        payload = b'\x00' * chunk_size
-        
-        start_time = time.time()
-        total_bytes = 0
+        threads = [threading.Thread(target=stream.run, args=(stop,), daemon=True) for stream in bulk_streams]
+        start_time = time.monotonic()
+        for thread in threads:
+            thread.start()
         
-        while time.time() - start_time < duration:
-            bytes_sent = sock.send(payload)
-            total_bytes += bytes_sent
-            
-            # Print stats every 2 seconds
-            elapsed = time.time() - start_time
-            if int(elapsed) % 2 == 0 and elapsed > 0:
-                mbps = (total_bytes * 8 / 1000000) / elapsed
-                if int(elapsed * 10) % 20 == 0:  # Avoid printing same second multiple times
-                    print(f"[{elapsed:.1f}s] Transferred {total_bytes/1024/1024:.2f} MB ({mbps:.2f} Mbps)")
+        last = [0] * streams
+        next_report = start_time + interval
+        end_time = start_time + duration
+        while True:
+            now = time.monotonic()
+            if now >= end_time or all(not thread.is_alive() for thread in threads):
+                break
+            time.sleep(min(next_report, end_time) - now)
+            now = time.monotonic()
+            if now < next_report:
+                continue
+            elapsed = now - start_time
+            counts = [stream.sent for stream in bulk_streams]
+            span = interval + (now - next_report)
+            if streams > 1:
+                for stream, count, before in zip(bulk_streams, counts, last):
+                    print(f"[{elapsed:5.1f}s] stream {stream.index}: {(count - before) * 8 / 1e6 / span:.2f} Mbps")
+            total = sum(counts) - sum(last)
+            label = "SUM" if streams > 1 else "Transferred"
+            print(f"[{elapsed:5.1f}s] {label}: {sum(counts)/1024/1024:.2f} MB ({total * 8 / 1e6 / span:.2f} Mbps)")
+            last = counts
+            next_report += interval
         
-        elapsed = time.time() - start_time
+        stop.set()
+        elapsed = time.monotonic() - start_time
+        total_bytes = sum(stream.sent for stream in bulk_streams)
         mbps = (total_bytes * 8 / 1000000) / elapsed
         print(f"\nBulk Transfer Summary:")
         print(f"  Duration: {elapsed:.1f}s")
         print(f"  Data sent: {total_bytes/1024/1024:.2f} MB")
         print(f"  Average throughput: {mbps:.2f} Mbps")
+        if streams > 1:
+            for stream in bulk_streams:
+                print(f"  Stream {stream.index}: {stream.sent * 8 / 1e6 / elapsed:.2f} Mbps")
+        for stream in bulk_streams:
+            if stream.error:
+                print(f"  Stream {stream.index} failed: {stream.error}")
     
     except socket.timeout:
         print("Connection timed out")
     except ConnectionRefusedError:
         print(f"Connection refused. Make sure a server is listening on {target_ip}:{port}")
-        print(f"Run this on the target: nc -l {port} > /dev/null")
+        print(f"Run this on the target: python3 traffic_generator.py --receive --port {port}")
+        print(f"(or, for a single stream: nc -l {port} > /dev/null)")
+    except KeyboardInterrupt:
+        print("\nBulk transfer stopped by user")
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        sock.close()
+        stop.set()
+        for stream in bulk_streams:
+            try:
+                stream.sock.shutdown(socket.SHUT_RDWR)  # Unblocks a send stuck on a full window
+            except OSError:
+                pass
+        for thread in threads:
+            thread.join(timeout=2)
+        for stream in bulk_streams:
+            stream.sock.close()
+        if source_fd is not None:
+            os.close(source_fd)
 
 
-def generate_iot_traffic(target_ip, port, duration):
+def generate_iot_traffic(target_ip, port, duration, interface=None, load=None):
     """
     Simulates IoT/sensor traffic.
-    Small, infrequent status updates.
+    Small, infrequent status updates. With a higher load (e.g. many sensors
+    behind one UE) updates above PACER_MAX_TICK_RATE/s go out as bursts.
     """
+    load = load or Load()
+    packet_size = 64  # Small sensor reading
+    base_pps = load.packet_rate(0.2, packet_size)  # Update every 5 seconds
+    
     print(f"\n=== IoT/Sensor Profile ===")
     print(f"Target: {target_ip}:{port}")
     print(f"Duration: {duration}s")
-    print(f"Pattern: Small updates every 5 seconds")
+    print(f"Pattern: Small updates every {1 / base_pps:g} seconds ({load.describe()})")
     
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock = open_socket(socket.SOCK_DGRAM, interface)
+    sender = BurstSender(sock, (target_ip, port), flow_id=random.getrandbits(32))
+    print(f"Flow ID: {sender.flow_id:08x}")
     
-    packet_size = 64  # Small sensor reading
-    interval = 5.0  # Update every 5 seconds
+    multiplier = load.multiplier()
+    interval, per_tick = packet_ticks(base_pps * multiplier)
+    pacer = Pacer(interval)
+    credit = 0.0
     
-    start_time = time.time()
+    start_time = time.monotonic()
+    next_report = start_time
     packet_count = 0
+    load.start()
     
     try:
-        while time.time() - start_time < duration:
-            # Simulate sensor data (timestamp + random values)
-            timestamp = time.time()
-            temp = random.uniform(20.0, 25.0)
-            humidity = random.uniform(40.0, 60.0)
-            
-            payload = struct.pack('!dff', timestamp, temp, humidity)
-            payload += b'\x00' * (packet_size - len(payload))
-            
-            sock.sendto(payload, (target_ip, port))
-            packet_count += 1
+        for _ in pacer.ticks(duration):
+            credit += per_tick
+            burst = int(credit)
+            credit -= burst
+            if burst == 1:
+                # Simulate sensor data (probe header + random values)
+                temp = random.uniform(20.0, 25.0)
+                humidity = random.uniform(40.0, 60.0)
+                
+                payload = PROBE_HEADER.pack(PROBE_MAGIC, sender.flow_id, sender.seq, time.time())
+                payload += struct.pack('!ff', temp, humidity)
+                payload += b'\x00' * (packet_size - len(payload))
+                
+                sock.sendto(payload, (target_ip, port))
+                sender.seq += 1
+            elif burst:
+                sender.send([packet_size] * burst)
+            packet_count += burst
             
-            elapsed = time.time() - start_time
-            print(f"[{elapsed:.1f}s] Sent update #{packet_count} (temp: {temp:.1f}°C, humidity: {humidity:.1f}%)")
+            load.poll_feedback(sock, sender.flow_id)
+            if load.stopped:
+                break
+            if load.multiplier() != multiplier:
+                multiplier = load.multiplier()
+                interval, per_tick = packet_ticks(base_pps * multiplier)
+                pacer.set_interval(interval)
             
-            time.sleep(interval)
+            now = time.monotonic()
+            if now >= next_report:
+                if burst == 1 and base_pps * multiplier <= 1:
+                    print(f"[{now - start_time:.1f}s] Sent update #{packet_count} (temp: {temp:.1f}°C, humidity: {humidity:.1f}%)")
+                else:
+                    print(f"[{now - start_time:.1f}s] Sent {packet_count} updates ({base_pps * multiplier:.0f}/s)")
+                next_report = max(next_report + 1.0, now)
     
     except KeyboardInterrupt:
         print("\nIoT traffic stopped by user")
     finally:
         sock.close()
-        elapsed = time.time() - start_time
+        elapsed = time.monotonic() - start_time
         print(f"\nIoT Summary:")
         print(f"  Duration: {elapsed:.1f}s")
         print(f"  Updates sent: {packet_count}")
+        pacer.print_summary()
+        load.print_summary('updates/s', base_pps)
+
+
+DATASET_CHUNK_ROWS = 200000  # Rows parsed per read_csv chunk when streaming a dataset
+UPLINK_PATTERN = 'up|tx|send'  # Direction values treated as uplink
+UPLINK, DOWNLINK = 0, 1
+
+
+def find_dataset_columns(columns):
+    """Picks the time, size and (optional) direction columns by name, case-insensitively."""
+    time_col = None
+    size_col = None
+    direction_col = None
+    for col in columns:
+        col_lower = col.lower()
+        if 'time' in col_lower and time_col is None:
+            time_col = col
+        if any(keyword in col_lower for keyword in ['size', 'length', 'bytes']) and size_col is None:
+            size_col = col
+        if 'direction' in col_lower and direction_col is None:
+            direction_col = col
+    return time_col, size_col, direction_col
 
 
-def generate_dataset_traffic(target_ip, port, duration, dataset_file):
+def find_flow_columns(columns):
+    """Picks the source and destination address columns (as in a Wireshark CSV export), if present."""
+    lowered = {col.lower(): col for col in columns}
+    source = next((lowered[c] for c in ('source', 'src', 'ip.src', 'source address') if c in lowered), None)
+    destination = next((lowered[c] for c in ('destination', 'dst', 'ip.dst', 'destination address')
+                        if c in lowered), None)
+    if source and destination:
+        return source, destination
+    return None, None
+
+
+def read_last_csv_row(dataset_file, columns):
+    """Returns the last data row as a dict by reading only the tail of the file."""
+    import csv
+    with open(dataset_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        f.seek(max(0, end - 65536))
+        lines = f.read().decode(errors='replace').splitlines()
+    for line in reversed(lines):
+        if line.strip():
+            values = next(csv.reader([line]))
+            if len(values) == len(columns):
+                return dict(zip(columns, values))
+    return None
+
+
+def iter_dataset_chunks(dataset_file, chunk_rows=DATASET_CHUNK_ROWS, quiet=False):
+    """
+    Streams a packet trace CSV as NumPy arrays (send offsets in seconds, sizes
+    in bytes, directions, conversation ids). Only the needed columns are parsed,
+    in chunks of chunk_rows, so memory stays bounded and the first packets are
+    available almost immediately. Direction is DOWNLINK for rows whose direction
+    column does not match UPLINK_PATTERN, otherwise UPLINK. Conversation ids number the
+    unordered source/destination address pairs (0 without address columns). The
+    trace is assumed to be in time order; offsets are relative to its first row.
+    Raises ValueError if the dataset cannot be interpreted.
+    """
+    import numpy as np
+    import pandas as pd
+
+    columns = list(pd.read_csv(dataset_file, nrows=0).columns)
+    if not quiet:
+        print(f"Columns found: {columns}")
+    time_col, size_col, direction_col = find_dataset_columns(columns)
+    source_col, destination_col = find_flow_columns(columns)
+    if time_col is None:
+        raise ValueError("Could not find 'Time' column in dataset")
+    if size_col is None:
+        raise ValueError("Could not find 'Packet Size' or 'Length' column in dataset")
+    if not quiet:
+        print(f"Using columns: Time='{time_col}', Size='{size_col}'")
+
+    # Decide once how to parse time: numeric values, or datetime strings
+    head = pd.read_csv(dataset_file, usecols=[time_col], nrows=1000)[time_col]
+    numeric_time = pd.to_numeric(head, errors='coerce').notna().any()
+    if not numeric_time:
+        if not quiet:
+            print("Attempting to parse timestamps as datetime...")
+        # Seconds are counted from the first timestamp to keep float precision
+        time_base = pd.to_datetime(head, errors='coerce').min()
+        if pd.isna(time_base):
+            raise ValueError("Could not parse time column")
+
+    def to_seconds(series):
+        if numeric_time:
+            return pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64')
+        parsed = pd.to_datetime(series, errors='coerce')
+        return (parsed - time_base).dt.total_seconds().to_numpy(dtype='float64')
+
+    # The trace span (first to last row) decides between seconds and milliseconds;
+    # the last row is read from the file tail instead of parsing everything
+    first_value = to_seconds(head.iloc[:1])[0]
+    last_row = read_last_csv_row(dataset_file, columns)
+    last_value = to_seconds(pd.Series([last_row[time_col]]))[0] if last_row else first_value
+    scale = 1.0
+    if numeric_time and last_value - first_value > 10000:  # Likely milliseconds
+        scale = 1000.0
+        if not quiet:
+            print("Note: Converted time column from milliseconds to seconds")
+
+    usecols = [c for c in (time_col, size_col, direction_col, source_col, destination_col) if c]
+    dtypes = {size_col: 'float64'}
+    for col in (direction_col, source_col, destination_col):
+        if col:
+            dtypes[col] = 'str'
+    if not numeric_time:
+        dtypes[time_col] = 'str'
+    reader = pd.read_csv(dataset_file, usecols=usecols, dtype=dtypes, chunksize=chunk_rows)
+
+    origin = None
+    total_rows = 0
+    uplink_rows = 0
+    conversations = {}
+    for chunk in reader:
+        total_rows += len(chunk)
+        times = to_seconds(chunk[time_col])
+        sizes = chunk[size_col].to_numpy(dtype='float64')
+        valid = ~(pd.isna(times) | pd.isna(sizes))
+        if not valid.all():
+            chunk = chunk[valid]
+            times = times[valid]
+            sizes = sizes[valid]
+        if len(times) == 0:
+            continue
+        if direction_col:
+            uplink = chunk[direction_col].str.lower().str.contains(UPLINK_PATTERN, na=False).to_numpy()
+            directions = np.where(uplink, UPLINK, DOWNLINK).astype('uint8')
+        else:
+            directions = np.full(len(times), UPLINK, dtype='uint8')
+        if source_col:
+            # Key both directions of a conversation the same way
+            src = chunk[source_col].fillna('').astype(str)
+            dst = chunk[destination_col].fillna('').astype(str)
+            forward = src <= dst
+            keys = src.where(forward, dst) + '|' + dst.where(forward, src)
+            codes, uniques = pd.factorize(keys)
+            ids = np.array([conversations.setdefault(key, len(conversations)) for key in uniques],
+                           dtype='uint32')
+            flows = ids[codes]
+        else:
+            flows = np.zeros(len(times), dtype='uint32')
+        if origin is None:
+            origin = times[0]
+        uplink_rows += int((directions == UPLINK).sum())
+        yield (times - origin) / scale, sizes.astype('int64'), directions, flows
+
+    if not quiet:
+        detail = f" ({uplink_rows} uplink rows)" if direction_col else ""
+        if source_col:
+            detail += f", {len(conversations)} conversations"
+        print(f"✓ Streamed {total_rows} rows from dataset{detail}")
+
+
+SCHEDULE_MAGIC = b'TGSCHED1'
+SCHEDULE_HEADER = struct.Struct('<8sIQQq16s12x')  # magic, version, count, src size, src mtime_ns, src hash
+SCHEDULE_VERSION = 2
+MAX_PACKET_SIZE = 9000  # Cap at jumbo frame size
+REPLAY_MAX_BURST = 1024  # Packets sent per burst before re-checking the clock when behind
+
+
+def schedule_cache_path(dataset_file):
+    """Cache file next to the dataset, or in the temp dir if that is not writable."""
+    path = dataset_file + '.sched'
+    if os.access(os.path.dirname(os.path.abspath(path)), os.W_OK):
+        return path
+    import tempfile
+    name = hashlib.blake2b(os.path.abspath(dataset_file).encode(), digest_size=8).hexdigest()
+    return os.path.join(tempfile.gettempdir(), f"{os.path.basename(dataset_file)}.{name}.sched")
+
+
+def hash_file(path):
+    """BLAKE2b digest of a file's content, read in 1 MiB blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def compile_dataset_schedule(dataset_file, cache_file):
+    """
+    Compiles a trace CSV into a binary replay schedule: a header, then per
+    packet float64 send offsets, uint32 conversation ids, uint16 sizes and
+    uint8 directions, one array after another (invalid sizes dropped, sizes
+    capped at MAX_PACKET_SIZE). Returns the number of packets written.
+    """
+    import numpy as np
+    stat = os.stat(dataset_file)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    # Offsets go straight into the cache file; the other arrays are staged and appended
+    parts = [f"{tmp_file}.{name}" for name in ('flows', 'sizes', 'directions')]
+    count = 0
+    try:
+        with open(tmp_file, 'wb') as out:
+            out.write(b'\x00' * SCHEDULE_HEADER.size)
+            staged = [open(part, 'wb') for part in parts]
+            try:
+                for times, sizes, directions, flows in iter_dataset_chunks(dataset_file):
+                    keep = sizes > 0
+                    times.astype('<f8')[keep].tofile(out)
+                    flows.astype('<u4')[keep].tofile(staged[0])
+                    np.minimum(sizes[keep], MAX_PACKET_SIZE).astype('<u2').tofile(staged[1])
+                    directions[keep].tofile(staged[2])
+                    count += int(keep.sum())
+            finally:
+                for f in staged:
+                    f.close()
+            for part in parts:
+                with open(part, 'rb') as staged_in:
+                    for block in iter(lambda: staged_in.read(1 << 20), b''):
+                        out.write(block)
+        with open(tmp_file, 'r+b') as out:
+            out.write(SCHEDULE_HEADER.pack(SCHEDULE_MAGIC, SCHEDULE_VERSION, count, stat.st_size,
+                                           stat.st_mtime_ns, hash_file(dataset_file)))
+        os.replace(tmp_file, cache_file)
+    finally:
+        for leftover in [tmp_file] + parts:
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return count
+
+
+def load_dataset_schedule(dataset_file, cache_file):
+    """
+    Memory-maps a compiled schedule and returns (offsets, sizes, directions,
+    conversation ids) NumPy views, or None if the cache is missing or stale.
+    A cache is valid when the dataset size matches and either its mtime or its
+    content hash does; after a hash match the new mtime is recorded so the
+    next run skips the hash.
+    """
+    import numpy as np
+    try:
+        f = open(cache_file, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        header = f.read(SCHEDULE_HEADER.size)
+        if len(header) < SCHEDULE_HEADER.size:
+            return None
+        magic, version, count, src_size, src_mtime, src_hash = SCHEDULE_HEADER.unpack(header)
+        if magic != SCHEDULE_MAGIC or version != SCHEDULE_VERSION:
+            return None
+        stat = os.stat(dataset_file)
+        if stat.st_size != src_size:
+            return None
+        if stat.st_mtime_ns != src_mtime:
+            if hash_file(dataset_file) != src_hash:
+                return None
+            try:
+                with open(cache_file, 'r+b') as out:
+                    out.write(SCHEDULE_HEADER.pack(magic, version, count, src_size, stat.st_mtime_ns, src_hash))
+            except OSError:
+                pass  # Read-only cache: still valid, rehashed next time
+        if count == 0:
+            return (np.zeros(0, dtype='<f8'), np.zeros(0, dtype='<u2'),
+                    np.zeros(0, dtype='u1'), np.zeros(0, dtype='<u4'))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = SCHEDULE_HEADER.size
+    offsets = np.frombuffer(mapped, dtype='<f8', count=count, offset=offset)
+    flows = np.frombuffer(mapped, dtype='<u4', count=count, offset=offset + 8 * count)
+    sizes = np.frombuffer(mapped, dtype='<u2', count=count, offset=offset + 12 * count)
+    directions = np.frombuffer(mapped, dtype='u1', count=count, offset=offset + 14 * count)
+    return offsets, sizes, directions, flows
+
+
+def open_dataset_schedule(dataset_file):
+    """Returns the memory-mapped schedule for a dataset, compiling it first if needed."""
+    cache_file = schedule_cache_path(dataset_file)
+    schedule = load_dataset_schedule(dataset_file, cache_file)
+    if schedule is not None:
+        print(f"✓ Using compiled schedule {cache_file} ({len(schedule[0])} packets)")
+        return schedule
+    print(f"Compiling replay schedule to {cache_file} (one-time)...")
+    start = time.time()
+    count = compile_dataset_schedule(dataset_file, cache_file)
+    print(f"✓ Compiled {count} packets in {time.time() - start:.1f}s")
+    return load_dataset_schedule(dataset_file, cache_file)
+
+
+def iter_schedule_chunks(schedule, chunk_rows=DATASET_CHUNK_ROWS):
+    """Yields a memory-mapped schedule in slices shaped like iter_dataset_chunks output."""
+    for i in range(0, len(schedule[0]), chunk_rows):
+        yield tuple(array[i:i + chunk_rows] for array in schedule)
+
+
+DIRECTIONS = ('uplink', 'downlink', 'both')
+SHARD_MODES = ('flow', 'round_robin')
+
+
+def replay_dataset(dataset_file, schedule, targets, duration, start_at, speed=1.0, shard=0, shards=1,
+                   shard_mode='flow', interface=None, quiet=False):
+    """
+    Replays one shard of a dataset and returns (packets, bytes) sent.
+
+    targets maps UPLINK/DOWNLINK to the (ip, port) its rows are sent to;
+    directions without a target are skipped. With shards > 1 only rows whose
+    conversation id (shard_mode 'flow') or row number ('round_robin') falls in
+    this shard are sent. Offsets are divided by speed. Pass k of a looping
+    replay starts at start_at + k * trace span / speed, so every shard stays
+    on the same clock as the original trace.
+    """
+    import numpy as np
+    
+    sock = open_socket(socket.SOCK_DGRAM, interface)
+    # Sends come from one zero-filled buffer, batched per burst of due packets
+    senders = {d: BurstSender(sock, address, flow_id=random.getrandbits(32)) for d, address in targets.items()}
+    for d, sender in senders.items():
+        name = 'uplink' if d == UPLINK else 'downlink'
+        print(f"{name.capitalize()}: {targets[d][0]}:{targets[d][1]} (flow ID {sender.flow_id:08x}, send backend {sender.backend})")
+    only = next(iter(targets)) if len(targets) == 1 else None
+    
+    end_time = start_at + duration
+    pass_start = start_at
+    packet_count = 0
+    total_bytes = 0
+    next_report = start_at + 1.0
+    
+    try:
+        first_pass = True
+        while pass_start < end_time:
+            replay_end = end_time - pass_start  # Offset at which to stop
+            replayed = 0
+            span = 0.0
+            row = 0
+            done = False
+            if schedule is not None:
+                chunks = iter_schedule_chunks(schedule)
+            else:
+                chunks = iter_dataset_chunks(dataset_file, quiet=quiet or not first_pass)
+            for times, sizes, directions, flows in chunks:
+                if len(times):
+                    span = max(span, float(times.max()))
+                # Limit packet size to reasonable values, then pick this shard's rows
+                keep = sizes > 0
+                if only is not None:
+                    keep &= directions == only
+                if shards > 1:
+                    if shard_mode == 'flow':
+                        keep &= flows % shards == shard
+                    else:
+                        keep &= np.arange(row, row + len(times)) % shards == shard
+                row += len(times)
+                if not keep.all():
+                    times, sizes, directions = times[keep], sizes[keep], directions[keep]
+                # Packets behind the clock go out immediately, so a running
+                # maximum gives the same schedule in sortable form
+                offsets = np.maximum.accumulate(times) / speed
+                limit = int(np.searchsorted(offsets, replay_end, 'left'))
+                size_array = np.minimum(sizes[:limit], MAX_PACKET_SIZE)
+                sizes = size_array.tolist()
+                directions = directions[:limit]
+                offsets = offsets[:limit]
+                
+                i = 0
+                while i < limit:
+                    now = time.monotonic() - pass_start
+                    if now >= replay_end:
+                        done = True  # Duration reached while catching up
+                        break
+                    # Send the packets that are due in one burst
+                    due = min(int(np.searchsorted(offsets, now, 'right')), i + REPLAY_MAX_BURST)
+                    if due == i:
+                        time.sleep(offsets[i] - now)
+                        continue
+                    if only is not None:
+                        senders[only].send(sizes[i:due])
+                    else:
+                        burst_directions = directions[i:due]
+                        for d, sender in senders.items():
+                            burst = size_array[i:due][burst_directions == d]
+                            if len(burst):
+                                sender.send(burst.tolist())
+                    total_bytes += sum(sizes[i:due])
+                    packet_count += due - i
+                    replayed += due - i
+                    i = due
+                    
+                    # Print status once per second
+                    if pass_start + now >= next_report:
+                        elapsed = pass_start + now - start_at
+                        mbps = (total_bytes * 8 / 1000000) / elapsed if elapsed > 0 else 0
+                        print(f"[{elapsed:.1f}s] Sent {packet_count} packets, {total_bytes/1024:.1f} KB ({mbps:.2f} Mbps)")
+                        next_report += 1.0
+                
+                if done or limit < len(times):
+                    done = True  # Duration reached inside the chunk
+                    break
+            
+            first_pass = False
+            if done:
+                break
+            if replayed == 0 and packet_count == 0:
+                if shards > 1:
+                    print("No packets in this shard")
+                else:
+                    print("ERROR: No valid packets found in dataset")
+                break
+            # Every shard starts its next pass one trace span after the last
+            pass_start += max(span / speed, 0.001)
+            if pass_start < end_time:
+                print("Reached end of dataset, looping...")
+    
+    except KeyboardInterrupt:
+        print("\nDataset traffic stopped by user")
+    except ValueError as e:
+        print(f"ERROR reading dataset: {e}")
+    except Exception as e:
+        print(f"\nError during replay: {e}")
+    finally:
+        sock.close()
+        elapsed = time.monotonic() - start_at
+        mbps = (total_bytes * 8 / 1000000) / elapsed if elapsed > 0 else 0
+        print(f"\nDataset Traffic Summary:")
+        print(f"  Duration: {elapsed:.1f}s")
+        print(f"  Packets sent: {packet_count}")
+        print(f"  Data sent: {total_bytes/1024/1024:.2f} MB")
+        print(f"  Average bitrate: {mbps:.2f} Mbps")
+        if elapsed > 0:
+            print(f"  Average packet rate: {packet_count/elapsed:.1f} pkt/s")
+    return packet_count, total_bytes
+
+
+def replay_dataset_shard(results, shard, shards, interface, *args, **kwargs):
+    """Worker process for a sharded replay: output is tagged with the shard, totals go to results."""
+    threading.current_thread().name = f"shard-{shard}"
+    sys.stdout = FlowOutput(sys.stdout)
+    results.put(replay_dataset(*args, shard=shard, shards=shards, interface=interface, **kwargs))
+
+
+def parse_target(text, default_port):
+    """Parses 'ip' or 'ip:port'."""
+    host, _, port = text.rpartition(':') if ':' in text else (text, '', '')
+    return host, int(port) if port else default_port
+
+
+def generate_dataset_traffic(target_ip, port, duration, dataset_file, use_cache=True, interface=None,
+                             speed=1.0, direction='uplink', downlink_target=None, workers=1,
+                             shard_mode='flow', interfaces=None):
     """
     Generates traffic based on a CSV dataset.
     Reads packet timing and sizes from the dataset and replays them.
+    The first run compiles the CSV into a binary schedule cached next to it;
+    later runs memory-map that cache and start instantly. With use_cache=False
+    the CSV is streamed in chunks (see iter_dataset_chunks) instead.
+    
+    speed compresses (or stretches) the trace timing. direction picks uplink
+    rows (sent to the target), downlink rows (sent to the target), or both,
+    with downlink rows sent to downlink_target. With workers > 1 the trace is
+    sharded by conversation or round-robin over that many processes. They
+    share one start clock, so the aggregate keeps the original timing, and
+    they bind to interfaces in turn (e.g. one UE each).
     
     Expected CSV format:
     - 'Time' column: timestamp or time delta (in seconds or milliseconds)
     - 'Packet Size' or 'Length' column: size in bytes
-    - 'Direction' column (optional): filter for uplink/downlink
+    - 'Direction' column (optional): uplink/downlink
+    - 'Source'/'Destination' columns (optional): conversations for sharding
     """
     print(f"\n=== Dataset-Based Traffic Profile ===")
     print(f"Target: {target_ip}:{port}")
     print(f"Duration: {duration}s")
     print(f"Dataset: {dataset_file}")
+    print(f"Speed: {speed:g}x, direction: {direction}" + (f", {workers} workers ({shard_mode} shards)" if workers > 1 else ""))
     
     # Check if file exists
     if not os.path.exists(dataset_file):
@@ -258,151 +1399,709 @@ def generate_dataset_traffic(target_ip, port, duration, dataset_file):
         print("Install with: pip install pandas")
         return
     
-    # Read the CSV file
-    try:
-        print("Loading dataset...")
-        df = pd.read_csv(dataset_file)
-        print(f"✓ Loaded {len(df)} rows from dataset")
-        
-        # Display column names for debugging
-        print(f"Columns found: {list(df.columns)}")
-        
-        # Try to identify the relevant columns (case-insensitive)
-        time_col = None
-        size_col = None
-        direction_col = None
-        
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'time' in col_lower and time_col is None:
-                time_col = col
-            if any(keyword in col_lower for keyword in ['size', 'length', 'bytes']) and size_col is None:
-                size_col = col
-            if 'direction' in col_lower and direction_col is None:
-                direction_col = col
-        
-        if time_col is None:
-            print("ERROR: Could not find 'Time' column in dataset")
-            return
-        if size_col is None:
-            print("ERROR: Could not find 'Packet Size' or 'Length' column in dataset")
-            return
-        
-        print(f"Using columns: Time='{time_col}', Size='{size_col}'")
-        
-        # Filter for uplink traffic if direction column exists
-        if direction_col:
-            original_count = len(df)
-            # Try to identify uplink packets (common markers: 'up', 'uplink', 'tx', 'send')
-            df = df[df[direction_col].astype(str).str.lower().str.contains('up|tx|send', na=False)]
-            print(f"Filtered to {len(df)} uplink packets (from {original_count} total)")
-        
-        if len(df) == 0:
-            print("ERROR: No valid packets found in dataset")
-            return
-        
-    except Exception as e:
-        print(f"ERROR reading dataset: {e}")
+    if direction == 'both' and not downlink_target:
+        print("ERROR: --downlink_target is required to replay both directions")
         return
+    targets = {}
+    if direction in ('uplink', 'both'):
+        targets[UPLINK] = (target_ip, port)
+    if direction == 'downlink':
+        targets[DOWNLINK] = (target_ip, port)
+    elif direction == 'both':
+        targets[DOWNLINK] = parse_target(downlink_target, port)
     
-    # Create UDP socket
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    
-    start_time = time.time()
-    packet_count = 0
-    total_bytes = 0
-    
-    # Convert time column to numeric (handle string timestamps or datetime)
-    try:
-        # First try direct numeric conversion
-        df[time_col] = pd.to_numeric(df[time_col], errors='coerce')
-    except:
-        pass
-    
-    # If that didn't work, try datetime parsing
-    if df[time_col].isna().all() or not pd.api.types.is_numeric_dtype(df[time_col]):
+    schedule = None
+    if use_cache:
         try:
-            print("Attempting to parse timestamps as datetime...")
-            df[time_col] = pd.to_datetime(df[time_col], errors='coerce')
-            # Convert to seconds since first packet
-            df[time_col] = (df[time_col] - df[time_col].min()).dt.total_seconds()
-        except Exception as e:
-            print(f"ERROR: Could not parse time column: {e}")
+            schedule = open_dataset_schedule(dataset_file)
+        except ValueError as e:
+            print(f"ERROR reading dataset: {e}")
             return
+        except OSError as e:
+            print(f"Warning: Could not use schedule cache ({e}), streaming the CSV instead")
     
-    df = df.dropna(subset=[time_col])  # Remove rows with invalid time values
+    source = "compiled schedule" if schedule is not None else "streaming"
+    print(f"\nStarting dataset replay ({source})...\n")
     
-    if len(df) == 0:
-        print("ERROR: No valid time values found after conversion")
+    if workers <= 1:
+        replay_dataset(dataset_file, schedule, targets, duration, time.monotonic(), speed,
+                       interface=interfaces[0] if interfaces else interface)
         return
     
-    # Normalize time column to start at 0
-    df[time_col] = df[time_col] - df[time_col].min()
+    # Workers inherit the memory-mapped schedule and wait for a common start instant
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    start_at = time.monotonic() + FLOW_START_DELAY
+    processes = [ctx.Process(target=replay_dataset_shard,
+                             args=(results, shard, workers, interfaces[shard % len(interfaces)] if interfaces else interface,
+                                   dataset_file, schedule, targets, duration, start_at, speed),
+                             kwargs={'shard_mode': shard_mode, 'quiet': shard > 0})
+                 for shard in range(workers)]
+    for process in processes:
+        process.start()
+    totals = []
+    try:
+        for _ in processes:
+            totals.append(results.get())
+    except KeyboardInterrupt:
+        print("\nDataset traffic stopped by user")
+    for process in processes:
+        process.join()
+    elapsed = time.monotonic() - start_at
+    packet_count = sum(t[0] for t in totals)
+    total_bytes = sum(t[1] for t in totals)
+    print(f"\nSharded Replay Summary ({len(totals)}/{workers} workers reported):")
+    print(f"  Duration: {elapsed:.1f}s")
+    print(f"  Packets sent: {packet_count}")
+    print(f"  Data sent: {total_bytes/1024/1024:.2f} MB")
+    print(f"  Average bitrate: {(total_bytes * 8 / 1000000) / elapsed:.2f} Mbps")
+    print(f"  Average packet rate: {packet_count/elapsed:.1f} pkt/s")
+
+
+PCAP_CHUNK_PACKETS = 65536  # Records decoded per NumPy pass during pcap replay
+
+
+def decode_pcap_records(buf, endian, unit, linktype, records, decap=False):
+    """
+    Decodes a run of pcap records at once with pcap_reader (shared with
+    gtpu_analyzer.py). Returns (timestamps, payload offsets, captured payload
+    bytes, payload sizes): the payload is what follows the UDP header (the IP
+    header for other protocols) of the outer packet, or of the inner packet of
+    a GTP-U G-PDU with decap. Size is the original length from the IP header,
+    so it can exceed what was captured; 0 marks packets to skip (not IPv4, and
+    GTP-U signalling when decapsulating).
+    """
+    import numpy as np
+    from pcap_reader import decode_headers, read_records
+    times, data, caplen, _ = read_records(buf, endian, unit, records)
+    fields = decode_headers(buf, linktype, data, caplen)
+    ok = fields['ipv4']
+    l4 = fields['outer_l4']
+    payload = np.where(fields['outer_proto'] == 17, l4 + 8, l4)
+    packet_end = fields['outer_ip'] + fields['outer_len']
+    if decap:
+        tpdu = fields['kind'] == 0
+        inner_l4 = fields['inner_l4']
+        payload = np.where(tpdu, np.where(fields['proto'] == 17, inner_l4 + 8, inner_l4), payload)
+        packet_end = np.where(tpdu, fields['inner_ip'] + fields['inner_len'], packet_end)
+        ok = ok & (tpdu | (fields['kind'] == 2))
+    sizes = np.where(ok, np.clip(packet_end - payload, 0, MAX_PACKET_SIZE), 0)
+    captured = np.clip(data + caplen - payload, 0, sizes)
+    return times, payload, captured, sizes
+
+
+def generate_pcap_traffic(target_ip, port, duration, pcap_file, interface=None, speed=1.0, loop=False,
+                          decap=False):
+    """
+    Replays a pcap with its original inter-packet timing (divided by speed).
+    Each packet's UDP payload (or, with decap, the payload of the packet inside
+    a GTP-U tunnel) is resent to target_ip:port. The capture is memory-mapped
+    and decoded in chunks with NumPy; packets that are due go out in batches
+    that sendmmsg() reads straight from the mapping. With loop the capture
+    restarts until duration is reached.
+    """
+    import numpy as np
+    print(f"\n=== PCAP Replay Profile ===")
+    print(f"Target: {target_ip}:{port}")
+    print(f"Duration: {duration}s")
+    print(f"Capture: {pcap_file}")
     
-    # Convert time to seconds if it appears to be in milliseconds
-    if df[time_col].max() > 10000:  # Likely milliseconds
-        df[time_col] = df[time_col] / 1000.0
-        print("Note: Converted time column from milliseconds to seconds")
+    try:
+        from pcap_reader import open_pcap
+        # Copy-on-write mapping: never written, but ctypes needs it writable to
+        # pass its addresses to sendmmsg()
+        mm, endian, unit, linktype, records = open_pcap(pcap_file, mmap.ACCESS_COPY)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"ERROR: Could not read {pcap_file}: {e}")
+        return
+    count = len(records)
+    print(f"Pattern: {count} packets (link type {linktype}) at {speed:g}x speed"
+          f"{', GTP-U decapsulated' if decap else ''}{', looping' if loop else ''}")
+    if count == 0:
+        print("ERROR: No packets in capture")
+        mm.close()
+        return
+    
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    sock = open_socket(socket.SOCK_DGRAM, interface)
+    sender = BurstSender(sock, (target_ip, port))
+    print(f"Send backend: {'sendmmsg' if sender.mmsg else 'loop'}")
     
-    print(f"\nStarting dataset replay (dataset duration: {df[time_col].max():.2f}s)...\n")
+    start_at = time.monotonic()
+    end_time = start_at + duration
+    pass_start = start_at
+    next_report = start_at + 1.0
+    packet_count = 0
+    total_bytes = 0
+    skipped = 0
+    first_time = None
     
     try:
-        replay_start = time.time()
-        last_packet_time = 0
-        
-        for idx, row in df.iterrows():
-            # Check if we've exceeded the requested duration
-            if time.time() - start_time >= duration:
-                break
-            
-            packet_time = row[time_col]
-            packet_size = int(row[size_col])
-            
-            # Limit packet size to reasonable values
-            if packet_size <= 0:
-                continue
-            packet_size = min(packet_size, 9000)  # Cap at jumbo frame size
-            
-            # Wait until it's time to send this packet
-            time_to_wait = packet_time - (time.time() - replay_start)
-            if time_to_wait > 0:
-                time.sleep(time_to_wait)
-            
-            # Create and send packet
-            payload = b'\x00' * packet_size
-            sock.sendto(payload, (target_ip, port))
-            packet_count += 1
-            total_bytes += packet_size
+        while pass_start < end_time:
+            replay_end = end_time - pass_start
+            span = 0.0
+            done = False
+            for chunk in range(0, count, PCAP_CHUNK_PACKETS):
+                times, offsets, captured, sizes = decode_pcap_records(
+                    buf, endian, unit, linktype, records[chunk:chunk + PCAP_CHUNK_PACKETS], decap)
+                if first_time is None:
+                    first_time = float(times[0])
+                span = max(span, float(times.max()) - first_time)
+                keep = sizes > 0
+                if pass_start == start_at:
+                    skipped += int((~keep).sum())
+                times, offsets, captured, sizes = times[keep], offsets[keep], captured[keep], sizes[keep]
+                # Out-of-order timestamps go out immediately, as in dataset replay
+                due_at = np.maximum.accumulate(times - first_time) / speed
+                limit = int(np.searchsorted(due_at, replay_end, 'left'))
+                
+                i = 0
+                while i < limit:
+                    now = time.monotonic() - pass_start
+                    if now >= replay_end:
+                        done = True
+                        break
+                    due = min(int(np.searchsorted(due_at, now, 'right')), i + REPLAY_MAX_BURST)
+                    if due == i:
+                        time.sleep(due_at[i] - now)
+                        continue
+                    sender.send_buffers(mm, offsets[i:due], captured[i:due], sizes[i:due])
+                    total_bytes += int(sizes[i:due].sum())
+                    packet_count += due - i
+                    i = due
+                    
+                    if pass_start + now >= next_report:
+                        elapsed = pass_start + now - start_at
+                        mbps = (total_bytes * 8 / 1000000) / elapsed if elapsed > 0 else 0
+                        print(f"[{elapsed:.1f}s] Sent {packet_count} packets, {total_bytes/1024:.1f} KB ({mbps:.2f} Mbps)")
+                        next_report += 1.0
+                
+                if done or limit < len(times):
+                    done = True
+                    break
             
-            # Print status every 100 packets
-            if packet_count % 100 == 0:
-                elapsed = time.time() - start_time
-                mbps = (total_bytes * 8 / 1000000) / elapsed if elapsed > 0 else 0
-                print(f"[{elapsed:.1f}s] Sent {packet_count} packets, {total_bytes/1024:.1f} KB ({mbps:.2f} Mbps)")
-            
-            # If we've reached the end of the dataset, loop back
-            if idx == len(df) - 1 and time.time() - start_time < duration:
-                print("Reached end of dataset, looping...")
-                replay_start = time.time()
+            if done or not loop:
+                break
+            if packet_count == 0:
+                print("ERROR: No replayable packets in capture")
+                break
+            # Next pass starts one average packet gap after the last packet
+            pass_start += (span + span / max(count - 1, 1)) / speed or 0.001
+            if pass_start < end_time:
+                print("Reached end of capture, looping...")
     
     except KeyboardInterrupt:
-        print("\nDataset traffic stopped by user")
-    except Exception as e:
-        print(f"\nError during replay: {e}")
+        print("\nPCAP replay stopped by user")
     finally:
         sock.close()
-        elapsed = time.time() - start_time
+        del buf
+        mm.close()
+        elapsed = time.monotonic() - start_at
         mbps = (total_bytes * 8 / 1000000) / elapsed if elapsed > 0 else 0
-        print(f"\nDataset Traffic Summary:")
+        print(f"\nPCAP Replay Summary:")
         print(f"  Duration: {elapsed:.1f}s")
         print(f"  Packets sent: {packet_count}")
+        if skipped:
+            print(f"  Packets skipped per pass: {skipped} (not IPv4{', or GTP-U signalling' if decap else ''})")
         print(f"  Data sent: {total_bytes/1024/1024:.2f} MB")
         print(f"  Average bitrate: {mbps:.2f} Mbps")
         if elapsed > 0:
             print(f"  Average packet rate: {packet_count/elapsed:.1f} pkt/s")
 
 
+PROFILES = ('voip', 'video', 'bulk', 'iot', 'dataset', 'pcap')
+FLOW_KEYS = ('name', 'profile', 'target', 'port', 'duration', 'start', 'interface', 'dataset_file', 'count',
+             'pps', 'bitrate', 'rate', 'streams', 'pcap_file', 'decap', 'loop')
+FLOW_START_DELAY = 0.5  # Seconds for worker processes to come up before the shared start clock
+
+
+def run_profile(profile, target_ip, port, duration, dataset_file=None, use_cache=True, interface=None,
+                load=None, streams=1, sendfile=False, bulk_file=None, interval=1.0, replay=None, pcap=None):
+    """
+    Runs one traffic profile to completion; replay holds extra generate_dataset_traffic
+    options and pcap the generate_pcap_traffic ones.
+    """
+    if profile == 'voip':
+        generate_voip_traffic(target_ip, port, duration, interface, load)
+    elif profile == 'video':
+        generate_video_traffic(target_ip, port, duration, interface, load)
+    elif profile == 'bulk':
+        generate_bulk_traffic(target_ip, port, duration, interface, streams, sendfile, bulk_file, interval)
+    elif profile == 'iot':
+        generate_iot_traffic(target_ip, port, duration, interface, load)
+    elif profile == 'dataset':
+        generate_dataset_traffic(target_ip, port, duration, dataset_file,
+                                 use_cache=use_cache, interface=interface, **(replay or {}))
+    elif profile == 'pcap':
+        generate_pcap_traffic(target_ip, port, duration, interface=interface, **(pcap or {}))
+
+
+def load_flow_spec(path, default_duration):
+    """
+    Reads a JSON flow spec: either a list of flows or {"defaults": {...}, "flows": [...]}.
+    Each flow takes the keys in FLOW_KEYS; "pps", "bitrate" (e.g. "20M") and "rate"
+    set its load like the matching options. "count" expands a flow into that many
+    copies on consecutive ports, and "{n}" in its interface is replaced with the
+    copy number (e.g. "uesimtun{n}"). Raises ValueError on an invalid spec.
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        spec = {'flows': spec}
+    defaults = spec.get('defaults', {})
+    flows = []
+    for index, entry in enumerate(spec.get('flows', [])):
+        entry = dict(defaults, **entry)
+        unknown = sorted(set(entry) - set(FLOW_KEYS))
+        if unknown:
+            raise ValueError(f"flow {index}: unknown keys {unknown}")
+        profile = entry.get('profile')
+        if profile not in PROFILES:
+            raise ValueError(f"flow {index}: profile must be one of {', '.join(PROFILES)}")
+        if not entry.get('target'):
+            raise ValueError(f"flow {index}: target is required")
+        if profile == 'dataset' and not entry.get('dataset_file'):
+            raise ValueError(f"flow {index}: dataset_file is required for the dataset profile")
+        if profile == 'pcap' and not entry.get('pcap_file'):
+            raise ValueError(f"flow {index}: pcap_file is required for the pcap profile")
+        count = int(entry.get('count', 1))
+        name = entry.get('name', f"{profile}-{index}")
+        for n in range(count):
+            interface = entry.get('interface')
+            flows.append({
+                'name': f"{name}.{n}" if count > 1 else name,
+                'profile': profile,
+                'target': entry['target'],
+                'port': int(entry.get('port', 5000)) + n,
+                'duration': float(entry.get('duration', default_duration)),
+                'start': float(entry.get('start', 0)),
+                'interface': interface.format(n=n) if interface else None,
+                'dataset_file': entry.get('dataset_file'),
+                'pps': float(entry['pps']) if entry.get('pps') else None,
+                'bitrate': parse_bitrate(entry['bitrate']) if entry.get('bitrate') else None,
+                'rate': float(entry.get('rate', 1.0)),
+                'streams': int(entry.get('streams', 1)),
+                'pcap': {'pcap_file': entry['pcap_file'], 'decap': bool(entry.get('decap', False)),
+                         'loop': bool(entry.get('loop', False))} if entry.get('pcap_file') else None,
+            })
+    if not flows:
+        raise ValueError("flow spec defines no flows")
+    return flows
+
+
+class FlowOutput:
+    """stdout wrapper that prefixes each complete line with the writing thread's flow name."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.pending = threading.local()
+
+    def write(self, text):
+        buffered = getattr(self.pending, 'text', '') + text
+        *lines, self.pending.text = buffered.split('\n')
+        if lines:
+            prefix = f"[{threading.current_thread().name}] "
+            with self.lock:
+                self.stream.write(''.join(prefix + line + '\n' for line in lines))
+                self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_flow(flow, start_at, use_cache, load):
+    """Waits for the flow's start offset on the shared clock, then runs its profile."""
+    delay = start_at + flow['start'] - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    # Per-flow rates override the command line; ramp settings are shared
+    flow_load = Load(flow['pps'], flow['bitrate'], flow['rate'], load.ramp, load.ramp_interval,
+                     load.ramp_factor, load.loss_threshold)
+    try:
+        run_profile(flow['profile'], flow['target'], flow['port'], flow['duration'],
+                    flow['dataset_file'], use_cache, flow['interface'], flow_load, flow['streams'],
+                    pcap=flow['pcap'])
+    except Exception as e:
+        print(f"Flow failed: {e}")
+
+
+def flow_worker(flows, start_at, use_cache, load):
+    """Worker process: runs its share of the flows concurrently, one thread each."""
+    global PACER_SPIN_NS
+    sys.stdout = FlowOutput(sys.stdout)
+    if len(flows) > 1:
+        PACER_SPIN_NS = 0  # Sleep-only pacing, so one flow's spin does not stall the others
+    threads = [threading.Thread(target=run_flow, args=(flow, start_at, use_cache, load),
+                                name=flow['name'], daemon=True) for flow in flows]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_flows(flows, workers=None, use_cache=True, load=None):
+    """
+    Runs many flows at once. They are spread round-robin over a pool of worker
+    processes (one per CPU core by default), and each worker runs its flows in
+    threads. CLOCK_MONOTONIC is system-wide, so every process counts start
+    offsets from the same instant.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(flows)))
+    print(f"\n=== Multi-Flow Run ===")
+    mix = {}
+    for flow in flows:
+        mix[flow['profile']] = mix.get(flow['profile'], 0) + 1
+    print(f"Flows: {len(flows)} ({', '.join(f'{n} {p}' for p, n in mix.items())})")
+    print(f"Worker processes: {workers}")
+    
+    # Dataset flows share a compiled schedule; build it once before forking
+    if use_cache:
+        for dataset_file in sorted({f['dataset_file'] for f in flows if f['profile'] == 'dataset'}):
+            try:
+                open_dataset_schedule(dataset_file)
+            except (OSError, ValueError, ImportError) as e:
+                print(f"Warning: Could not precompile {dataset_file}: {e}")
+    
+    ctx = multiprocessing.get_context('fork')
+    start_at = time.monotonic() + FLOW_START_DELAY
+    load = load or Load()
+    processes = [ctx.Process(target=flow_worker, args=(flows[i::workers], start_at, use_cache, load))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\nMulti-flow run stopped by user")
+        for process in processes:
+            process.join()
+    print(f"\n✓ All {len(flows)} flows finished")
+
+
+RECEIVE_INTERVAL = 1.0  # Seconds between receiver interval reports
+RECEIVE_BUFFER = 8 * 1024 * 1024  # SO_RCVBUF for receiver UDP sockets
+RECEIVE_BATCH = 1024  # Datagrams drained per socket per loop, so reports stay on time under flood
+MAX_RECEIVE_FLOWS = 4096  # Flows tracked by the receiver; later ones are counted as untracked
+DELAY_MIN = 1e-6  # Histogram range starts at 1us...
+DELAY_DECADES = 8  # ...and spans 8 decades (to 100s)
+DELAY_BUCKETS_PER_DECADE = 20
+
+
+class DelayHistogram:
+    """
+    Log-spaced histogram of delays in seconds, with fixed memory however many
+    samples arrive. Percentiles are accurate to one bucket (~12%). Delays
+    below DELAY_MIN, including negative ones from clock offset, go in the
+    first bucket.
+    """
+
+    SIZE = DELAY_DECADES * DELAY_BUCKETS_PER_DECADE + 2
+
+    def __init__(self):
+        self.counts = [0] * self.SIZE
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        if value < DELAY_MIN:
+            index = 0
+        else:
+            index = min(self.SIZE - 1, 1 + int(math.log10(value / DELAY_MIN) * DELAY_BUCKETS_PER_DECADE))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Geometric midpoint of the bucket holding the q-th percentile, clamped to the observed range."""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                break
+        if index == 0:
+            return self.min
+        value = DELAY_MIN * 10 ** ((index - 0.5) / DELAY_BUCKETS_PER_DECADE)
+        return min(max(value, self.min), self.max)
+
+
+class FlowStats:
+    """
+    Receive-side statistics for one flow: loss and reordering from probe
+    sequence numbers, one-way delay from probe send times, and RFC 3550
+    interarrival jitter. Interval counters reset at every report.
+    """
+
+    def __init__(self, source, flow_id, port, reply=None):
+        self.source = source
+        self.flow_id = flow_id
+        self.port = port
+        self.reply = reply  # (socket, sender address) for loss feedback
+        self.received = 0
+        self.bytes = 0
+        self.reordered = 0
+        self.base_seq = None
+        self.max_seq = -1
+        self.jitter = 0.0
+        self.last_transit = None
+        self.delay = DelayHistogram()
+        self.interval_delay = DelayHistogram()
+        self.interval_received = 0
+        self.interval_bytes = 0
+        self.interval_reordered = 0
+        self.interval_max_seq = -1
+
+    @property
+    def name(self):
+        if self.flow_id is None:
+            return f"{self.source} :{self.port}"
+        return f"{self.source} flow {self.flow_id:08x} :{self.port}"
+
+    def add(self, size, seq=None, sent=None, arrival=None):
+        self.received += 1
+        self.bytes += size
+        self.interval_received += 1
+        self.interval_bytes += size
+        if seq is None:
+            return
+        if self.base_seq is None:
+            self.base_seq = seq
+            self.max_seq = self.interval_max_seq = seq - 1
+        if seq > self.max_seq:
+            self.max_seq = seq
+        else:
+            self.reordered += 1
+            self.interval_reordered += 1
+        transit = arrival - sent
+        self.interval_delay.add(transit)
+        if self.last_transit is not None:
+            self.jitter += (abs(transit - self.last_transit) - self.jitter) / 16
+        self.last_transit = transit
+
+    def lost(self):
+        if self.base_seq is None:
+            return 0
+        return self.max_seq - self.base_seq + 1 - self.received
+
+    def interval_report(self, elapsed, interval):
+        """Summarises and resets the interval counters."""
+        expected = self.max_seq - self.interval_max_seq
+        delay = self.interval_delay
+        report = {
+            'time': round(elapsed, 3),
+            'flow': self.name,
+            'packets': self.interval_received,
+            'mbps': self.interval_bytes * 8 / 1e6 / interval,
+            'lost': max(0, expected - self.interval_received) if self.flow_id is not None else None,
+            'loss_pct': 100.0 * max(0, expected - self.interval_received) / expected if expected > 0 else 0.0,
+            'reordered': self.interval_reordered,
+            'delay_ms': {'mean': delay.mean() * 1e3, 'p50': delay.percentile(50) * 1e3,
+                         'p99': delay.percentile(99) * 1e3, 'max': max(delay.max, 0) * 1e3},
+            'jitter_ms': self.jitter * 1e3,
+        }
+        self.delay.merge(delay)
+        self.interval_delay = DelayHistogram()
+        self.interval_received = 0
+        self.interval_bytes = 0
+        self.interval_reordered = 0
+        self.interval_max_seq = self.max_seq
+        return report
+
+
+def format_flow_report(report):
+    line = f"[{report['time']:6.1f}s] {report['flow']}: {report['packets']} pkt, {report['mbps']:.2f} Mbps"
+    if report['lost'] is not None:
+        d = report['delay_ms']
+        line += (f", loss {report['lost']} ({report['loss_pct']:.2f}%), reorder {report['reordered']}"
+                 f", owd {d['mean']:.3f}/{d['p50']:.3f}/{d['p99']:.3f} ms avg/p50/p99"
+                 f", jitter {report['jitter_ms']:.3f} ms")
+    return line
+
+
+def open_receiver_sockets(sel, port, port_count):
+    """Binds a UDP and a TCP socket on each port and registers them with the selector."""
+    timestamps = hasattr(socket, 'SO_TIMESTAMPNS')
+    for p in range(port, port + port_count):
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        if timestamps:
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_TIMESTAMPNS, 1)
+        udp.bind(('0.0.0.0', p))
+        udp.setblocking(False)
+        sel.register(udp, selectors.EVENT_READ, ('udp', p))
+        tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        tcp.bind(('0.0.0.0', p))
+        tcp.listen(socket.SOMAXCONN)
+        tcp.setblocking(False)
+        sel.register(tcp, selectors.EVENT_READ, ('listen', p))
+    return timestamps
+
+
+def run_receiver(port, port_count, duration, interval=RECEIVE_INTERVAL, report_file=None):
+    """
+    Measurement sink for the generator's profiles. It receives UDP and TCP on
+    port..port+port_count-1 and tracks every probe-stamped flow separately.
+    For each flow it reports packets, bitrate, loss, reordering, one-way delay
+    and RFC 3550 jitter every interval seconds, and sends each sender its
+    interval loss (FEEDBACK_HEADER) for ramped loads. Arrival times come from kernel
+    SO_TIMESTAMPNS when available, so receiver load does not inflate delay.
+    One-way delay assumes sender and receiver clocks are synchronised (same
+    host or NTP/PTP). Datagrams without a probe header and TCP connections
+    are reported as throughput only.
+    """
+    print(f"\n=== Measurement Receiver ===")
+    print(f"Ports: {port}" + (f"-{port + port_count - 1}" if port_count > 1 else "") + " (UDP + TCP)")
+    print(f"Duration: {duration}s, report every {interval}s")
+    
+    sel = selectors.DefaultSelector()
+    timestamps = open_receiver_sockets(sel, port, port_count)
+    anc_size = socket.CMSG_SPACE(16) if timestamps else 0
+    buf = bytearray(65536)
+    view = memoryview(buf)
+    flows = {}
+    untracked = 0
+    report_out = open(report_file, 'a') if report_file else None
+    
+    start_time = time.monotonic()
+    next_report = start_time + interval
+    
+    def flow_for(key, source, flow_id, p, reply=None):
+        nonlocal untracked
+        stats = flows.get(key)
+        if stats is None:
+            if len(flows) >= MAX_RECEIVE_FLOWS:
+                untracked += 1
+                return None
+            stats = flows[key] = FlowStats(source, flow_id, p, reply)
+            print(f"New flow: {stats.name}")
+        return stats
+    
+    def report(now):
+        elapsed = now - start_time
+        for stats in flows.values():
+            if stats.interval_received:
+                entry = stats.interval_report(elapsed, interval)
+                print(format_flow_report(entry))
+                if stats.reply:
+                    # Loss feedback lets a ramped sender stop at the first lossy step
+                    try:
+                        stats.reply[0].sendto(FEEDBACK_HEADER.pack(FEEDBACK_MAGIC, stats.flow_id,
+                                                                   entry['packets'], entry['lost']),
+                                              stats.reply[1])
+                    except OSError:
+                        pass
+                if report_out:
+                    report_out.write(json.dumps(entry) + '\n')
+        if report_out:
+            report_out.flush()
+    
+    try:
+        while time.monotonic() - start_time < duration:
+            timeout = max(0.0, next_report - time.monotonic())
+            for key, _ in sel.select(timeout):
+                kind, p = key.data  # p is the port, or the connection's FlowStats for 'tcp'
+                sock = key.fileobj
+                if kind == 'udp':
+                    for _ in range(RECEIVE_BATCH):
+                        try:
+                            nbytes, anc, _, addr = sock.recvmsg_into([buf], anc_size)
+                        except BlockingIOError:
+                            break
+                        arrival = None
+                        for level, ctype, data in anc:
+                            if ctype == socket.SO_TIMESTAMPNS and len(data) >= 16:
+                                sec, nsec = struct.unpack_from('=qq', data)
+                                arrival = sec + nsec * 1e-9
+                        if arrival is None:
+                            arrival = time.time()
+                        if nbytes >= PROBE_HEADER.size and buf[:4] == PROBE_MAGIC:
+                            _, flow_id, seq, sent = PROBE_HEADER.unpack_from(buf)
+                            stats = flow_for((addr[0], flow_id), addr[0], flow_id, p, (sock, addr))
+                            if stats:
+                                stats.add(nbytes, seq, sent, arrival)
+                        else:
+                            stats = flow_for((addr[0], p, 'udp'), addr[0], None, p)
+                            if stats:
+                                stats.add(nbytes)
+                elif kind == 'listen':
+                    try:
+                        conn, addr = sock.accept()
+                    except BlockingIOError:
+                        continue
+                    conn.setblocking(False)
+                    sel.register(conn, selectors.EVENT_READ,
+                                 ('tcp', flow_for((addr, 'tcp'), f"{addr[0]}:{addr[1]} tcp", None, p)))
+                else:
+                    try:
+                        nbytes = sock.recv_into(view)
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        nbytes = 0
+                    if nbytes == 0:
+                        sel.unregister(sock)
+                        sock.close()
+                    elif p:
+                        p.add(nbytes)
+            
+            now = time.monotonic()
+            if now >= next_report:
+                report(now)
+                next_report += interval
+    
+    except KeyboardInterrupt:
+        print("\nReceiver stopped by user")
+    finally:
+        elapsed = time.monotonic() - start_time
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
+        if report_out:
+            report_out.close()
+        print(f"\nReceiver Summary ({elapsed:.1f}s):")
+        for stats in flows.values():
+            stats.delay.merge(stats.interval_delay)
+            line = f"  {stats.name}: {stats.received} pkt, {stats.bytes/1024/1024:.2f} MB"
+            if stats.base_seq is not None:
+                expected = stats.max_seq - stats.base_seq + 1
+                d = stats.delay
+                line += (f", lost {stats.lost()} ({100.0 * stats.lost() / expected:.2f}%)"
+                         f", reordered {stats.reordered}"
+                         f", owd {d.mean()*1e3:.3f}/{d.percentile(50)*1e3:.3f}/{d.percentile(99)*1e3:.3f}/{d.max*1e3:.3f} ms avg/p50/p99/max"
+                         f", jitter {stats.jitter*1e3:.3f} ms")
+            print(line)
+        if untracked:
+            print(f"  Untracked (over {MAX_RECEIVE_FLOWS} flows): {untracked} packets")
+
+
 def main():
+    global PACING_POLICY, SEND_BACKEND
     parser = argparse.ArgumentParser(
         description='5G Traffic Generator - Test different application profiles',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -414,21 +2113,39 @@ Examples:
   # Video streaming
   python3 traffic_generator.py --profile video --target 172.18.0.1 --port 5001 --duration 120
 
-  # Bulk file transfer (needs server: nc -l 5002 > /dev/null)
+  # Bulk file transfer (needs server: nc -l 5002 > /dev/null, or --receive for several streams)
   python3 traffic_generator.py --profile bulk --target 172.18.0.1 --port 5002 --duration 60
+  python3 traffic_generator.py --profile bulk --target 172.18.0.1 --port 5002 --streams 4 --sendfile
 
   # IoT sensor updates
   python3 traffic_generator.py --profile iot --target 172.18.0.1 --duration 300
 
   # Dataset-based traffic replay
   python3 traffic_generator.py --profile dataset --target 172.18.0.1 --duration 120 --dataset_file /datasets/GeForce_Now_1.csv
+
+  # Hour-long trace in one minute, both directions, sharded over 4 workers/UEs
+  python3 traffic_generator.py --profile dataset --target 172.18.0.1 --dataset_file trace.csv \\
+      --speed 60 --direction both --downlink_target 172.18.0.2 --workers 4 --interfaces uesimtun0,uesimtun1
+
+  # Replay a GTP-U capture's inner UE traffic with its original timing, twice as fast, looping
+  python3 traffic_generator.py --profile pcap --target 172.18.0.1 --pcap_file scenario_A.pcap --decap --speed 2 --loop
+
+  # Many concurrent flows from a JSON flow spec
+  python3 traffic_generator.py --flows flows.json --duration 60
+
+  # Video at 200 Mbps, or VoIP doubling from 10k pkt/s every 10s until the receiver reports loss
+  python3 traffic_generator.py --profile video --target 172.18.0.1 --bitrate 200M
+  python3 traffic_generator.py --profile voip --target 172.18.0.1 --pps 10000 --ramp step --duration 120
+
+  # Measurement receiver (loss, one-way delay, jitter) on ports 5000-5009
+  python3 traffic_generator.py --receive --port 5000 --port_count 10 --duration 120
         """
     )
     
-    parser.add_argument('--profile', required=True, 
-                       choices=['voip', 'video', 'bulk', 'iot', 'dataset'],
+    parser.add_argument('--profile',
+                       choices=PROFILES,
                        help='Traffic profile to simulate')
-    parser.add_argument('--target', required=True,
+    parser.add_argument('--target',
                        help='Target IP address')
     parser.add_argument('--port', type=int, default=5000,
                        help='Target port (default: 5000)')
@@ -436,12 +2153,103 @@ Examples:
                        help='Duration in seconds (default: 60)')
     parser.add_argument('--dataset_file', type=str,
                        help='Path to CSV dataset file (required for dataset profile)')
+    parser.add_argument('--no_cache', action='store_true',
+                       help='Dataset profile: stream the CSV instead of using the compiled schedule cache')
+    parser.add_argument('--compile_only', action='store_true',
+                       help='Dataset profile: compile the schedule cache for --dataset_file and exit')
+    parser.add_argument('--pacing_policy', choices=PACING_POLICIES, default=PACING_POLICY,
+                       help="When a paced profile falls behind: 'catchup' sends the late packets "
+                            "back to back, 'skip' drops them to stay on schedule (default: %(default)s)")
+    parser.add_argument('--speed', type=float, default=1.0,
+                       help='Dataset/pcap profiles: replay speed factor, e.g. 60 plays an hour in a minute (default: 1)')
+    parser.add_argument('--direction', choices=DIRECTIONS, default='uplink',
+                       help='Dataset profile: which rows to replay (default: %(default)s)')
+    parser.add_argument('--downlink_target', type=str,
+                       help='Dataset profile: IP[:port] for downlink rows with --direction both')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Dataset profile: shard the replay over this many processes (default: 1)')
+    parser.add_argument('--shard', choices=SHARD_MODES, default='flow',
+                       help='Dataset profile: shard by conversation or round-robin (default: %(default)s)')
+    parser.add_argument('--interfaces', type=str,
+                       help='Dataset profile: comma-separated interfaces the workers bind to in turn, '
+                            'e.g. uesimtun0,uesimtun1')
+    parser.add_argument('--pcap_file', type=str,
+                       help='Path to a pcap capture (required for pcap profile)')
+    parser.add_argument('--decap', action='store_true',
+                       help='Pcap profile: replay the packets inside GTP-U tunnels instead of the outer UDP payloads')
+    parser.add_argument('--loop', action='store_true',
+                       help='Pcap profile: restart the capture until --duration is reached')
+    parser.add_argument('--streams', type=int, default=1,
+                       help='Bulk profile: parallel TCP connections (default: 1)')
+    parser.add_argument('--sendfile', action='store_true',
+                       help='Bulk profile: send zero-copy with os.sendfile() from a memfd (or --bulk_file)')
+    parser.add_argument('--bulk_file', type=str,
+                       help='Bulk profile: file to sendfile() in a loop (implies --sendfile)')
+    parser.add_argument('--pps', type=float,
+                       help='Packets per second for voip/iot (video: packets of up to 1400 B per second)')
+    parser.add_argument('--bitrate', type=parse_bitrate,
+                       help='Target bitrate for voip/video/iot, e.g. 800k, 50M, 1G')
+    parser.add_argument('--rate', type=float, default=1.0,
+                       help="Multiple of the profile's default load when --pps/--bitrate are not given (default: 1)")
+    parser.add_argument('--ramp', choices=RAMP_MODES,
+                       help='Ramp the load: step multiplies it by --ramp_factor every --ramp_interval seconds, '
+                            'linear adds (factor - 1) x base per interval; stops at the first receiver-reported loss')
+    parser.add_argument('--ramp_interval', type=float, default=10.0,
+                       help='Seconds per ramp step (default: %(default)s)')
+    parser.add_argument('--ramp_factor', type=float, default=2.0,
+                       help='Ramp growth per interval (default: %(default)s)')
+    parser.add_argument('--loss_threshold', type=float, default=1.0,
+                       help='Loss percentage in receiver feedback that stops a ramp (default: %(default)s)')
+    parser.add_argument('--receive', action='store_true',
+                       help='Run as the measurement receiver on --port instead of generating traffic')
+    parser.add_argument('--port_count', type=int, default=1,
+                       help='Receiver: listen on --port and the next N-1 ports too (default: 1)')
+    parser.add_argument('--interval', type=float, default=RECEIVE_INTERVAL,
+                       help='Seconds between receiver and bulk per-stream reports (default: %(default)s)')
+    parser.add_argument('--report_file', type=str,
+                       help='Receiver: also append per-interval flow reports as JSON lines to this file')
+    parser.add_argument('--flows', type=str,
+                       help='JSON flow spec: run every flow in it concurrently instead of a single --profile')
+    parser.add_argument('--flow_workers', type=int, default=None,
+                       help='Worker processes for --flows (default: one per CPU core)')
+    parser.add_argument('--send_backend', choices=SEND_BACKENDS, default=SEND_BACKEND,
+                       help="Batched UDP send path for the voip, video, iot, dataset and pcap profiles: "
+                            "UDP GSO, sendmmsg(), or one sendto() per packet (default: %(default)s)")
     
     args = parser.parse_args()
     
+    PACING_POLICY = args.pacing_policy
+    SEND_BACKEND = args.send_backend
+    
+    if args.receive:
+        run_receiver(args.port, args.port_count, args.duration, args.interval, args.report_file)
+        return
+    
+    load = Load(args.pps, args.bitrate, args.rate, args.ramp, args.ramp_interval,
+                args.ramp_factor, args.loss_threshold)
+    
+    if args.flows:
+        try:
+            flows = load_flow_spec(args.flows, args.duration)
+        except (OSError, ValueError) as e:
+            parser.error(f"invalid flow spec {args.flows}: {e}")
+        run_flows(flows, args.flow_workers, use_cache=not args.no_cache, load=load)
+        return
+    
+    if args.compile_only:
+        if not args.dataset_file:
+            parser.error("--compile_only requires --dataset_file")
+        open_dataset_schedule(args.dataset_file)
+        return
+    
+    if not args.profile or not args.target:
+        parser.error("--profile and --target are required (or use --flows)")
+    
     # Validate dataset_file argument for dataset profile
     if args.profile == 'dataset' and not args.dataset_file:
         parser.error("--dataset_file is required when using 'dataset' profile")
+    if args.profile == 'pcap' and not args.pcap_file:
+        parser.error("--pcap_file is required when using 'pcap' profile")
     
     # Check if we're on the UE interface
     source_ip = get_ip_address(INTERFACE)
@@ -450,17 +2258,18 @@ Examples:
     else:
         print(f"Warning: Could not get IP from {INTERFACE}, using default interface")
     
+    if args.profile in ('bulk', 'dataset', 'pcap') and (args.pps or args.bitrate or args.rate != 1.0 or args.ramp):
+        print(f"Warning: --pps/--bitrate/--rate/--ramp do not apply to the {args.profile} profile")
+    
     # Run the selected profile
-    if args.profile == 'voip':
-        generate_voip_traffic(args.target, args.port, args.duration)
-    elif args.profile == 'video':
-        generate_video_traffic(args.target, args.port, args.duration)
-    elif args.profile == 'bulk':
-        generate_bulk_traffic(args.target, args.port, args.duration)
-    elif args.profile == 'iot':
-        generate_iot_traffic(args.target, args.port, args.duration)
-    elif args.profile == 'dataset':
-        generate_dataset_traffic(args.target, args.port, args.duration, args.dataset_file)
+    run_profile(args.profile, args.target, args.port, args.duration, args.dataset_file,
+                use_cache=not args.no_cache, load=load, streams=args.streams,
+                sendfile=args.sendfile, bulk_file=args.bulk_file, interval=args.interval,
+                replay={'speed': args.speed, 'direction': args.direction,
+                        'downlink_target': args.downlink_target, 'workers': args.workers,
+                        'shard_mode': args.shard,
+                        'interfaces': args.interfaces.split(',') if args.interfaces else None},
+                pcap={'pcap_file': args.pcap_file, 'speed': args.speed, 'loop': args.loop, 'decap': args.decap})
 
 
 if __name__ == "__main__":